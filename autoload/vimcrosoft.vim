@@ -80,9 +80,25 @@ function! vimcrosoft#get_sln_cache_dir(...) abort
         endif
         return ''
     endif
-    let l:cache_dir = fnamemodify(g:vimcrosoft_current_sln, ':h')
-    let l:cache_dir .= '\.vimcrosoft'
-    return l:cache_dir
+    if empty(g:vimcrosoft_cache_root)
+        let l:cache_dir = fnamemodify(g:vimcrosoft_current_sln, ':h')
+        let l:cache_dir .= '\.vimcrosoft'
+        return l:cache_dir
+    endif
+
+    " Keep in sync with `get_sln_cache_dir` in `scripts/cache_root.py`.
+    let l:slnpath = fnamemodify(g:vimcrosoft_current_sln, ':p')
+    let l:key = has('win32') ? tolower(substitute(l:slnpath, '/', '\\', 'g')) : l:slnpath
+    let l:name = substitute(fnamemodify(l:slnpath, ':t:r'), '[^A-Za-z0-9_.-]', '_', 'g')
+    let l:root = substitute(fnamemodify(expand(g:vimcrosoft_cache_root), ':p'), '[\\/]$', '', '')
+    return l:root.'\'.l:name.'-'.sha256(l:key)[:11]
+endfunction
+
+" Tells the scripts where the central cache root is, if any, since they
+" compute the cache directory themselves (see `scripts/cache_root.py`).
+function! s:sync_cache_root_env() abort
+    let $VIMCROSOFT_CACHE_ROOT = g:vimcrosoft_cache_root
+    let $VIMCROSOFT_CACHE_MAX_SIZE = g:vimcrosoft_cache_max_size
 endfunction
 
 function! vimcrosoft#get_sln_cache_file(filename) abort
@@ -112,8 +128,31 @@ function! vimcrosoft#save_config() abort
                 \g:vimcrosoft_current_config,
                 \g:vimcrosoft_current_platform,
                 \g:vimcrosoft_active_project]
+    let l:cache_dir = vimcrosoft#get_sln_cache_dir()
+    if !isdirectory(l:cache_dir)
+        call mkdir(l:cache_dir, 'p')
+    endif
     let l:configfile = vimcrosoft#get_sln_cache_file('config.txt')
     call writefile(l:lines, l:configfile)
+
+    " Keep the marker that tells the scripts to precompute configuration
+    " views in sync with the option.
+    let l:markerfile = vimcrosoft#get_sln_cache_file('precompute_configs')
+    if g:vimcrosoft_precompute_configs
+        if !filereadable(l:markerfile)
+            call writefile([], l:markerfile)
+        endif
+    elseif filereadable(l:markerfile)
+        call delete(l:markerfile)
+    endif
+
+    " Same for where the scripts share parsed projects with other solutions.
+    let l:storefile = vimcrosoft#get_sln_cache_file('project_store')
+    if !empty(g:vimcrosoft_project_store)
+        call writefile([g:vimcrosoft_project_store], l:storefile)
+    elseif filereadable(l:storefile)
+        call delete(l:storefile)
+    endif
 endfunction
 
 function! vimcrosoft#load_config() abort
@@ -151,6 +190,24 @@ function! vimcrosoft#get_script_path(scriptname) abort
     return s:scriptsdir.'\'.a:scriptname
 endfunction
 
+" Returns the shell command that runs the given script (without its `.py`
+" extension) in an external Python process.
+function! vimcrosoft#get_script_command(scriptname) abort
+    if !empty(g:vimcrosoft_zipapp)
+        return 'python '.shellescape(g:vimcrosoft_zipapp).' '.a:scriptname
+    endif
+    return 'python '.shellescape(vimcrosoft#get_script_path(a:scriptname.'.py'))
+endfunction
+
+" Same as `vimcrosoft#get_script_command`, but returns the command as a
+" list of arguments, e.g. for `job_start()`.
+function! vimcrosoft#get_script_argv(scriptname) abort
+    if !empty(g:vimcrosoft_zipapp)
+        return ['python', g:vimcrosoft_zipapp, a:scriptname]
+    endif
+    return ['python', vimcrosoft#get_script_path(a:scriptname.'.py')]
+endfunction
+
 function! vimcrosoft#exec_script_job(scriptname, ...) abort
     let l:scriptpath = vimcrosoft#get_script_path(a:scriptname)
     let l:cmd = ['python', l:scriptpath] + a:000
@@ -164,6 +221,7 @@ function! s:install_scriptsdir() abort
     if !s:scriptsdir_added_to_sys
         execute 'python3 import sys'
         execute 'python3 sys.path.append("'.escape(s:scriptsdir, "\\").'")'
+        execute 'python3 import vim'
         execute 'python3 import vimutil'
         let s:scriptsdir_added_to_sys = 1
     endif
@@ -171,7 +229,7 @@ endfunction
 
 function! vimcrosoft#exec_script_now(scriptname, ...) abort
     if g:vimcrosoft_use_external_python
-        let l:cmd = 'python '.shellescape(vimcrosoft#get_script_path(a:scriptname.'.py'))
+        let l:cmd = vimcrosoft#get_script_command(a:scriptname)
         " TODO: shellescape arguments?
         let l:cmd .= ' '.join(a:000, " ")
         let l:output = system(l:cmd)
@@ -194,6 +252,21 @@ function! vimcrosoft#exec_script_now(scriptname, ...) abort
     return l:output
 endfunction
 
+" Calls a function of the Python API (see `scripts/vsapi.py`) in-process,
+" with the given dictionary of arguments, and returns its result as a Vim
+" value directly.
+function! vimcrosoft#call_api(funcname, kwargs) abort
+    call s:install_scriptsdir()
+    if index(s:scripts_imported, 'vsapi') < 0
+        execute 'python3 import vsapi'
+        call add(s:scripts_imported, 'vsapi')
+    endif
+    let l:kwargs = a:kwargs
+    let l:line = 'vsapi.'.a:funcname.'(**vim.eval("l:kwargs"))'
+    call vimcrosoft#trace("Executing: ".l:line)
+    return py3eval(l:line)
+endfunction
+
 " }}}
 
 " Module Management {{{
@@ -223,8 +296,15 @@ function! vimcrosoft#set_sln(slnpath, ...) abort
 
     let l:sln_was_set = !empty(a:slnpath)
     if l:sln_was_set
+        call s:sync_cache_root_env()
         let g:vimcrosoft_current_sln_cache = vimcrosoft#get_sln_cache_file("slncache.bin")
         call vimcrosoft#call_modules('on_sln_changed', a:slnpath)
+        if g:vimcrosoft_auto_update_include_graph
+            call vimcrosoft#update_include_graph()
+        endif
+        if g:vimcrosoft_auto_update_file_shards
+            call vimcrosoft#update_file_shards()
+        endif
     else
         let g:vimcrosoft_current_sln_cache = ''
         call vimcrosoft#call_modules('on_sln_cleared')
@@ -304,7 +384,9 @@ function! vimcrosoft#build_sln(target) abort
     if !empty(a:target)
         call add(l:args, '/t:'.a:target)
     endif
-    call vimcrosoft#run_make(l:args)
+    " Record the stamps of all projects if they all get built.
+    let l:stamped = (a:target ==# 'Build' || a:target ==# 'Rebuild') ? [] : v:null
+    call vimcrosoft#run_make(l:args, l:stamped)
 endfunction
 
 function! vimcrosoft#build_project(projname, target, only) abort
@@ -330,10 +412,184 @@ function! vimcrosoft#build_project(projname, target, only) abort
     if a:only
         call add(l:args, '/p:BuildProjectReferences=false')
     endif
-    call vimcrosoft#run_make(l:args)
+    let l:stamped = (empty(a:target) || a:target ==# 'Rebuild') ? [l:projname] : v:null
+    call vimcrosoft#run_make(l:args, l:stamped)
+endfunction
+
+function! vimcrosoft#build_affected(...) abort
+    if g:vimcrosoft_save_all_on_build
+        wall
+    endif
+
+    if a:0
+        let l:files = map(copy(a:000), {idx, val -> fnamemodify(val, ':p')})
+    else
+        let l:files = [expand('%:p')]
+    endif
+    let l:projnames = vimcrosoft#get_affected_project_names(l:files)
+    if empty(l:projnames)
+        call vimcrosoft#error("No projects are affected by: ".join(l:files, ', '))
+        return
+    endif
+
+    let l:targets = map(copy(l:projnames), {idx, val -> tr(val, '.', '_')})
+    call vimcrosoft#run_make(['/t:'.join(l:targets, ';')], l:projnames)
+endfunction
+
+function! vimcrosoft#build_dirty() abort
+    if g:vimcrosoft_save_all_on_build
+        wall
+    endif
+
+    let l:projnames = vimcrosoft#get_dirty_project_names()
+    if empty(l:projnames)
+        echom "No projects have changed since they were last built."
+        return
+    endif
+
+    let l:targets = map(copy(l:projnames), {idx, val -> tr(val, '.', '_')})
+    call vimcrosoft#run_make(['/t:'.join(l:targets, ';')], l:projnames)
+endfunction
+
+" Records the stamps of the files of the given projects (or all projects,
+" if the list is empty) in the background, so that we can later find which
+" projects changed.
+function! vimcrosoft#record_stamps(projnames) abort
+    if empty(g:vimcrosoft_current_sln)
+        return
+    endif
+    let l:cmd = vimcrosoft#get_script_argv('project_stamps')
+    call extend(l:cmd, ['record', g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache])
+    for l:projname in a:projnames
+        call extend(l:cmd, ['-p', l:projname])
+    endfor
+    call vimcrosoft#trace("Recording stamps: ".string(l:cmd))
+    call job_start(l:cmd)
+endfunction
+
+" Takes the stamps of the files of the given projects (or all projects, if
+" the list is empty) right before building them. They're only recorded by
+" `vimcrosoft#commit_stamps`, once the build succeeded, so that files saved
+" during the build are still seen as changed afterwards.
+function! vimcrosoft#snapshot_stamps(projnames) abort
+    if empty(g:vimcrosoft_current_sln)
+        return
+    endif
+    let l:pending = vimcrosoft#get_sln_cache_file('stamps.pending')
+    if !g:vimcrosoft_use_external_python
+        let l:kwargs = {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'cachepath': g:vimcrosoft_current_sln_cache,
+                    \'pendingpath': l:pending}
+        if !empty(a:projnames)
+            let l:kwargs.projects = a:projnames
+        endif
+        try
+            call vimcrosoft#call_api('snapshot_project_stamps', l:kwargs)
+        catch
+            call vimcrosoft#warning("Can't take project stamps: ".v:exception)
+            call delete(l:pending)
+        endtry
+        return
+    endif
+    let l:cmd = vimcrosoft#get_script_argv('project_stamps')
+    call extend(l:cmd, ['snapshot', g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache, '-P', l:pending])
+    for l:projname in a:projnames
+        call extend(l:cmd, ['-p', l:projname])
+    endfor
+    call vimcrosoft#trace("Taking stamps: ".string(l:cmd))
+    let l:output = system(join(map(l:cmd, {idx, val -> shellescape(val)}), ' '))
+    if v:shell_error
+        call vimcrosoft#warning("Can't take project stamps: ".l:output)
+        call delete(l:pending)
+    endif
+endfunction
+
+" Records the stamps taken by `vimcrosoft#snapshot_stamps`, in the
+" background.
+function! vimcrosoft#commit_stamps() abort
+    let l:pending = vimcrosoft#get_sln_cache_file('stamps.pending')
+    if empty(g:vimcrosoft_current_sln) || !filereadable(l:pending)
+        return
+    endif
+    let l:cmd = vimcrosoft#get_script_argv('project_stamps')
+    call extend(l:cmd, ['commit', g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache, '-P', l:pending])
+    call vimcrosoft#trace("Recording stamps: ".string(l:cmd))
+    call job_start(l:cmd)
+endfunction
+
+" Forgets the stamps taken by `vimcrosoft#snapshot_stamps`, e.g. when the
+" build failed.
+function! vimcrosoft#discard_stamps() abort
+    let l:pending = vimcrosoft#get_sln_cache_file('stamps.pending')
+    if !empty(l:pending)
+        call delete(l:pending)
+    endif
+endfunction
+
+function! vimcrosoft#update_include_graph() abort
+    if empty(g:vimcrosoft_current_sln)
+        return
+    endif
+    let l:cmd = vimcrosoft#get_script_argv('include_graph')
+    call extend(l:cmd, [g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache])
+    call vimcrosoft#trace("Updating include graph: ".string(l:cmd))
+    call job_start(l:cmd)
+endfunction
+
+function! vimcrosoft#update_file_shards() abort
+    if empty(g:vimcrosoft_current_sln)
+        return
+    endif
+    let l:cmd = vimcrosoft#get_script_argv('file_shards')
+    call extend(l:cmd, ['update', g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache])
+    call vimcrosoft#trace("Updating file list shards: ".string(l:cmd))
+    call job_start(l:cmd)
+endfunction
+
+function! vimcrosoft#echo_cache_stats() abort
+    if empty(g:vimcrosoft_current_sln)
+        call vimcrosoft#throw("No solution is currently set.")
+    endif
+    let l:output = vimcrosoft#exec_script_now('cache_stats',
+                \'-c', g:vimcrosoft_current_sln_cache)
+    echo l:output
+endfunction
+
+function! vimcrosoft#collect_cache_garbage() abort
+    if empty(g:vimcrosoft_cache_root)
+        call vimcrosoft#throw("No central cache root is set, see ".
+                    \"g:vimcrosoft_cache_root.")
+    endif
+    call s:sync_cache_root_env()
+    let l:args = []
+    if !empty(g:vimcrosoft_project_store)
+        let l:args = ['--store', g:vimcrosoft_project_store]
+    endif
+    let l:output = call('vimcrosoft#exec_script_now', ['cache_root'] + l:args)
+    echo l:output
 endfunction
 
-function! vimcrosoft#run_make(customargs) abort
+function! vimcrosoft#echo_dirty_projects() abort
+    let l:projnames = vimcrosoft#get_dirty_project_names()
+    if empty(l:projnames)
+        echom "No projects have changed since they were last built."
+    else
+        echom "Changed projects: ".join(l:projnames, ', ')
+    endif
+endfunction
+
+" Runs MSBuild with the given arguments. If a list of project names is
+" also given, the stamps of those projects (or of all projects, for an empty
+" list) are taken before the build, and recorded if it succeeds. That only works
+" when `g:vimcrosoft_parse_build_output` is set, since `:make` doesn't tell
+" us whether the build succeeded.
+function! vimcrosoft#run_make(customargs, ...) abort
     if !vimcrosoft#ensure_msbuild_found()
         return
     endif
@@ -345,6 +601,11 @@ function! vimcrosoft#run_make(customargs) abort
     " Add the solution file itself.
     call add(l:fullargs, '"'.g:vimcrosoft_current_sln.'"')
 
+    if g:vimcrosoft_parse_build_output
+        call s:run_parsed_build(l:fullargs, a:0 ? a:1 : v:null)
+        return
+    endif
+
     " Setup the backdoor args list for our compiler to pick-up, and run
     " the make process.
     let g:vimcrosoft_temp_compiler_args__ = l:fullargs
@@ -358,6 +619,131 @@ function! vimcrosoft#run_make(customargs) abort
     endif
 endfunction
 
+let s:build_job = v:null
+let s:build_counts = {}
+let s:build_stamped_projects = v:null
+
+" Runs MSBuild in the background, through our output parser, and fills the
+" quickfix list as diagnostics come in.
+function! s:run_parsed_build(fullargs, stamped) abort
+    if s:build_job != v:null && job_status(s:build_job) ==# 'run'
+        call vimcrosoft#error("A build is already running.")
+        return
+    endif
+
+    " The arguments are quoted for `makeprg`, but we don't need that here.
+    let l:msbuildargs = map(copy(a:fullargs),
+                \{idx, val -> substitute(val, '\v^"(.*)"$', '\1', '')})
+    let l:cmd = vimcrosoft#get_script_argv('parse_build_output')
+    call extend(l:cmd, ['-s', g:vimcrosoft_current_sln, '--',
+                \g:vimcrosoft_msbuild_path] + l:msbuildargs)
+    call vimcrosoft#trace("Running build: ".string(l:cmd))
+
+    call setqflist([], ' ', {'title': 'MSBuild '.join(a:fullargs, ' ')})
+    let s:build_counts = {'E': 0, 'W': 0, 'I': 0}
+    let s:build_stamped_projects = a:stamped
+    if a:stamped isnot v:null
+        call vimcrosoft#snapshot_stamps(a:stamped)
+    endif
+    let s:build_job = job_start(l:cmd, {
+                \'out_mode': 'nl',
+                \'out_cb': function('s:on_build_output'),
+                \'close_cb': function('s:on_build_done'),
+                \'exit_cb': function('s:on_build_exit')})
+    echom "Building..."
+endfunction
+
+function! s:on_build_output(channel, msg) abort
+    try
+        let l:entry = json_decode(a:msg)
+    catch
+        return
+    endtry
+    call setqflist([l:entry], 'a')
+    let s:build_counts[l:entry.type] += 1
+endfunction
+
+function! s:on_build_exit(job, status) abort
+    if s:build_stamped_projects isnot v:null
+        if a:status == 0
+            call vimcrosoft#commit_stamps()
+        else
+            call vimcrosoft#discard_stamps()
+        endif
+    endif
+    if a:status == 0 && g:vimcrosoft_auto_update_include_graph
+        call vimcrosoft#update_include_graph()
+    endif
+    if a:status == 0 && g:vimcrosoft_auto_update_file_shards
+        call vimcrosoft#update_file_shards()
+    endif
+endfunction
+
+function! s:on_build_done(channel) abort
+    let s:build_job = v:null
+    echom printf("Build finished: %d error(s), %d warning(s)",
+                \s:build_counts.E, s:build_counts.W)
+    cwindow
+endfunction
+
+let s:search_job = v:null
+let s:search_count = 0
+" Incremented for each search, so that the callbacks of a stopped search
+" job, which can still run, know to ignore its output.
+let s:search_id = 0
+
+" Searches the contents of the solution's files in the background, and
+" fills the quickfix list as matches come in.
+function! vimcrosoft#search_sln_files(pattern) abort
+    if empty(g:vimcrosoft_current_sln)
+        call vimcrosoft#throw("No solution is currently set.")
+    endif
+    if s:search_job != v:null && job_status(s:search_job) ==# 'run'
+        call job_stop(s:search_job)
+    endif
+
+    let l:cmd = vimcrosoft#get_script_argv('search_sln_files')
+    call extend(l:cmd, [g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache, '--json'])
+    " Follow Vim's own case settings.
+    if &ignorecase && !(&smartcase && a:pattern =~# '\u')
+        call add(l:cmd, '--ignore-case')
+    endif
+    call extend(l:cmd, ['--', a:pattern])
+    call vimcrosoft#trace("Running search: ".string(l:cmd))
+
+    call setqflist([], ' ', {'title': 'Search '.a:pattern})
+    let s:search_count = 0
+    let s:search_id += 1
+    let s:search_job = job_start(l:cmd, {
+                \'out_mode': 'nl',
+                \'out_cb': function('s:on_search_output', [s:search_id]),
+                \'close_cb': function('s:on_search_done', [s:search_id])})
+    echom "Searching..."
+endfunction
+
+function! s:on_search_output(id, channel, msg) abort
+    if a:id != s:search_id
+        return
+    endif
+    try
+        let l:entry = json_decode(a:msg)
+    catch
+        return
+    endtry
+    call setqflist([l:entry], 'a')
+    let s:search_count += 1
+endfunction
+
+function! s:on_search_done(id, channel) abort
+    if a:id != s:search_id
+        return
+    endif
+    let s:search_job = v:null
+    echom printf("Search finished: %d match(es)", s:search_count)
+    cwindow
+endfunction
+
 function! vimcrosoft#set_config_platform(configplatform)
     let l:bits = split(substitute(a:configplatform, '\\ ', ' ', 'g'), '|')
     if len(l:bits) != 2
@@ -372,14 +758,81 @@ function! vimcrosoft#set_config_platform(configplatform)
     call vimcrosoft#save_config()
 endfunction
 
-function! vimcrosoft#get_sln_project_names() abort
+function! vimcrosoft#get_sln_project_names(...) abort
     if empty(g:vimcrosoft_current_sln)
         return []
     endif
-    let l:output = vimcrosoft#exec_script_now("list_sln_projects",
-                \g:vimcrosoft_current_sln,
+    if !g:vimcrosoft_use_external_python
+        return vimcrosoft#call_api('list_projects', {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'cachepath': g:vimcrosoft_current_sln_cache,
+                    \'prefix': a:0 ? a:1 : ''})
+    endif
+    let l:args = [g:vimcrosoft_current_sln,
                 \'-c', g:vimcrosoft_current_sln_cache,
-                \'--full-names')
+                \'--full-names']
+    if a:0 && !empty(a:1)
+        call extend(l:args, ['--prefix', a:1])
+    endif
+    let l:output = call('vimcrosoft#exec_script_now',
+                \['list_sln_projects'] + l:args)
+    return split(l:output, "\n")
+endfunction
+
+function! vimcrosoft#get_affected_project_names(files) abort
+    if empty(g:vimcrosoft_current_sln)
+        return []
+    endif
+    if !g:vimcrosoft_use_external_python
+        let l:projs = vimcrosoft#call_api('find_affected_projects', {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'filenames': a:files,
+                    \'cachepath': g:vimcrosoft_current_sln_cache})
+        return map(l:projs, {idx, val -> val.full_name})
+    endif
+    let l:output = call('vimcrosoft#exec_script_now',
+                \['list_affected_projects', g:vimcrosoft_current_sln,
+                \ '-c', g:vimcrosoft_current_sln_cache, '--full-names'] + a:files)
+    return split(l:output, "\n")
+endfunction
+
+function! vimcrosoft#get_dirty_project_names() abort
+    if empty(g:vimcrosoft_current_sln)
+        return []
+    endif
+    if !g:vimcrosoft_use_external_python
+        let l:kwargs = {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'cachepath': g:vimcrosoft_current_sln_cache}
+        " Numbers are passed as strings, so only pass the flag if it's set.
+        if g:vimcrosoft_trust_dir_mtime
+            let l:kwargs.trust_dir_mtime = 1
+        endif
+        let l:projs = vimcrosoft#call_api('find_dirty_projects', l:kwargs)
+        return map(l:projs, {idx, val -> val.full_name})
+    endif
+    let l:args = ['project_stamps', 'dirty', g:vimcrosoft_current_sln,
+                \'-c', g:vimcrosoft_current_sln_cache, '--full-names']
+    if g:vimcrosoft_trust_dir_mtime
+        call add(l:args, '--trust-dir-mtime')
+    endif
+    let l:output = call('vimcrosoft#exec_script_now', l:args)
+    return split(l:output, "\n")
+endfunction
+
+function! vimcrosoft#find_sln_files(query) abort
+    if empty(g:vimcrosoft_current_sln)
+        return []
+    endif
+    if !g:vimcrosoft_use_external_python
+        return vimcrosoft#call_api('find_files', {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'query': a:query,
+                    \'cachepath': g:vimcrosoft_current_sln_cache})
+    endif
+    let l:output = call('vimcrosoft#exec_script_now',
+                \['find_files', g:vimcrosoft_current_sln,
+                \ '-c', g:vimcrosoft_current_sln_cache] + split(a:query))
     return split(l:output, "\n")
 endfunction
 
@@ -387,22 +840,47 @@ function! vimcrosoft#get_sln_config_platforms() abort
     if empty(g:vimcrosoft_current_sln)
         return []
     endif
+    if !g:vimcrosoft_use_external_python
+        return vimcrosoft#call_api('list_configs', {
+                    \'solution': g:vimcrosoft_current_sln,
+                    \'cachepath': g:vimcrosoft_current_sln_cache})
+    endif
     let l:output = vimcrosoft#exec_script_now("list_sln_configs",
                 \g:vimcrosoft_current_sln,
                 \'-c', g:vimcrosoft_current_sln_cache)
     return split(l:output, "\n")
 endfunction
 
+function! vimcrosoft#edit_sln_file(query) abort
+    if filereadable(a:query)
+        execute 'edit '.fnameescape(a:query)
+        return
+    endif
+    let l:paths = vimcrosoft#find_sln_files(a:query)
+    if empty(l:paths)
+        call vimcrosoft#error("No solution files match: ".a:query)
+        return
+    endif
+    execute 'edit '.fnameescape(l:paths[0])
+endfunction
+
 " }}}
 
 " {{{ Commands Auto-completion
 
 function! vimcrosoft#complete_current_sln_projects(ArgLead, CmdLine, CursorPos)
-    let l:proj_names = vimcrosoft#get_sln_project_names()
-    let l:argpat = '^'.substitute(a:ArgLead, '\', '', 'g')
-    let l:projnames = filter(l:proj_names,
-                \{idx, val -> val =~? l:argpat})
-    return l:projnames
+    " The script does the (case-insensitive) prefix matching for us.
+    return vimcrosoft#get_sln_project_names(a:ArgLead)
+endfunction
+
+function! vimcrosoft#complete_sln_files(ArgLead, CmdLine, CursorPos)
+    " The whole command line is the query, since it can have several terms.
+    let l:query = substitute(a:CmdLine, '\v^\S+\s*', '', '')
+    if empty(l:query)
+        return []
+    endif
+    return map(vimcrosoft#find_sln_files(l:query),
+                \{idx, val -> fnamemodify(val, ':.')})
 endfunction
 
 function! vimcrosoft#complete_current_sln_config_platforms(ArgLead, CmdLine, CursorPos)
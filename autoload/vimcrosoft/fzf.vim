@@ -11,11 +11,18 @@ function! vimcrosoft#fzf#on_sln_cleared() abort
 endfunction
 
 function! s:build_file_list_command(slnpath) abort
-    let l:scriptpath = vimcrosoft#get_script_path('list_sln_files.py')
+    " If a previous run generated a launcher script, use it: it prints the
+    " cached file list without starting Python if it's still valid.
+    let l:launcher_path = vimcrosoft#get_sln_cache_file(
+                \has('win32') ? 'fzffilelist.cmd' : 'fzffilelist.sh')
+    if filereadable(l:launcher_path)
+        return shellescape(l:launcher_path)
+    endif
+
     let l:list_cache_path = vimcrosoft#get_sln_cache_file('fzffilelist.txt')
-    return 'python '.shellescape(l:scriptpath).
+    return vimcrosoft#get_script_command('list_sln_files').
                 \' '.shellescape(a:slnpath).
                 \' --cache '.shellescape(g:vimcrosoft_current_sln_cache).
-                \' --list-cache '.shellescape(l:list_cache_path)
+                \' --list-cache '.shellescape(l:list_cache_path).
+                \' --launcher '.shellescape(l:launcher_path)
 endfunction
-
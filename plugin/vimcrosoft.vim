@@ -27,7 +27,16 @@ let g:vimcrosoft_current_sln_cache = ''
 
 let g:vimcrosoft_msbuild_path = get(g:, 'vimcrosoft_msbuild_path', '')
 let g:vimcrosoft_use_external_python = get(g:, 'vimcrosoft_use_external_python', 0)
+let g:vimcrosoft_zipapp = get(g:, 'vimcrosoft_zipapp', '')
+let g:vimcrosoft_precompute_configs = get(g:, 'vimcrosoft_precompute_configs', 0)
+let g:vimcrosoft_project_store = get(g:, 'vimcrosoft_project_store', '')
+let g:vimcrosoft_cache_root = get(g:, 'vimcrosoft_cache_root', $VIMCROSOFT_CACHE_ROOT)
+let g:vimcrosoft_cache_max_size = get(g:, 'vimcrosoft_cache_max_size', $VIMCROSOFT_CACHE_MAX_SIZE)
 let g:vimcrosoft_make_command = get(g:, 'vimcrosoft_make_command', '')
+let g:vimcrosoft_parse_build_output = get(g:, 'vimcrosoft_parse_build_output', 0)
+let g:vimcrosoft_trust_dir_mtime = get(g:, 'vimcrosoft_trust_dir_mtime', 0)
+let g:vimcrosoft_auto_update_include_graph = get(g:, 'vimcrosoft_auto_update_include_graph', 0)
+let g:vimcrosoft_auto_update_file_shards = get(g:, 'vimcrosoft_auto_update_file_shards', 0)
 
 let g:vimcrosoft_save_all_on_build = get(g:, 'vimcrosoft_save_all_on_build', 1)
 
@@ -72,6 +81,20 @@ command! -nargs=1
 command! -nargs=1 -complete=customlist,vimcrosoft#complete_current_sln_projects 
             \ VimcrosoftCleanProject 
             \ :call vimcrosoft#build_project(<f-args>, 'Clean', 1)
+command! -nargs=* -complete=file
+            \ VimcrosoftBuildAffected
+            \ :call vimcrosoft#build_affected(<f-args>)
+command! VimcrosoftBuildDirty :call vimcrosoft#build_dirty()
+command! VimcrosoftDirtyProjects :call vimcrosoft#echo_dirty_projects()
+command! VimcrosoftRecordStamps :call vimcrosoft#record_stamps([])
+command! VimcrosoftUpdateIncludeGraph :call vimcrosoft#update_include_graph()
+command! VimcrosoftUpdateFileShards :call vimcrosoft#update_file_shards()
+command! VimcrosoftCacheStats :call vimcrosoft#echo_cache_stats()
+command! VimcrosoftCacheGC :call vimcrosoft#collect_cache_garbage()
+command! -nargs=1 VimcrosoftSearch :call vimcrosoft#search_sln_files(<q-args>)
+command! -nargs=1 -complete=customlist,vimcrosoft#complete_sln_files
+            \ VimcrosoftFindFile
+            \ :call vimcrosoft#edit_sln_file(<q-args>)
 
 " }}}
 
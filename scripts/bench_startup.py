@@ -0,0 +1,160 @@
+import argparse
+import json
+import logging
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+from logutil import setup_logging
+from run_benchmarks import prepare_scale
+
+
+logger = logging.getLogger(__name__)
+
+
+# The commands to time, as sub-command arguments for the `vimcrosoft`
+# command. `{sln}` and `{cache}` are replaced by the paths to the synthetic
+# solution and its cache.
+CASES = {
+    'list-files': ['{sln}', '-c', '{cache}'],
+    'list-projects': ['{sln}', '-c', '{cache}', '--full-names'],
+    'list-configs': ['{sln}', '-c', '{cache}'],
+    'get-proj-config': ['{sln}', '{cache}', 'Project1', 'Debug|x64'],
+    'dump-cache': ['{cache}'],
+}
+
+MODES = ('scripts', 'cli', 'zipapp')
+
+
+def _get_command_line(mode, case, ctx, scriptsdir, zipapp_path):
+    caseargs = [a.format(sln=ctx.slnpath, cache=ctx.cachepath)
+                for a in CASES[case]]
+    if mode == 'scripts':
+        from vimcrosoft import get_command_module
+        script = os.path.join(scriptsdir, get_command_module(case) + '.py')
+        return [script] + caseargs
+    if mode == 'cli':
+        return [os.path.join(scriptsdir, 'vimcrosoft.py'), case] + caseargs
+    return [zipapp_path, case] + caseargs
+
+
+def parse_importtime(text):
+    """ Parses the output of `python -X importtime`, and returns a list of
+        (module, self time, cumulative time) tuples, in microseconds.
+    """
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            selftime = int(fields[0])
+            cumtime = int(fields[1])
+        except ValueError:
+            # Header line.
+            continue
+        imports.append((fields[2].strip(), selftime, cumtime))
+    return imports
+
+
+def measure(cmdline, repeat):
+    """ Runs a command line several times, and returns the best wall time,
+        in seconds, and the imports of the last run, as returned by
+        `parse_importtime`.
+    """
+    # Warm up, e.g. to write the bytecode caches of the scripts.
+    subprocess.run([sys.executable] + cmdline,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + cmdline,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + cmdline,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    return best, parse_importtime(proc.stderr)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Measures the startup time of the vimcrosoft command "
+                     "line, using `python -X importtime`."))
+    parser.add_argument('-c', '--case',
+                        action='append',
+                        choices=list(CASES.keys()),
+                        help="The command(s) to time. Defaults to all.")
+    parser.add_argument('-m', '--mode',
+                        action='append',
+                        choices=MODES,
+                        help=("How to run the commands: as individual "
+                              "scripts, through `vimcrosoft.py`, or through "
+                              "the zipapp. Defaults to all."))
+    parser.add_argument('-w', '--workdir',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'vimcrosoft-bench'),
+                        help="Where to generate the synthetic solution.")
+    parser.add_argument('-n', '--repeat',
+                        type=int, default=5,
+                        help="How many times to run each command.")
+    parser.add_argument('--top',
+                        type=int, default=0,
+                        help="Also show the N slowest imports of each command.")
+    parser.add_argument('-o', '--output',
+                        help="Save the results to the given file.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    cases = args.case or list(CASES.keys())
+    modes = args.mode or MODES
+    scriptsdir = os.path.dirname(os.path.abspath(__file__))
+
+    ctx = prepare_scale(args.workdir, 'small')
+    ctx.ensure_cache()
+
+    zipapp_path = None
+    if 'zipapp' in modes:
+        from make_zipapp import make_zipapp
+        zipapp_path = make_zipapp(os.path.join(args.workdir, 'vimcrosoft.pyz'))
+
+    results = {}
+    for case in cases:
+        results[case] = {}
+        for mode in modes:
+            cmdline = _get_command_line(mode, case, ctx, scriptsdir,
+                                        zipapp_path)
+            duration, imports = measure(cmdline, args.repeat)
+            import_total = sum([i[1] for i in imports])
+            results[case][mode] = {'wall': duration,
+                                   'imports': len(imports),
+                                   'import_time': import_total / 1000000}
+            print("%-16s %-8s %8.2fms  %4d imports %8.2fms" % (
+                case, mode, duration * 1000, len(imports),
+                import_total / 1000))
+            if args.top:
+                slowest = sorted(imports, key=lambda i: i[1], reverse=True)
+                for name, selftime, _ in slowest[:args.top]:
+                    print("    %-40s %8.2fms" % (name, selftime / 1000))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        logger.info("Saved results to: %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
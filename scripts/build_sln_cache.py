@@ -1,26 +1,42 @@
 import os.path
 import logging
 import argparse
-from vsutil import SolutionCache
+from logutil import add_profile_arguments, profiling
+from vsutil import SolutionCache, CONFIG_VIEWS_MARKER
 
 
-def main():
+def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('solution',
                         help="The path to the solution file")
     parser.add_argument('cache',
                         help="The path to the cache file")
+    parser.add_argument('--precompute-configs',
+                        action='store_const', const=True,
+                        help=("Also resolve all projects for all solution "
+                              "configurations. By default, this is only "
+                              "done if a `%s` file exists next to the "
+                              "cache." % CONFIG_VIEWS_MARKER))
     parser.add_argument('-v', '--verbose',
                         action='store_true')
-    args = parser.parse_args()
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
 
     loglevel = logging.INFO
     if args.verbose:
         loglevel = logging.DEBUG
     logging.basicConfig(level=loglevel)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
     logger = logging.getLogger()
 
-    cache, loaded = SolutionCache.load_or_rebuild(args.solution, args.cache)
+    cache, loaded = SolutionCache.load_or_rebuild(
+        args.solution, args.cache,
+        precompute_configs=args.precompute_configs)
     if not loaded:
         total_items = sum([len(i) for i in cache.index.values()])
         logger.debug(f"Built cache with {total_items} items.")
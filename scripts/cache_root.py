@@ -0,0 +1,351 @@
+""" Keeps the caches of all solutions in one central directory, instead of
+    in a `.vimcrosoft` directory next to each solution, and removes the
+    least recently used ones when they take too much space, e.g.:
+
+        python cache_root.py --max-size 2G
+
+    The central cache root is only used if the `VIMCROSOFT_CACHE_ROOT`
+    environment variable is set (Vimcrosoft sets it from the
+    `g:vimcrosoft_cache_root` option, so processes started from Vim use the
+    same root). Each solution gets its own sub-directory there, named after
+    the solution and a hash of its path.
+
+    Each sub-directory has a `solution.txt` file with the path of its
+    solution, which is touched whenever its cache is loaded. Whenever a
+    cache gets rebuilt, the least recently used sub-directories are removed
+    until all of them fit in `VIMCROSOFT_CACHE_MAX_SIZE`, if it's set. The
+    `gc` command also does that, and also removes the caches of solutions
+    that don't exist anymore.
+
+    Projects parsed for these solutions are usually in a project store
+    outside of the cache root (see `vsutil.ProjectStore`), whose entries
+    count toward the same maximum size, and are removed along with the
+    least recently used caches.
+"""
+import argparse
+import logging
+import os
+import os.path
+import re
+import time
+from logutil import add_profile_arguments, profiling, setup_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# The file, in each solution's cache directory, with the solution's path,
+# and whose modification time is when the cache was last used.
+SOLUTION_STAMP = 'solution.txt'
+
+_size_units = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(size):
+    """ Parses a size in bytes, optionally with a K, M or G suffix. """
+    m = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)b?\s*$', size, re.IGNORECASE)
+    if not m:
+        raise Exception("Invalid size: %s" % size)
+    return int(float(m.group(1)) * _size_units[m.group(2).lower()])
+
+
+def format_size(size):
+    for unit in ('g', 'm', 'k'):
+        if size >= _size_units[unit]:
+            return '%.1f%s' % (size / _size_units[unit], unit.upper())
+    return '%dB' % size
+
+
+def get_cache_root():
+    """ Returns the central cache root, or `None` if caches go next to
+        their solutions.
+    """
+    root = os.environ.get('VIMCROSOFT_CACHE_ROOT')
+    if not root:
+        return None
+    return os.path.abspath(os.path.expanduser(root))
+
+
+def get_max_cache_size():
+    """ Returns how many bytes the caches in the central cache root can
+        take, or `None` if there's no limit.
+    """
+    size = os.environ.get('VIMCROSOFT_CACHE_MAX_SIZE')
+    if not size:
+        return None
+    try:
+        return parse_size(size) or None
+    except Exception as ex:
+        logger.warning(f"Ignoring VIMCROSOFT_CACHE_MAX_SIZE: {ex}")
+        return None
+
+
+def get_sln_cache_dir(slnpath):
+    """ Returns the directory where the caches of the given solution go. """
+    slnpath = os.path.abspath(slnpath)
+    root = get_cache_root()
+    if not root:
+        return os.path.join(os.path.dirname(slnpath), '.vimcrosoft')
+
+    # Keep in sync with `vimcrosoft#get_sln_cache_dir`.
+    import hashlib
+    name = os.path.splitext(os.path.basename(slnpath))[0]
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+    key = hashlib.sha256(os.path.normcase(slnpath).encode('utf8'))
+    return os.path.join(root, '%s-%s' % (name, key.hexdigest()[:12]))
+
+
+def _get_root_of(cachepath):
+    # Returns the central cache root if the given cache is in it.
+    root = get_cache_root()
+    if root and (os.path.normcase(os.path.dirname(os.path.dirname(
+            os.path.abspath(cachepath)))) == os.path.normcase(root)):
+        return root
+    return None
+
+
+def touch_cache(cachepath, slnpath):
+    """ Marks the given solution cache as just used, if it's in the central
+        cache root.
+    """
+    if not _get_root_of(cachepath):
+        return
+    stamppath = os.path.join(os.path.dirname(cachepath), SOLUTION_STAMP)
+    try:
+        os.utime(stamppath)
+    except FileNotFoundError:
+        try:
+            os.makedirs(os.path.dirname(stamppath), exist_ok=True)
+            with open(stamppath, 'w', encoding='utf8') as fp:
+                fp.write(os.path.abspath(slnpath) + '\n')
+        except OSError as ex:
+            logger.debug(f"Can't write solution stamp: {ex}")
+    except OSError as ex:
+        logger.debug(f"Can't touch solution stamp: {ex}")
+
+
+def enforce_max_cache_size(cachepath, store=None, store_keep=None):
+    """ Removes the least recently used caches from the central cache root,
+        if the given cache is in it, and entries from the given project
+        store, until they all fit in the maximum size. The given cache, and
+        the store entries in `store_keep`, are never removed.
+    """
+    root = _get_root_of(cachepath)
+    max_size = get_max_cache_size()
+    if not root or not max_size:
+        return []
+    return collect_garbage(root, max_size=max_size,
+                           keep=[os.path.dirname(cachepath)],
+                           remove_missing=False,
+                           store=store, store_keep=store_keep)
+
+
+class CacheDirInfo:
+    """ A solution's cache directory in the central cache root. """
+    def __init__(self, path):
+        self.path = path
+        self.solution = None
+        self.last_access = 0
+        self.size = 0
+        # Why it's being removed, if it is.
+        self.reason = None
+
+    def is_orphan(self):
+        return self.solution is not None and not os.path.exists(self.solution)
+
+
+class StoreEntryInfo:
+    """ An entry of a project store (see `vsutil.ProjectStore`). """
+    def __init__(self, path, last_access, size):
+        self.path = path
+        self.solution = None
+        self.last_access = last_access
+        self.size = size
+        # Why it's being removed, if it is.
+        self.reason = None
+
+    def is_orphan(self):
+        # Entries don't know which solutions use them.
+        return False
+
+
+def _get_dir_size(path):
+    size = 0
+    for entry in os.scandir(path):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                size += _get_dir_size(entry.path)
+            else:
+                size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+    return size
+
+
+def list_cache_dirs(root):
+    """ Returns the solution cache directories in the given cache root, least
+        recently used first. Directories without a solution stamp (see
+        `touch_cache`) aren't solution caches, and are left alone.
+    """
+    infos = []
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return infos
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        info = CacheDirInfo(entry.path)
+        stamppath = os.path.join(entry.path, SOLUTION_STAMP)
+        try:
+            info.last_access = os.path.getmtime(stamppath)
+            with open(stamppath, 'r', encoding='utf8') as fp:
+                info.solution = fp.readline().strip() or None
+            info.size = _get_dir_size(entry.path)
+        except OSError:
+            continue
+        infos.append(info)
+    infos.sort(key=lambda i: i.last_access)
+    return infos
+
+
+def collect_garbage(root, max_size=None, max_age=None, keep=None,
+                    remove_missing=True, dry_run=False, store=None,
+                    store_keep=None):
+    """ Removes solution cache directories from the given cache root: those
+        of solutions that don't exist anymore (if `remove_missing` is set),
+        those not used for more than `max_age` seconds, and then the least
+        recently used ones until the others take at most `max_size` bytes.
+        Directories in `keep` are never removed. Entries of the given
+        project store are handled like cache directories, except for those
+        whose paths are in `store_keep`. Returns the removed directories
+        and entries, as `CacheDirInfo` and `StoreEntryInfo` objects.
+    """
+    keep = {os.path.normcase(os.path.abspath(k)) for k in (keep or ())}
+    infos = [i for i in list_cache_dirs(root)
+             if os.path.normcase(i.path) not in keep]
+    kept_size = sum(_get_dir_size(k) for k in keep if os.path.isdir(k))
+    if store is not None:
+        store_keep = store_keep or set()
+        for path, last_access, size in store.list_entries():
+            if os.path.normcase(path) in store_keep:
+                kept_size += size
+            else:
+                infos.append(StoreEntryInfo(path, last_access, size))
+        infos.sort(key=lambda i: i.last_access)
+    now = time.time()
+
+    to_remove = []
+    remaining = []
+    for info in infos:
+        if remove_missing and info.is_orphan():
+            info.reason = "solution is gone"
+            to_remove.append(info)
+        elif max_age is not None and now - info.last_access > max_age:
+            info.reason = "not used recently"
+            to_remove.append(info)
+        else:
+            remaining.append(info)
+
+    if max_size is not None:
+        total = kept_size + sum(i.size for i in remaining)
+        # Remaining directories are least recently used first.
+        for info in remaining:
+            if total <= max_size:
+                break
+            info.reason = "over the size limit"
+            to_remove.append(info)
+            total -= info.size
+
+    import shutil
+    removed = []
+    for info in to_remove:
+        logger.debug(f"Removing cache ({info.reason}): {info.path}")
+        if not dry_run:
+            try:
+                if isinstance(info, StoreEntryInfo):
+                    os.remove(info.path)
+                else:
+                    shutil.rmtree(info.path)
+            except OSError as ex:
+                logger.warning(f"Can't remove cache {info.path}: {ex}")
+                continue
+        removed.append(info)
+    return removed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Removes old solution caches from the central cache "
+                     "root, and old entries from the project store."))
+    parser.add_argument('-r', '--root',
+                        help=("The central cache root. Defaults to "
+                              "VIMCROSOFT_CACHE_ROOT."))
+    parser.add_argument('-s', '--max-size',
+                        help=("How much space all caches can take, e.g. 2G. "
+                              "Defaults to VIMCROSOFT_CACHE_MAX_SIZE."))
+    parser.add_argument('-a', '--max-age',
+                        type=float,
+                        help="Remove caches not used for that many days.")
+    parser.add_argument('--store',
+                        help=("The project store whose entries are also "
+                              "removed when old, or to fit in the maximum "
+                              "size. Defaults to the per-user store. Pass "
+                              "`none` to leave project stores alone."))
+    parser.add_argument('-n', '--dry-run',
+                        action='store_true',
+                        help="Only print what would be removed.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    root = args.root or get_cache_root()
+    if not root:
+        raise Exception("No cache root was given, and VIMCROSOFT_CACHE_ROOT "
+                        "isn't set.")
+    max_size = (parse_size(args.max_size) if args.max_size
+                else get_max_cache_size())
+    max_age = args.max_age * 86400 if args.max_age is not None else None
+
+    store = None
+    if (args.store or '').lower() != 'none':
+        from vsutil import ProjectStore, get_default_project_store_dir
+        store = ProjectStore(os.path.abspath(os.path.expanduser(
+            args.store or get_default_project_store_dir())))
+
+    removed = collect_garbage(root, max_size=max_size, max_age=max_age,
+                              dry_run=args.dry_run, store=store)
+    removed_paths = {i.path for i in removed}
+    removed_dirs = [i for i in removed if isinstance(i, CacheDirInfo)]
+    left = [i for i in list_cache_dirs(root) if i.path not in removed_paths]
+
+    verb = "Would remove" if args.dry_run else "Removed"
+    for info in removed_dirs:
+        print("%s %8s  %s (%s)" % (verb, format_size(info.size),
+                                   info.solution or info.path, info.reason))
+    print("%s %d caches (%s), %d left (%s)." % (
+        verb, len(removed_dirs),
+        format_size(sum(i.size for i in removed_dirs)),
+        len(left), format_size(sum(i.size for i in left))))
+
+    if store is not None:
+        removed_entries = [i for i in removed
+                           if isinstance(i, StoreEntryInfo)]
+        left_entries = [e for e in store.list_entries()
+                        if e[0] not in removed_paths]
+        print("%s %d project store entries (%s), %d left (%s)." % (
+            verb, len(removed_entries),
+            format_size(sum(i.size for i in removed_entries)),
+            len(left_entries), format_size(sum(e[2] for e in left_entries))))
+
+
+if __name__ == '__main__':
+    main()
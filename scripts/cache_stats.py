@@ -0,0 +1,317 @@
+""" Keeps counters and timings of solution cache operations in a small
+    stats file next to the cache, and prints them, e.g.:
+
+        python cache_stats.py -c .vimcrosoft/slncache.bin
+
+    This tells whether a slow command came from a cold cache rebuild, an
+    out of date project, or simply a big project.
+
+    The stats file has one JSON object per line. Each process appends what
+    it did with the cache as a new line, which is a lot cheaper than
+    re-writing the whole file on every cache hit, and the lines are added
+    up when reading them. The file is compacted back into a single line
+    once it gets too big.
+"""
+import argparse
+import json
+import logging
+import os.path
+import time
+from fsutil import atomic_write, file_lock
+from logutil import add_profile_arguments, profiling, setup_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+STATS_VERSION = 1
+
+# How big the stats file can get before it's compacted.
+STATS_COMPACT_SIZE = 64 * 1024
+
+# Why a saved cache couldn't be used.
+MISS_REASONS = {
+    'no_cache': "No cache file",
+    'forced': "Rebuild was forced",
+    'sln_newer': "Solution is newer",
+    'load_error': "Cache couldn't be read",
+    'version_mismatch': "Cache version mismatch",
+    'other_solution': "Cache is for another solution",
+    'project_newer': "A project is newer",
+    'missing_project': "A project was added or removed",
+    'glob_dir_changed': "A wildcard directory changed",
+    'no_config_views': "Configuration views were missing",
+}
+
+
+def get_stats_path(cachepath):
+    """ Returns the path of the stats file that goes with the given
+        solution cache.
+    """
+    if not cachepath:
+        raise Exception("Cache stats need a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'stats.json')
+
+
+class Timing:
+    """ Aggregated durations of one kind of operation. """
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self, count=0, total=0.0, max=0.0, last=None):
+        self.count = count
+        self.total = total
+        self.max = max
+        self.last = last
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.last is not None:
+            self.last = other.last
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'max': self.max,
+                'last': self.last}
+
+    @staticmethod
+    def from_dict(data):
+        return Timing(data['count'], data['total'], data['max'],
+                      data.get('last'))
+
+
+class CacheStats:
+    """ Counters and timings of solution cache operations:
+
+        - hits: how many times a saved cache was loaded and used.
+        - misses: how many times it couldn't be used, by reason (see
+          `MISS_REASONS`).
+        - loads: how long loading and checking a saved cache took.
+        - rebuilds: how long rebuilding the cache took.
+        - projects: how long loading each project took, by name, when
+          rebuilding the cache.
+    """
+    def __init__(self):
+        self.since = time.time()
+        self.hits = 0
+        self.misses = {}
+        self.loads = Timing()
+        self.rebuilds = Timing()
+        self.last_rebuild = None
+        self.projects = {}
+        self._last_miss = None
+
+    def add_hit(self, duration):
+        self.hits += 1
+        self.loads.add(duration)
+
+    def add_miss(self, reason):
+        logger.debug(f"Cache miss: {reason}")
+        self.misses[reason] = self.misses.get(reason, 0) + 1
+        self._last_miss = reason
+
+    def add_rebuild(self, duration):
+        self.rebuilds.add(duration)
+        self.last_rebuild = {'time': time.time(), 'duration': duration,
+                             'reason': self._last_miss}
+
+    def add_project_load(self, name, duration):
+        timing = self.projects.get(name)
+        if timing is None:
+            timing = self.projects[name] = Timing()
+        timing.add(duration)
+
+    def merge(self, other):
+        self.since = min(self.since, other.since)
+        self.hits += other.hits
+        for reason, count in other.misses.items():
+            self.misses[reason] = self.misses.get(reason, 0) + count
+        self.loads.merge(other.loads)
+        self.rebuilds.merge(other.rebuilds)
+        if other.last_rebuild is not None:
+            self.last_rebuild = other.last_rebuild
+        for name, timing in other.projects.items():
+            cur = self.projects.get(name)
+            if cur is None:
+                self.projects[name] = Timing.from_dict(timing.to_dict())
+            else:
+                cur.merge(timing)
+
+    def is_empty(self):
+        return (not self.hits and not self.misses and
+                not self.rebuilds.count and not self.projects)
+
+    def to_dict(self):
+        return {'version': STATS_VERSION,
+                'since': self.since,
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads.to_dict(),
+                'rebuilds': self.rebuilds.to_dict(),
+                'last_rebuild': self.last_rebuild,
+                'projects': {n: t.to_dict() for n, t in self.projects.items()}}
+
+    @staticmethod
+    def from_dict(data):
+        stats = CacheStats()
+        stats.since = data['since']
+        stats.hits = data['hits']
+        stats.misses = data['misses']
+        stats.loads = Timing.from_dict(data['loads'])
+        stats.rebuilds = Timing.from_dict(data['rebuilds'])
+        stats.last_rebuild = data['last_rebuild']
+        stats.projects = {n: Timing.from_dict(t)
+                          for n, t in data['projects'].items()}
+        return stats
+
+
+def load_cache_stats(statspath):
+    """ Loads the saved stats. Returns empty stats if nothing valid was
+        saved yet.
+    """
+    stats = CacheStats()
+    try:
+        with open(statspath, 'r', encoding='utf8') as fp:
+            lines = fp.readlines()
+    except FileNotFoundError:
+        return stats
+    except OSError as ex:
+        logger.warning(f"Can't read cache stats: {ex}")
+        return stats
+
+    for line in lines:
+        try:
+            data = json.loads(line)
+            if data.get('version') == STATS_VERSION:
+                stats.merge(CacheStats.from_dict(data))
+        except Exception as ex:
+            # e.g. a line cut short by a process that was killed.
+            logger.debug(f"Ignoring invalid cache stats line: {ex}")
+    return stats
+
+
+def save_cache_stats(stats, statspath):
+    """ Adds the given stats to the saved ones. """
+    if stats.is_empty():
+        return
+    line = json.dumps(stats.to_dict()) + '\n'
+    try:
+        # A single small write in append mode doesn't get mixed up with
+        # the writes of other processes, so there's no need to lock.
+        with open(statspath, 'a', encoding='utf8') as fp:
+            fp.write(line)
+            size = fp.tell()
+        if size > STATS_COMPACT_SIZE:
+            compact_cache_stats(statspath)
+    except OSError as ex:
+        # Stats are nice to have, they shouldn't break anything.
+        logger.warning(f"Can't save cache stats: {ex}")
+
+
+def compact_cache_stats(statspath):
+    """ Adds up all the lines of the stats file into a single one. Stats
+        appended by other processes while this happens might be lost.
+    """
+    with file_lock(statspath + '.lock'):
+        stats = load_cache_stats(statspath)
+        with atomic_write(statspath, 'w', encoding='utf8') as fp:
+            fp.write(json.dumps(stats.to_dict()) + '\n')
+
+
+def reset_cache_stats(statspath):
+    """ Deletes the saved stats. """
+    with file_lock(statspath + '.lock'):
+        try:
+            os.remove(statspath)
+        except FileNotFoundError:
+            pass
+
+
+def _format_timing(timing):
+    if not timing.count:
+        return "none"
+    return "%d, %.2fms avg, %.2fms max, %.2fms last" % (
+        timing.count, timing.total * 1000 / timing.count,
+        timing.max * 1000, (timing.last or 0) * 1000)
+
+
+def format_cache_stats(stats, top=10):
+    """ Returns the given stats as human readable text. """
+    lines = []
+    lines.append("Since: %s" % time.strftime(
+        '%Y-%m-%d %H:%M:%S', time.localtime(stats.since)))
+    total = stats.hits + sum(stats.misses.values())
+    hit_rate = (100.0 * stats.hits / total) if total else 0.0
+    lines.append("Hits: %d (%.1f%%)" % (stats.hits, hit_rate))
+    lines.append("Misses: %d" % (total - stats.hits))
+    for reason, count in sorted(stats.misses.items(),
+                                key=lambda i: i[1], reverse=True):
+        lines.append("    %-40s %6d" % (MISS_REASONS.get(reason, reason),
+                                        count))
+    lines.append("Loads: %s" % _format_timing(stats.loads))
+    lines.append("Rebuilds: %s" % _format_timing(stats.rebuilds))
+    last = stats.last_rebuild
+    if last:
+        lines.append("Last rebuild: %s, %.2fms (%s)" % (
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last['time'])),
+            last['duration'] * 1000,
+            MISS_REASONS.get(last['reason'], last['reason'] or "unknown")))
+    if stats.projects:
+        lines.append("Slowest projects to load (top %d of %d):" %
+                     (top, len(stats.projects)))
+        slowest = sorted(stats.projects.items(), key=lambda i: i[1].max,
+                         reverse=True)
+        for name, timing in slowest[:top]:
+            lines.append("    %-40s %s" % (name, _format_timing(timing)))
+    return '\n'.join(lines) + '\n'
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Prints the solution cache hit/miss stats.")
+    parser.add_argument('-c', '--cache',
+                        required=True,
+                        help=("The path to the solution cache. The stats are "
+                              "saved next to it."))
+    parser.add_argument('--json',
+                        action='store_true',
+                        help="Print the stats as JSON.")
+    parser.add_argument('--top',
+                        type=int, default=10,
+                        help="How many of the slowest projects to show.")
+    parser.add_argument('--reset',
+                        action='store_true',
+                        help="Delete the stats.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    statspath = get_stats_path(args.cache)
+    if args.reset:
+        reset_cache_stats(statspath)
+        return
+
+    stats = load_cache_stats(statspath)
+    if args.json:
+        print(json.dumps(stats.to_dict(), indent=2))
+    else:
+        print(format_cache_stats(stats, top=args.top), end='')
+
+
+if __name__ == '__main__':
+    main()
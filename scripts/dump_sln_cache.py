@@ -1,23 +1,44 @@
+import json
 import os.path
 import pickle
 import pprint
 import logging
 import argparse
+from cache_stats import format_cache_stats, get_stats_path, load_cache_stats
+from logutil import add_profile_arguments, profiling
 from vsutil import SolutionCache
 
 
-def main():
+def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('cache',
                         help="The path to the cache file")
+    parser.add_argument('--footprint',
+                        choices=['text', 'json'],
+                        help=("Print a report of what takes space in the "
+                              "cache, in the given format."))
+    parser.add_argument('--top',
+                        type=int, default=20,
+                        help="How many entries to show in footprint lists.")
+    parser.add_argument('--stats',
+                        action='store_true',
+                        help=("Also print the cache's hit/miss statistics, "
+                              "saved next to it."))
     parser.add_argument('-v', '--verbose',
                         action='store_true')
-    args = parser.parse_args()
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
 
     loglevel = logging.INFO
     if args.verbose:
         loglevel = logging.DEBUG
     logging.basicConfig(level=loglevel)
+
+    with profiling(args):
+        return _run(args)
+
+
+def _run(args):
     logger = logging.getLogger()
 
     cachepath = args.cache
@@ -43,5 +64,60 @@ def main():
     for section in cache.slnobj.sections:
         logger.info(f"  {section.name} ({len(section.entries)} entries)")
 
+    if args.footprint:
+        report = cache.get_footprint(top=args.top)
+        if args.footprint == 'json':
+            print(json.dumps(report, indent=2))
+        else:
+            _print_footprint(report, args.top)
+
+    if args.stats:
+        stats = load_cache_stats(get_stats_path(cachepath))
+        print(format_cache_stats(stats, top=args.top), end='')
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return "%d%s" % (size, unit)
+        size /= 1024
+    return "%.1fGB" % size
+
+
+def _print_footprint(report, top):
+    print("Serialized cache: %s" % _format_size(report['serialized_bytes']))
+    print("Index in memory: %s" % _format_size(report['index_memory_bytes']))
+
+    projects = report['projects']
+    print()
+    print("Projects (%d loaded, top %d by serialized size):" %
+          (len(projects), top))
+    print("  %-40s %8s %10s %10s" % ("name", "items", "serialized", "memory"))
+    for p in projects[:top]:
+        print("  %-40s %8d %10s %10s" % (
+            p['name'], p['items'],
+            _format_size(p['serialized_bytes']),
+            _format_size(p['memory_bytes'])))
+        for itemtype, count in sorted(p['item_types'].items(),
+                                      key=lambda i: i[1], reverse=True):
+            print("      %-36s %8d" % (itemtype, count))
+
+    print()
+    print("Metadata keys by volume:")
+    print("  %-40s %8s %12s" % ("key", "count", "value chars"))
+    for m in report['metadata_keys']:
+        print("  %-40s %8d %12d" % (m['key'], m['count'], m['value_chars']))
+
+    strings = report['strings']
+    print()
+    print("Strings: %d total, %d unique values, %d objects, "
+          "%s wasted on duplicates" % (
+              strings['total'], strings['unique_values'],
+              strings['objects'],
+              _format_size(strings['duplicate_bytes'])))
+    for d in strings['top_duplicates']:
+        print("  %6d copies %10s  %s" % (
+            d['copies'], _format_size(d['wasted_bytes']), d['value'][:60]))
+
 if __name__ == '__main__':
     main()
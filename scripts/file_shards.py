@@ -0,0 +1,372 @@
+""" Keeps one file list per project (a "shard") next to the solution cache,
+    along with a manifest, for external indexers (ctags, code search, etc.)
+    that want to update incrementally, e.g.:
+
+        python file_shards.py update Solution.sln -c .vimcrosoft/slncache.bin
+        python file_shards.py changes Solution.sln -c .vimcrosoft/slncache.bin \\
+            --since 12 --id 3f0c...
+
+    Shards go in the `shards` directory of the cache directory, with the
+    absolute paths of a project's source files, one per line. The manifest
+    (`manifest.json`) lists the shards, each with its project, number of
+    files, a hash of its contents, and the generation at which it last
+    changed. The manifest's own generation goes up by one with each update
+    that changes anything, and only the shards of projects whose files
+    changed are written again. Projects whose file didn't change since
+    their shard was written aren't even listed again, unless they have
+    wildcard items.
+
+    Each update also logs which files it added and removed, so that
+    indexers that remember the last generation they saw can ask for what
+    changed since then, without reading and diffing the file lists. The
+    log only goes back `MAX_HISTORY` generations: past that, all files are
+    reported as added, and the changes are flagged as `full`.
+
+    Generations start over when the manifest is created again (e.g. when
+    the cache directory is cleaned up), so each manifest also gets a random
+    id. Indexers must pass the id of the manifest their generation comes
+    from, and changes are flagged as `full` if it isn't the current one.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import os.path
+import re
+import uuid
+from fsutil import atomic_write, file_lock
+from logutil import add_profile_arguments, profiling, setup_logging, traced
+
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_VERSION = 2
+
+# How many generations of changes are kept.
+MAX_HISTORY = 64
+
+
+def get_shards_dir(cachepath):
+    """ Returns the directory of the file list shards that go with the
+        given solution cache.
+    """
+    if not cachepath:
+        raise Exception("File list shards need a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'shards')
+
+
+def _get_manifest_path(shardsdir):
+    return os.path.join(shardsdir, 'manifest.json')
+
+
+def _get_changes_path(shardsdir):
+    return os.path.join(shardsdir, 'changes.jsonl')
+
+
+def _get_shard_name(proj):
+    # Project names are usually unique, but GUIDs always are.
+    name = re.sub(r'[^\w.-]', '_', proj.name)
+    return '%s-%s.txt' % (name, proj.guid.strip('{}')[:8].lower())
+
+
+def _hash_paths(paths):
+    return hashlib.sha1('\n'.join(paths).encode('utf8')).hexdigest()
+
+
+def _new_manifest(slnpath):
+    return {'version': MANIFEST_VERSION,
+            'id': uuid.uuid4().hex,
+            'solution': slnpath,
+            'generation': 0,
+            # Changes are logged for the generations after this one.
+            'oldest': 0,
+            'shards': {}}
+
+
+def load_manifest(shardsdir):
+    """ Loads the manifest of the shards. Returns `None` if there's none
+        yet.
+    """
+    try:
+        with open(_get_manifest_path(shardsdir), 'r', encoding='utf8') as fp:
+            manifest = json.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warning(f"Ignoring invalid file list manifest: {ex}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _read_shard(shardsdir, shard):
+    try:
+        with open(os.path.join(shardsdir, shard['file']), 'r',
+                  encoding='utf8') as fp:
+            return fp.read().splitlines()
+    except OSError:
+        return []
+
+
+def _load_changes(shardsdir):
+    changes = []
+    try:
+        with open(_get_changes_path(shardsdir), 'r', encoding='utf8') as fp:
+            for line in fp:
+                try:
+                    changes.append(json.loads(line))
+                except ValueError:
+                    # e.g. a line cut short by a process that was killed.
+                    pass
+    except FileNotFoundError:
+        pass
+    return changes
+
+
+@traced('shards.update')
+def update_shards(cache, shardsdir):
+    """ Updates the file list shards of the given solution cache's
+        projects, and returns the manifest's generation.
+    """
+    from vsapi import iter_project_files
+    from vsutil import ITEM_TYPE_SOURCE_FILES
+    slnobj = cache.slnobj
+    projs = [p for p in slnobj.projects if not p.is_folder]
+    guids = {p.guid for p in projs}
+
+    with file_lock(os.path.join(shardsdir, 'manifest.lock')):
+        manifest = load_manifest(shardsdir)
+        if manifest is None or manifest['solution'] != slnobj.path:
+            manifest = _new_manifest(slnobj.path)
+        prev_shards = manifest['shards']
+
+        # Like the solution cache, assume that a project's items didn't
+        # change if its file didn't, unless some come from wildcards.
+        mtimes = {}
+        to_list = []
+        for proj in projs:
+            try:
+                mtimes[proj.guid] = os.path.getmtime(proj.abspath)
+            except OSError:
+                mtimes[proj.guid] = None
+            prev = prev_shards.get(proj.guid)
+            if (prev is None or proj._globdirs or
+                    prev['mtime'] != mtimes[proj.guid]):
+                to_list.append(proj)
+
+        # Of these, find the projects whose files did change.
+        lists = {}
+        changed = []
+        touched = False
+        for proj, paths in zip(to_list, iter_project_files(
+                to_list, ITEM_TYPE_SOURCE_FILES)):
+            paths = sorted(set(paths))
+            prev = prev_shards.get(proj.guid)
+            if (prev is None or prev['count'] != len(paths) or
+                    prev['hash'] != _hash_paths(paths)):
+                changed.append(proj.guid)
+                lists[proj.guid] = paths
+            elif prev['mtime'] != mtimes[proj.guid]:
+                # The project file was touched, but its items are the
+                # same.
+                prev['mtime'] = mtimes[proj.guid]
+                touched = True
+        removed_guids = [g for g in prev_shards if g not in guids]
+        if not changed and not removed_guids:
+            if touched:
+                _save_manifest(shardsdir, manifest)
+            logger.debug("File list shards are up to date.")
+            return manifest['generation']
+
+        # Files can be in several projects, so they're only added or
+        # removed if they weren't or aren't in another project.
+        unchanged_paths = set()
+        for guid, shard in prev_shards.items():
+            if guid in guids and guid not in lists:
+                unchanged_paths.update(_read_shard(shardsdir, shard))
+        old_paths = set()
+        new_paths = set()
+        for guid in changed + removed_guids:
+            if guid in prev_shards:
+                old_paths.update(_read_shard(shardsdir, prev_shards[guid]))
+            new_paths.update(lists.get(guid, ()))
+        added = sorted(new_paths - old_paths - unchanged_paths)
+        removed = sorted(old_paths - new_paths - unchanged_paths)
+
+        generation = manifest['generation'] + 1
+        shards = {}
+        for proj in projs:
+            if proj.guid not in changed:
+                shard = prev_shards[proj.guid]
+                shard['project'] = proj.name
+                shards[proj.guid] = shard
+                continue
+            paths = lists[proj.guid]
+            shard = {'project': proj.name,
+                     'path': proj.abspath,
+                     'file': _get_shard_name(proj),
+                     'count': len(paths),
+                     'hash': _hash_paths(paths),
+                     'mtime': mtimes[proj.guid],
+                     'generation': generation}
+            with atomic_write(os.path.join(shardsdir, shard['file']), 'w',
+                              encoding='utf8', newline='\n') as fp:
+                fp.writelines([p + '\n' for p in paths])
+            prev = prev_shards.get(proj.guid)
+            if prev is not None and prev['file'] != shard['file']:
+                _remove_shard_file(shardsdir, prev)
+            shards[proj.guid] = shard
+        for guid in removed_guids:
+            _remove_shard_file(shardsdir, prev_shards[guid])
+
+        _log_changes(shardsdir, manifest, generation, added, removed)
+        manifest['generation'] = generation
+        manifest['shards'] = shards
+        _save_manifest(shardsdir, manifest)
+    logger.debug(f"Updated {len(changed)} shards, removed "
+                 f"{len(removed_guids)}: {len(added)} files added, "
+                 f"{len(removed)} removed.")
+    return generation
+
+
+def _save_manifest(shardsdir, manifest):
+    with atomic_write(_get_manifest_path(shardsdir), 'w',
+                      encoding='utf8') as fp:
+        json.dump(manifest, fp, indent=1)
+
+
+def _remove_shard_file(shardsdir, shard):
+    try:
+        os.remove(os.path.join(shardsdir, shard['file']))
+    except FileNotFoundError:
+        pass
+
+
+def _log_changes(shardsdir, manifest, generation, added, removed):
+    changespath = _get_changes_path(shardsdir)
+    line = json.dumps({'generation': generation, 'added': added,
+                       'removed': removed}) + '\n'
+    if generation == 1:
+        # A new manifest, so start a new log.
+        with atomic_write(changespath, 'w', encoding='utf8') as fp:
+            fp.write(line)
+        return
+
+    with open(changespath, 'a', encoding='utf8') as fp:
+        fp.write(line)
+    if generation - manifest['oldest'] > MAX_HISTORY:
+        # Forget about the oldest generations.
+        oldest = generation - MAX_HISTORY
+        changes = [c for c in _load_changes(shardsdir)
+                   if c['generation'] > oldest]
+        with atomic_write(changespath, 'w', encoding='utf8') as fp:
+            fp.writelines([json.dumps(c) + '\n' for c in changes])
+        manifest['oldest'] = oldest
+
+
+def get_changes(shardsdir, since, manifest_id=None):
+    """ Returns the files added and removed since the given generation of
+        the manifest with the given id, as a dictionary with the current
+        manifest `id` and `generation`, and the `added` and `removed` lists
+        of paths. If the changes since then weren't logged anymore, or the
+        manifest was created again since, all current files are listed as
+        added, and `full` is set.
+    """
+    # Don't read the log while an update trims it.
+    with file_lock(os.path.join(shardsdir, 'manifest.lock')):
+        manifest = load_manifest(shardsdir)
+        changes = _load_changes(shardsdir) if manifest is not None else []
+    if manifest is None:
+        return {'id': None, 'generation': 0, 'full': True, 'added': [],
+                'removed': []}
+
+    generation = manifest['generation']
+    if (since < manifest['oldest'] or since > generation or
+            (since > 0 and manifest_id != manifest['id'])):
+        added = set()
+        for shard in manifest['shards'].values():
+            added.update(_read_shard(shardsdir, shard))
+        return {'id': manifest['id'], 'generation': generation, 'full': True,
+                'added': sorted(added), 'removed': []}
+
+    added = set()
+    removed = set()
+    for change in changes:
+        if not since < change['generation'] <= generation:
+            continue
+        for path in change['removed']:
+            if path in added:
+                added.discard(path)
+            else:
+                removed.add(path)
+        for path in change['added']:
+            if path in removed:
+                removed.discard(path)
+            else:
+                added.add(path)
+    return {'id': manifest['id'], 'generation': generation, 'full': False,
+            'added': sorted(added), 'removed': sorted(removed)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Updates the per-project file lists of a solution, or "
+                     "lists the files added and removed since a given "
+                     "generation of these lists."))
+    parser.add_argument('action',
+                        choices=['update', 'changes'],
+                        help=("Whether to update the file lists, or to update "
+                              "them and list what changed."))
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('-c', '--cache',
+                        required=True,
+                        help=("The path to the solution cache. The file lists "
+                              "are saved next to it."))
+    parser.add_argument('-s', '--since',
+                        type=int, default=0,
+                        help=("The generation to list changes since. "
+                              "Defaults to listing all files."))
+    parser.add_argument('--id',
+                        help=("The id of the manifest that the `--since` "
+                              "generation comes from. If it's not the "
+                              "current manifest, all files are listed."))
+    parser.add_argument('--json',
+                        action='store_true',
+                        help=("Print changes as JSON, along with the current "
+                              "manifest id and generation. Otherwise, print added files "
+                              "prefixed with `+`, and removed files with "
+                              "`-`."))
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    from vsapi import get_file_changes, update_file_shards
+    if args.action == 'update':
+        print(update_file_shards(args.solution, args.cache))
+        return
+
+    changes = get_file_changes(args.solution, args.cache, args.since,
+                               args.id)
+    if args.json:
+        print(json.dumps(changes))
+        return
+    for path in changes['removed']:
+        print('-' + path)
+    for path in changes['added']:
+        print('+' + path)
+
+
+if __name__ == '__main__':
+    main()
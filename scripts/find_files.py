@@ -0,0 +1,373 @@
+""" Finds solution files by fuzzy-matching their paths, e.g.:
+
+        python find_files.py Solution.sln -c .vimcrosoft/slncache.bin vsutl
+
+    Query characters must appear in the file's path (relative to the
+    solution directory) in the same order, but not necessarily next to
+    each other. Several space-separated terms must all match.
+
+    The index of file paths is saved next to the solution cache, along with
+    one bit set per character telling which paths contain that character.
+    Batches of paths whose bits are all cleared by AND-ing the bit sets of
+    the query's characters are skipped. The other batches are matched with
+    one regex search over the whole batch, and only matching paths are
+    scored, shortest paths first, until the time budget runs out.
+
+    The index remembers what it was built from, so it can tell whether
+    it's still valid without loading the solution cache.
+"""
+import argparse
+import bisect
+import heapq
+import itertools
+import logging
+import os
+import os.path
+import pickle
+import re
+import time
+from fsutil import atomic_write
+from logutil import add_profile_arguments, profiling, setup_logging, traced
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_VERSION = 1
+
+# How many candidates are scored between checks of the time budget.
+BATCH_SIZE = 2048
+
+# The default time budget of a query, in seconds.
+DEFAULT_BUDGET = 0.1
+
+
+def get_file_index_path(cachepath):
+    """ Returns the path of the file finder index that goes with the given
+        solution cache.
+    """
+    if not cachepath:
+        raise Exception("The file finder index needs a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'files.bin')
+
+
+class FileIndex:
+    """ The paths of a solution's files, ready to be fuzzy-matched. Paths
+        are sorted by length, so the best matches for short queries, which
+        match almost everything, are usually found first.
+    """
+    def __init__(self, slndir, paths):
+        self.slndir = slndir
+        # What the index was built from, see `is_up_to_date`.
+        self.slnpath = None
+        self.projects = []
+        self.globdirs = {}
+        self.built_time = None
+        prefix = os.path.join(slndir, '')
+        relpaths = [p[len(prefix):] if p.startswith(prefix) else p
+                    for p in set(paths)]
+        relpaths.sort(key=lambda p: (len(p), p))
+        self.relpaths = relpaths
+        keys = self._init_batches()
+        self.char_bits = _build_char_bits(keys)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Batches are quick to make again.
+        del state['batches']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_batches()
+
+    def _init_batches(self):
+        # Each batch is the lower-case paths of `BATCH_SIZE` files, one per
+        # line, along with the offset of each line.
+        keys = [p.lower().replace('\\', '/') for p in self.relpaths]
+        self.batches = []
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            offsets = [0]
+            offsets += itertools.accumulate([len(k) + 1 for k in batch])
+            self.batches.append(('\n'.join(batch) + '\n', offsets))
+        return keys
+
+    def __len__(self):
+        return len(self.relpaths)
+
+    def is_up_to_date(self):
+        """ Returns whether the solution and its projects haven't changed
+            since this index was built. This is the same check as for a
+            loaded solution cache.
+        """
+        from vsutil import _have_glob_dirs_changed
+        for path, missing in [(self.slnpath, False)] + self.projects:
+            try:
+                # A missing project that now exists also changed.
+                if os.path.getmtime(path) >= self.built_time or missing:
+                    return False
+            except OSError:
+                if not missing:
+                    return False
+        return not _have_glob_dirs_changed(self.globdirs)
+
+    def get_abs_path(self, i):
+        return os.path.join(self.slndir, self.relpaths[i])
+
+    @traced('files.find')
+    def find(self, query, limit=20, budget=DEFAULT_BUDGET):
+        """ Returns the indices of the best matches for the given query,
+            best first, along with whether all candidates could be scored
+            within the time budget (in seconds).
+        """
+        terms = query.lower().replace('\\', '/').split()
+        if not terms:
+            return [], True
+
+        # Only paths that have all the query's characters can match.
+        term_masks = []
+        for term in terms:
+            term_mask = -1
+            for c in set(term):
+                bits = self.char_bits.get(c)
+                if not bits:
+                    return [], True
+                term_mask &= bits
+            term_masks.append(term_mask)
+        mask = -1
+        for term_mask in term_masks:
+            mask &= term_mask
+
+        matchers = [_make_matcher(t) for t in terms]
+        # Search batches with the term that the fewest paths could match.
+        picky = min(range(len(terms)),
+                    key=lambda t: bin(term_masks[t]).count('1'))
+        line_search = matchers[picky]
+        max_score = MAX_TERM_SCORE * len(terms)
+        batch_mask = (1 << BATCH_SIZE) - 1
+        deadline = time.perf_counter() + budget
+        # The worst of the best matches so far is at the top of the heap.
+        best = []
+        worst = None
+        complete = True
+        done = False
+        scanned = 0
+        for batch_index, (text, offsets) in enumerate(self.batches):
+            start = batch_index * BATCH_SIZE
+            chunk = (mask >> start) & batch_mask
+            if not chunk:
+                continue
+            if scanned and time.perf_counter() > deadline:
+                complete = False
+                break
+            scanned += 1
+
+            for line, key in _iter_candidates(text, offsets, chunk,
+                                              line_search):
+                if worst is not None and worst >= max_score - len(key) / 100.0:
+                    # Paths only get longer from here, so nothing else can
+                    # beat the best matches we have.
+                    done = True
+                    break
+                score = _score(key, terms, matchers)
+                if score is None:
+                    continue
+                i = start + line
+                if len(best) < limit:
+                    heapq.heappush(best, (score, -i))
+                    if len(best) == limit:
+                        worst = best[0][0]
+                elif score > worst:
+                    heapq.heapreplace(best, (score, -i))
+                    worst = best[0][0]
+            if done:
+                break
+
+        if not complete:
+            logger.debug(f"Query '{query}' ran out of time after "
+                         f"{scanned} of {len(self.batches)} batches.")
+        best.sort(reverse=True)
+        return [-i for _, i in best], complete
+
+
+def _iter_candidates(text, offsets, chunk, line_search):
+    """ Yields the line numbers and paths of a batch that could match a
+        query, given the bits of the paths that have all its characters.
+    """
+    if bin(chunk).count('1') * 4 < len(offsets):
+        # Few paths have all the characters, so check just those.
+        while chunk:
+            low = chunk & -chunk
+            line = low.bit_length() - 1
+            chunk ^= low
+            yield line, text[offsets[line]:offsets[line + 1] - 1]
+        return
+
+    # Otherwise, it's faster to search the whole batch at once, and only
+    # look at the paths that match.
+    pos = 0
+    while True:
+        m = line_search(text, pos)
+        if m is None:
+            return
+        line = bisect.bisect_right(offsets, m.start()) - 1
+        pos = offsets[line + 1]
+        yield line, text[offsets[line]:pos - 1]
+
+
+# The best score a query term can get on a path (see `_score`).
+MAX_TERM_SCORE = 300
+
+
+def _build_char_bits(keys):
+    # Bit N of a character's bit set is whether path N contains that
+    # character. Building it as a string of binary digits is a lot faster
+    # than setting bits one by one.
+    alphabet = set()
+    for k in keys:
+        alphabet.update(k)
+    rkeys = keys[::-1]
+    return {c: int(''.join(['1' if c in k else '0' for k in rkeys]), 2)
+            for c in alphabet}
+
+
+def _make_matcher(term):
+    # Match each character with the first occurrence of the next one, e.g.
+    # `a[^b\n]*b[^c\n]*c` rather than `a.*?b.*?c`, which finds the same
+    # paths without backtracking. This also works on several paths
+    # separated by new lines.
+    parts = [re.escape(term[0])]
+    for c in term[1:]:
+        c = re.escape(c)
+        parts.append('[^%s\\n]*%s' % (c, c))
+    return re.compile(''.join(parts)).search
+
+
+def _score(key, terms, matchers):
+    """ Scores a path for a query, or returns `None` if it doesn't match.
+        Matches in the file name are better than matches in directory
+        names, and consecutive characters are better than scattered
+        ones.
+    """
+    score = 0
+    basename = key[key.rfind('/') + 1:]
+    for term, matcher in zip(terms, matchers):
+        if term in basename:
+            score += 200
+            if basename.startswith(term):
+                score += 100
+            continue
+        m = matcher(basename)
+        if m is not None:
+            score += 120 - (m.end() - m.start() - len(term))
+            continue
+        if term in key:
+            score += 80
+            continue
+        m = matcher(key)
+        if m is None:
+            return None
+        score += 40 - (m.end() - m.start() - len(term))
+    # Prefer shorter paths.
+    return score - len(key) / 100.0
+
+
+@traced('files.build_index')
+def build_file_index(cache, check_time):
+    """ Builds the file finder index for the source files of the given
+        solution cache, which was known to be up to date at the given
+        time.
+    """
+    from vsapi import iter_project_files
+    from vsutil import ITEM_TYPE_SOURCE_FILES
+    slnobj = cache.slnobj
+    projs = [p for p in slnobj.projects if not p.is_folder]
+    paths = []
+    for projpaths in iter_project_files(projs, ITEM_TYPE_SOURCE_FILES):
+        paths += projpaths
+
+    index = FileIndex(slnobj.dirpath, paths)
+    index.slnpath = slnobj.path
+    index.projects = [(p.abspath, p._missing) for p in projs]
+    for p in projs:
+        index.globdirs.update(p._globdirs)
+    index.built_time = check_time
+    return index
+
+
+def load_file_index(indexpath, slnpath):
+    """ Loads a saved file finder index for the given solution. Returns
+        `None` if there's none, or if it's out of date.
+    """
+    try:
+        with open(indexpath, 'rb') as fp:
+            if pickle.load(fp) != INDEX_VERSION:
+                return None
+            index = pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warning(f"Ignoring invalid file finder index: {ex}")
+        return None
+    # Solutions in the same directory share a cache directory.
+    if (os.path.normcase(os.path.abspath(index.slnpath)) !=
+            os.path.normcase(os.path.abspath(slnpath))):
+        return None
+    if not index.is_up_to_date():
+        logger.debug("File finder index is out of date.")
+        return None
+    return index
+
+
+def save_file_index(index, indexpath):
+    """ Saves a file finder index. """
+    try:
+        with atomic_write(indexpath, 'wb') as fp:
+            pickle.dump(INDEX_VERSION, fp)
+            pickle.dump(index, fp)
+    except OSError as ex:
+        logger.warning(f"Can't save file finder index: {ex}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Finds solution files by fuzzy-matching their paths.")
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('query',
+                        nargs='+',
+                        help="The query. Several terms must all match.")
+    parser.add_argument('-c', '--cache',
+                        help=("The solution cache to use. The file finder "
+                              "index is saved next to it."))
+    parser.add_argument('-n', '--limit',
+                        type=int, default=20,
+                        help="How many files to print, best match first.")
+    parser.add_argument('-b', '--budget',
+                        type=float, default=DEFAULT_BUDGET * 1000,
+                        help=("How long to spend looking for matches, in "
+                              "milliseconds. The best matches found until "
+                              "then are printed."))
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    from vsapi import find_files
+    paths = find_files(args.solution, ' '.join(args.query),
+                       cachepath=args.cache, limit=args.limit,
+                       budget=args.budget / 1000.0)
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import contextlib
+import logging
+import os
+import os.path
+
+
+logger = logging.getLogger(__name__)
+
+
+_umask = None
+
+
+def _get_umask():
+    # The umask can only be read by changing it, so only do it once.
+    global _umask
+    if _umask is None:
+        _umask = os.umask(0o022)
+        os.umask(_umask)
+    return _umask
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """ Opens a temporary file next to the given path, and moves it over
+        that path once the `with` block exits without errors. Readers only
+        ever see either the previous file or the new one, never a partially
+        written one.
+    """
+    dirpath = os.path.dirname(path)
+    if dirpath and not os.path.isdir(dirpath):
+        os.makedirs(dirpath, exist_ok=True)
+
+    import tempfile
+    fd, tmppath = tempfile.mkstemp(
+        dir=(dirpath or None),
+        prefix=(os.path.basename(path) + '.'),
+        suffix='.tmp')
+    try:
+        # Temporary files are only readable by their owner, but the file
+        # they replace should keep its mode, or get the usual one.
+        if os.name != 'nt':
+            try:
+                filemode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                filemode = 0o666 & ~_get_umask()
+            os.fchmod(fd, filemode)
+        with os.fdopen(fd, mode, **kwargs) as fp:
+            yield fp
+        os.replace(tmppath, path)
+    except BaseException:
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """ Holds an exclusive lock on the given lock file (which is created if
+        needed) for the duration of the `with` block, waiting for any other
+        process holding it to release it first. The lock is released by the
+        OS if the process dies.
+    """
+    dirpath = os.path.dirname(path)
+    if dirpath and not os.path.isdir(dirpath):
+        os.makedirs(dirpath, exist_ok=True)
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            if not _try_lock_nt(msvcrt, fd, msvcrt.LK_NBLCK):
+                logger.debug("Waiting for lock: %s" % path)
+                # LK_LOCK only retries for about 10 seconds, so keep trying.
+                while not _try_lock_nt(msvcrt, fd, msvcrt.LK_LOCK):
+                    pass
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                logger.debug("Waiting for lock: %s" % path)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _try_lock_nt(msvcrt, fd, mode):
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+        msvcrt.locking(fd, mode, 1)
+        return True
+    except OSError:
+        return False
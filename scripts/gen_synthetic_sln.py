@@ -0,0 +1,423 @@
+import argparse
+import logging
+import os
+import os.path
+import random
+import uuid
+from logutil import setup_logging
+from vsutil import PROJ_TYPE_FOLDER, PROJ_TYPE_NMAKE
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bump this when the generated solutions change, so that benchmarks
+# re-generate them.
+GENERATOR_VERSION = 4
+
+
+_proj_header = """<?xml version="1.0" encoding="utf-8"?>
+<Project DefaultTargets="Build" ToolsVersion="15.0" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">
+"""
+
+_proj_footer = """  <Import Project="$(VCTargetsPath)\\Microsoft.Cpp.targets" />
+</Project>
+"""
+
+
+def _make_guid(rnd):
+    return str(uuid.UUID(int=rnd.getrandbits(128))).upper()
+
+
+def _cond(config, platform):
+    return "'$(Configuration)|$(Platform)'=='%s|%s'" % (config, platform)
+
+
+def _write_project(projpath, name, configs, platforms, items, rnd,
+                   references=(), write_items=False):
+    sep = os.sep
+    lines = [_proj_header]
+
+    lines.append('  <ItemGroup Label="ProjectConfigurations">\n')
+    for c in configs:
+        for p in platforms:
+            lines.append(
+                '    <ProjectConfiguration Include="%s|%s">\n'
+                '      <Configuration>%s</Configuration>\n'
+                '      <Platform>%s</Platform>\n'
+                '    </ProjectConfiguration>\n' % (c, p, c, p))
+    lines.append('  </ItemGroup>\n')
+
+    lines.append('  <PropertyGroup Label="Globals">\n'
+                 '    <ProjectName>%s</ProjectName>\n'
+                 '  </PropertyGroup>\n' % name)
+
+    for c in configs:
+        for p in platforms:
+            lines.append(
+                '  <PropertyGroup Condition="%s" Label="Configuration">\n'
+                '    <ConfigurationType>Makefile</ConfigurationType>\n'
+                '    <UseDebugLibraries>%s</UseDebugLibraries>\n'
+                '  </PropertyGroup>\n' % (_cond(c, p), str(c == 'Debug').lower()))
+
+    for c in configs:
+        for p in platforms:
+            lines.append(
+                '  <PropertyGroup Condition="%s">\n'
+                '    <NMakeBuildCommandLine>build.cmd %s %s</NMakeBuildCommandLine>\n'
+                '    <NMakePreprocessorDefinitions>%s;PLATFORM_%s;PROJECT_%s;$(NMakePreprocessorDefinitions)</NMakePreprocessorDefinitions>\n'
+                '    <NMakeIncludeSearchPath>$(SolutionDir)common;$(ProjectDir)include;$(ProjectDir)src</NMakeIncludeSearchPath>\n'
+                '    <NMakeForcedIncludes>$(SolutionDir)common%spch.h</NMakeForcedIncludes>\n'
+                '  </PropertyGroup>\n' % (
+                    _cond(c, p), c, p, c.upper(), p.upper(), name.upper(),
+                    sep))
+
+    lines.append('  <ItemGroup>\n')
+    for i in range(items):
+        # Items come in pairs of source and header files.
+        n = i // 2
+        subdir = 'src%smodule%d' % (sep, n // 25)
+        if i % 2 == 1:
+            lines.append('    <ClInclude Include="%s%sfile%d.h" />\n' %
+                         (subdir, sep, n))
+        elif rnd.random() < 0.1:
+            lines.append(
+                '    <ClCompile Include="%s%sfile%d.cpp">\n'
+                '      <AdditionalIncludeDirectories>$(ProjectDir)extra%d</AdditionalIncludeDirectories>\n'
+                '      <ForcedIncludeFiles>$(SolutionDir)common%spch.h</ForcedIncludeFiles>\n'
+                '    </ClCompile>\n' % (subdir, sep, n, n, sep))
+        else:
+            lines.append('    <ClCompile Include="%s%sfile%d.cpp" />\n' %
+                         (subdir, sep, n))
+    lines.append('    <None Include="readme.txt" />\n')
+    lines.append('  </ItemGroup>\n')
+
+    if references:
+        lines.append('  <ItemGroup>\n')
+        for refpath, refguid in references:
+            lines.append('    <ProjectReference Include="%s">\n'
+                         '      <Project>{%s}</Project>\n'
+                         '    </ProjectReference>\n' % (refpath, refguid))
+        lines.append('  </ItemGroup>\n')
+
+    # Add some conditional items, like real projects have for platform
+    # specific code.
+    for p in platforms:
+        lines.append('  <ItemGroup Condition="\'$(Platform)\'==\'%s\'">\n'
+                     '    <ClCompile Include="platform%s%s.cpp" />\n'
+                     '  </ItemGroup>\n' % (p, sep, p.lower()))
+
+    lines.append(_proj_footer)
+
+    os.makedirs(os.path.dirname(projpath), exist_ok=True)
+    with open(projpath, 'w', encoding='utf8') as fp:
+        fp.writelines(lines)
+
+    if write_items:
+        projdir = os.path.dirname(projpath)
+        paths = [os.path.join(projdir, 'readme.txt')]
+        paths += [os.path.join(projdir, 'platform', p.lower() + '.cpp')
+                  for p in platforms]
+        for i in range(items):
+            n = i // 2
+            paths.append(os.path.join(
+                projdir, 'src', 'module%d' % (n // 25),
+                'file%d.%s' % (n, 'h' if i % 2 == 1 else 'cpp')))
+        _write_item_files(paths, items, random.Random(name))
+
+
+def _write_item_files(paths, items, rnd):
+    # Source files include their header and sometimes a header from another
+    # module, and some headers include other headers, so that there's an
+    # include graph to look at.
+    headers = ['file%d.h' % n for n in range(items // 2)]
+    for path in paths:
+        lines = ["// %s\n" % os.path.basename(path)]
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext == '.cpp':
+            lines.append('#include "pch.h"\n')
+            if name.startswith('file'):
+                lines.append('#include "%s.h"\n' % name)
+        if ext in ('.cpp', '.h') and headers and rnd.random() < 0.3:
+            n = rnd.randrange(len(headers))
+            lines.append('#include "module%d/%s"\n' % (n // 25, headers[n]))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.writelines(lines)
+
+
+def generate_solution(outdir, projects=100, items=100, folders=10,
+                      configs=('Debug', 'Release'),
+                      platforms=('x64', 'Win32'),
+                      seed=0, write_items=False):
+    """ Writes a synthetic solution with the given number of NMake projects
+        and items per project, nested in some solution folders. The item
+        files themselves are only written if `write_items` is set. Returns
+        the path to the solution file.
+    """
+    rnd = random.Random(seed)
+    sep = os.sep
+    os.makedirs(outdir, exist_ok=True)
+
+    # Shared forced-include file.
+    commondir = os.path.join(outdir, 'common')
+    os.makedirs(commondir, exist_ok=True)
+    with open(os.path.join(commondir, 'pch.h'), 'w') as fp:
+        fp.write("#pragma once\n")
+
+    lines = ['\n',
+             'Microsoft Visual Studio Solution File, Format Version 12.00\n',
+             '# Visual Studio Version 16\n',
+             'VisualStudioVersion = 16.0.29509.3\n',
+             'MinimumVisualStudioVersion = 10.0.40219.1\n']
+
+    folder_guids = [_make_guid(rnd) for _ in range(folders)]
+    for i, guid in enumerate(folder_guids):
+        lines.append(
+            'Project("{%s}") = "Folder%d", "Folder%d", "{%s}"\n'
+            'EndProject\n' % (PROJ_TYPE_FOLDER, i, i, guid))
+
+    proj_guids = []
+    for i in range(projects):
+        name = 'Project%d' % i
+        guid = _make_guid(rnd)
+        proj_guids.append(guid)
+        relpath = 'projects%s%s%s%s.vcxproj' % (sep, name, sep, name)
+
+        # Make projects depend on a few of the previous ones, either with
+        # project references, or with solution-level dependencies.
+        references = []
+        sln_deps = []
+        if i > 0:
+            for j in rnd.sample(range(max(0, i - 20), i),
+                                min(i, rnd.randint(0, 3))):
+                if rnd.random() < 0.5:
+                    references.append((
+                        '..%sProject%d%sProject%d.vcxproj' % (sep, j, sep, j),
+                        proj_guids[j]))
+                else:
+                    sln_deps.append(proj_guids[j])
+
+        _write_project(os.path.join(outdir, relpath), name,
+                       configs, platforms, items, rnd, references,
+                       write_items)
+        lines.append(
+            'Project("{%s}") = "%s", "%s", "{%s}"\n' %
+            (PROJ_TYPE_NMAKE, name, relpath, guid))
+        if sln_deps:
+            lines.append('\tProjectSection(ProjectDependencies) = postProject\n')
+            for dep_guid in sln_deps:
+                lines.append('\t\t{%s} = {%s}\n' % (dep_guid, dep_guid))
+            lines.append('\tEndProjectSection\n')
+        lines.append('EndProject\n')
+
+    lines.append('Global\n')
+
+    lines.append('\tGlobalSection(SolutionConfigurationPlatforms) = preSolution\n')
+    for c in configs:
+        for p in platforms:
+            lines.append('\t\t%s|%s = %s|%s\n' % (c, p, c, p))
+    lines.append('\tEndGlobalSection\n')
+
+    lines.append('\tGlobalSection(ProjectConfigurationPlatforms) = postSolution\n')
+    for i, guid in enumerate(proj_guids):
+        for c in configs:
+            for p in platforms:
+                lines.append('\t\t{%s}.%s|%s.ActiveCfg = %s|%s\n' %
+                             (guid, c, p, c, p))
+                # Leave a few projects out of some builds.
+                if i % 17 != 0 or c == configs[0]:
+                    lines.append('\t\t{%s}.%s|%s.Build.0 = %s|%s\n' %
+                                 (guid, c, p, c, p))
+    lines.append('\tEndGlobalSection\n')
+
+    lines.append('\tGlobalSection(SolutionProperties) = preSolution\n'
+                 '\t\tHideSolutionNode = FALSE\n'
+                 '\tEndGlobalSection\n')
+
+    if folder_guids:
+        lines.append('\tGlobalSection(NestedProjects) = preSolution\n')
+        # Nest some folders in other folders, and most projects in folders.
+        for i, guid in enumerate(folder_guids[1:], 1):
+            if i % 3 == 0:
+                lines.append('\t\t{%s} = {%s}\n' %
+                             (guid, folder_guids[rnd.randrange(i)]))
+        for guid in proj_guids:
+            if rnd.random() < 0.8:
+                lines.append('\t\t{%s} = {%s}\n' %
+                             (guid, rnd.choice(folder_guids)))
+        lines.append('\tEndGlobalSection\n')
+
+    lines.append('EndGlobal\n')
+
+    slnpath = os.path.join(outdir, 'Synthetic.sln')
+    with open(slnpath, 'w', encoding='utf8') as fp:
+        fp.writelines(lines)
+    logger.debug("Wrote synthetic solution with %d projects: %s" %
+                 (projects, slnpath))
+    return slnpath
+
+
+def add_project(slnpath, name, items=100, configs=('Debug', 'Release'),
+                platforms=('x64', 'Win32'), write_items=False):
+    """ Adds a new project to a synthetic solution, like adding a project
+        to it in Visual Studio would. Returns the GUID of the new project.
+    """
+    rnd = random.Random(name)
+    sep = os.sep
+    guid = _make_guid(rnd)
+    relpath = 'projects%s%s%s%s.vcxproj' % (sep, name, sep, name)
+    _write_project(os.path.join(os.path.dirname(slnpath), relpath), name,
+                   configs, platforms, items, rnd, write_items=write_items)
+
+    with open(slnpath, 'r', encoding='utf8') as fp:
+        lines = fp.readlines()
+
+    idx = lines.index('Global\n')
+    lines[idx:idx] = [
+        'Project("{%s}") = "%s", "%s", "{%s}"\n' %
+        (PROJ_TYPE_NMAKE, name, relpath, guid),
+        'EndProject\n']
+
+    idx = lines.index(
+        '\tGlobalSection(ProjectConfigurationPlatforms) = postSolution\n')
+    cfglines = []
+    for c in configs:
+        for p in platforms:
+            cfglines.append('\t\t{%s}.%s|%s.ActiveCfg = %s|%s\n' %
+                            (guid, c, p, c, p))
+            cfglines.append('\t\t{%s}.%s|%s.Build.0 = %s|%s\n' %
+                            (guid, c, p, c, p))
+    lines[idx + 1:idx + 1] = cfglines
+
+    with open(slnpath, 'w', encoding='utf8') as fp:
+        fp.writelines(lines)
+    return guid
+
+
+def generate_build_log(outdir, projects=100, items=100, nodes=8,
+                       seed=0):
+    """ Writes a synthetic MSBuild log for building a solution generated
+        by `generate_solution`, as if it was built with `/m`. Every project
+        reports the same warning in the shared header, and some errors and
+        warnings in their own files, which are all repeated in the final
+        summary like MSBuild does. Returns the path to the log file.
+    """
+    rnd = random.Random(seed)
+    sep = os.sep
+    slnpath = os.path.join(outdir, 'Synthetic.sln')
+    pchpath = os.path.join(outdir, 'common', 'pch.h')
+
+    lines = ['Microsoft (R) Build Engine version 16.11.2+f32259642 for .NET Framework\n',
+             'Copyright (C) Microsoft Corporation. All rights reserved.\n',
+             '\n',
+             'Build started 1/1/2021 12:00:00 PM.\n',
+             '     1>Project "%s" on node 1 (default targets).\n' % slnpath,
+             '     1>ValidateSolutionConfiguration:\n',
+             '         Building solution configuration "Debug|x64".\n']
+    summary = []
+    for i in range(projects):
+        pid = i + 2
+        node = (i % nodes) + 1
+        name = 'Project%d' % i
+        projdir = os.path.join(outdir, 'projects', name)
+        projpath = os.path.join(projdir, name + '.vcxproj')
+        prefix = '%6d>' % pid
+        lines.append('     1>Project "%s" (1) is building "%s" (%d) on node %d (default targets).\n' %
+                     (slnpath, projpath, pid, node))
+        lines.append('%sPrepareForBuild:\n' % prefix)
+        lines.append('         Creating directory "x64\\Debug\\".\n')
+        lines.append('%sClCompile:\n' % prefix)
+        lines.append('         cl.exe /c /Zi /nologo /W4 /WX- /Od /D _DEBUG /EHsc /MDd /Fo"x64\\Debug\\" %s\n' %
+                     ' '.join('src%smodule%d%sfile%d.cpp' % (sep, n // 25, sep, n)
+                              for n in range(min(items // 2, 8))))
+        diags = ['%s(1,1): warning C4068: unknown pragma \'once\' [%s]\n' %
+                 (pchpath, projpath)]
+        for n in range(items // 2):
+            relpath = 'src%smodule%d%sfile%d' % (sep, n // 25, sep, n)
+            lines.append('         file%d.cpp\n' % n)
+            r = rnd.random()
+            if r < 0.05:
+                diags.append('%s.cpp(%d,%d): error C2065: \'value%d\': undeclared identifier [%s]\n' %
+                             (os.path.join(projdir, relpath), rnd.randint(1, 500),
+                              rnd.randint(1, 80), n, projpath))
+                diags.append('%s.h(%d): note: see declaration of \'Class%d\' [%s]\n' %
+                             (os.path.join(projdir, relpath), rnd.randint(1, 100),
+                              n, projpath))
+            elif r < 0.25:
+                # Warnings in relative paths, like when building with
+                # relative source paths.
+                diags.append('%s.cpp(%d): warning C4100: \'arg%d\': unreferenced formal parameter [%s]\n' %
+                             (relpath, rnd.randint(1, 500), n, projpath))
+            for d in diags:
+                lines.append(prefix + d)
+            summary += diags
+            diags = []
+        lines.append('%sLink:\n' % prefix)
+        lines.append('         %s.vcxproj -> %s\n' %
+                     (name, os.path.join(projdir, 'x64', 'Debug', name + '.exe')))
+        lines.append('%sDone Building Project "%s" (default targets).\n' %
+                     (prefix, projpath))
+
+    lines.append('     1>Done Building Project "%s" (default targets) -- FAILED.\n' % slnpath)
+    lines.append('\nBuild FAILED.\n\n')
+    lines += ['       ' + d for d in summary]
+    lines.append('    %d Warning(s)\n' % len([d for d in summary if ': warning' in d]))
+    lines.append('    %d Error(s)\n' % len([d for d in summary if ': error' in d]))
+
+    logpath = os.path.join(outdir, 'build.log')
+    with open(logpath, 'w', encoding='utf8') as fp:
+        fp.writelines(lines)
+    logger.debug("Wrote synthetic build log with %d lines: %s" %
+                 (len(lines), logpath))
+    return logpath
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Generates a synthetic Visual Studio solution.")
+    parser.add_argument('outdir',
+                        help="The directory in which to write the solution.")
+    parser.add_argument('-p', '--projects',
+                        type=int, default=100,
+                        help="The number of projects.")
+    parser.add_argument('-i', '--items',
+                        type=int, default=100,
+                        help="The number of items per project.")
+    parser.add_argument('-f', '--folders',
+                        type=int, default=10,
+                        help="The number of solution folders.")
+    parser.add_argument('--configs',
+                        default='Debug,Release',
+                        help="Comma-separated list of configurations.")
+    parser.add_argument('--platforms',
+                        default='x64,Win32',
+                        help="Comma-separated list of platforms.")
+    parser.add_argument('--write-items',
+                        action='store_true',
+                        help="Also write the project items (empty files).")
+    parser.add_argument('--build-log',
+                        action='store_true',
+                        help="Also write a synthetic MSBuild log.")
+    parser.add_argument('--seed',
+                        type=int, default=0,
+                        help="The random seed.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    slnpath = generate_solution(
+        args.outdir, projects=args.projects, items=args.items,
+        folders=args.folders,
+        configs=args.configs.split(','), platforms=args.platforms.split(','),
+        seed=args.seed, write_items=args.write_items)
+    print(slnpath)
+    if args.build_log:
+        print(generate_build_log(args.outdir, projects=args.projects,
+                                 items=args.items, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,10 @@
 import argparse
 import logging
-import re
-from vsutil import SolutionCache
+from logutil import add_profile_arguments, profiling
+from vsapi import get_project_config
 
 
-re = _re_proj_cfg_suffix = re.compile(r'\.(ActiveCfg|Build\.0)$')
-
-
-def main():
+def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('solution',
                         help="The path to the Visual Studio solution file.")
@@ -20,33 +17,28 @@ def main():
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help="Show verbose information.")
-    args = parser.parse_args()
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
 
     loglevel = logging.INFO
     if args.verbose:
         loglevel = logging.DEBUG
     logging.basicConfig(level=loglevel)
-    logger = logging.getLogger()
 
-    cache, loaded = SolutionCache.load_or_rebuild(args.solution, args.cache)
-    logger.debug("Cache was %s" % ("valid" if loaded else "not valid"))
+    with profiling(args):
+        _run(args)
 
-    proj = cache.slnobj.find_project_by_name(args.project)
-    if proj is None:
-        raise Exception("No such project: %s" % args.project)
-    projguid = '{%s}' % proj.guid
 
-    slnconfig = args.slnconfig.replace(' ', '_')
-    sec = cache.slnobj.globalsection('ProjectConfigurationPlatforms')
-    for e in sec.entries:
-        if e.name.startswith(projguid):
-            if slnconfig == e.value.replace(' ', '_'):
-                projcfg = e.name[len(projguid) + 1:]
-                projcfg = _re_proj_cfg_suffix.sub('', projcfg)
-                print(projcfg)
-                break
+def _run(args):
+    logger = logging.getLogger()
+
+    projcfg = get_project_config(args.solution, args.project, args.slnconfig,
+                                 args.cache)
+    if projcfg:
+        logger.debug("Project is %sbuilt in this configuration" %
+                     ("" if projcfg['build'] else "not "))
+        print(projcfg['config'])
 
 
 if __name__ == '__main__':
     main()
-
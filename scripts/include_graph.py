@@ -0,0 +1,363 @@
+""" Builds the graph of `#include` directives between the C/C++ files of a
+    solution, and finds the translation unit that includes a given header,
+    e.g.:
+
+        python include_graph.py Solution.sln -c .vimcrosoft/slncache.bin
+        python include_graph.py Solution.sln -c .vimcrosoft/slncache.bin \\
+            -q path/to/header.h
+
+    Files are scanned in parallel, and only scanned again when their stamp
+    changes. Includes are resolved against the files of the solution rather
+    than against include paths, so the graph is the same for all
+    configurations. Since files include files of other projects, the closest
+    translation unit can be in another project than the header, so it's
+    returned along with the GUID of its project.
+"""
+import argparse
+import bisect
+import logging
+import os
+import os.path
+import pickle
+import re
+import sys
+from fsutil import atomic_write, file_lock
+from logutil import add_profile_arguments, profiling, setup_logging, traced
+
+
+logger = logging.getLogger(__name__)
+
+
+GRAPH_VERSION = 2
+
+# Extensions of files that get compiled on their own.
+TRANSLATION_UNIT_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx')
+
+_include_re = re.compile(
+    rb'^[ \t]*#[ \t]*include[ \t]*["<]([^">\r\n]+)[">]', re.MULTILINE)
+
+
+def get_include_graph_path(cachepath):
+    """ Returns the path of the include graph that goes with the given
+        solution cache.
+    """
+    if not cachepath:
+        raise Exception("The include graph needs a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'includes.bin')
+
+
+def scan_includes(path):
+    """ Returns the names of the files included by the given file, as
+        written in its `#include` directives.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return []
+    if b'include' not in data:
+        return []
+    return [m.decode('utf8', 'replace') for m in _include_re.findall(data)]
+
+
+def _scan_files(paths):
+    return [scan_includes(p) for p in paths]
+
+
+class IncludeGraph:
+    """ The include graph of a set of files. Paths are looked up ignoring
+        case, like the solution cache does.
+    """
+    def __init__(self):
+        # Scanned files, as (stamp, include names) tuples.
+        self.files = {}
+        # Lower-case paths of files, mapped to the GUID of the project they
+        # were listed for.
+        self.projects = {}
+        # Lower-case paths of files, mapped to the lower-case paths of the
+        # files they include.
+        self.includes = {}
+        # Lower-case paths of included files, mapped to the closest
+        # translation unit that includes them, and the GUID of its project.
+        self.closest_units = {}
+
+    def find_closest_unit(self, path):
+        """ Returns the path of the translation unit that includes the given
+            file through the fewest `#include` directives, along with the
+            GUID of its project, or `None` if no translation unit includes
+            it.
+        """
+        return self.closest_units.get(path.lower())
+
+    @traced('includes.update')
+    def update(self, paths, jobs=None):
+        """ Updates the graph for the given files, scanning only the new ones
+            and the ones whose stamp changed. `paths` maps the path of each
+            file to the GUID of its project. Returns the number of scanned
+            files, and whether the graph changed, which it also does when
+            files were only removed, or moved to another project.
+        """
+        from project_stamps import group_by_dir, stat_files
+        stamps = {}
+        for _, stats in stat_files(group_by_dir(paths)).values():
+            stamps.update(stats)
+
+        prev_files = self.files
+        files = {}
+        to_scan = []
+        for path, stamp in stamps.items():
+            prev = prev_files.get(path)
+            if prev is not None and prev[0] == stamp:
+                files[path] = prev
+            else:
+                to_scan.append(path)
+
+        projects = {p.lower(): guid for p, guid in paths.items()}
+        if to_scan:
+            for path, names in zip(to_scan, self._scan(to_scan, jobs)):
+                files[path] = (stamps[path], names)
+        elif (files.keys() == prev_files.keys() and
+                projects == self.projects):
+            logger.debug("Include graph is up to date.")
+            return 0, False
+
+        self.files = files
+        self.projects = projects
+        self._resolve()
+        self._find_closest_units()
+        logger.debug(f"Scanned {len(to_scan)} of {len(files)} files.")
+        return len(to_scan), True
+
+    @traced('includes.scan')
+    def _scan(self, paths, jobs):
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        # Don't start processes from inside Vim: on Windows, that would
+        # start new Vim instances.
+        if jobs > 1 and len(paths) > 100 and 'vim' not in sys.modules:
+            from concurrent.futures import ProcessPoolExecutor
+            size = max(64, len(paths) // (jobs * 4))
+            chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = []
+                for chunk_names in pool.map(_scan_files, chunks):
+                    results += chunk_names
+            return results
+        return _scan_files(paths)
+
+    def _resolve(self):
+        # Index files by name, so includes can be matched by path suffix.
+        known = set()
+        by_name = {}
+        for path in self.files:
+            lpath = path.lower()
+            known.add(lpath)
+            by_name.setdefault(os.path.basename(lpath), []).append(lpath)
+        for paths in by_name.values():
+            paths.sort()
+
+        by_suffix = {}
+        resolved = {}
+        self.includes = {}
+        for path, (_, names) in self.files.items():
+            lpath = path.lower()
+            dirpath = os.path.dirname(lpath)
+            targets = []
+            for name in names:
+                key = (dirpath, name)
+                target = resolved.get(key, False)
+                if target is False:
+                    target = _resolve_include(dirpath, name.lower(), known,
+                                              by_name, by_suffix)
+                    resolved[key] = target
+                if target is not None:
+                    targets.append(target)
+            self.includes[lpath] = targets
+
+    def _find_closest_units(self):
+        # Walk the graph from all translation units at once, one level of
+        # includes at a time, so that each file is reached first from the
+        # closest ones.
+        real_paths = {p.lower(): p for p in self.files}
+        origins = {}
+        level = []
+        for lpath in self.includes:
+            if lpath.endswith(TRANSLATION_UNIT_EXTENSIONS):
+                origins[lpath] = lpath
+                level.append(lpath)
+
+        while level:
+            candidates = {}
+            for lpath in level:
+                unit = origins[lpath]
+                for target in self.includes[lpath]:
+                    if target not in origins:
+                        candidates.setdefault(target, set()).add(unit)
+            for target, units in candidates.items():
+                if len(units) == 1:
+                    origins[target] = units.pop()
+                else:
+                    # Break ties with the unit closest in the file system,
+                    # e.g. the header's companion source file.
+                    origins[target] = _find_closest_path(sorted(units),
+                                                         target)
+            level = list(candidates)
+
+        self.closest_units = {p: (real_paths[u], self.projects.get(u))
+                              for p, u in origins.items() if p != u}
+
+
+def _find_closest_path(paths, path):
+    # In a sorted list, the path sharing the longest prefix with another
+    # path is right before or after where that other path would go.
+    i = bisect.bisect_left(paths, path)
+    return max(paths[max(0, i - 1):i + 1],
+               key=lambda p: len(os.path.commonprefix([p, path])))
+
+
+def _resolve_include(dirpath, name, known, by_name, by_suffix):
+    name = name.replace('\\', '/')
+    # Quoted includes are looked up next to the including file first.
+    relpath = os.path.normpath(os.path.join(dirpath, name))
+    if relpath in known:
+        return relpath
+
+    # Otherwise, include paths could point anywhere, so match files by
+    # path suffix, and pick the one closest to the including file.
+    parts = [p for p in name.split('/') if p not in ('', '.', '..')]
+    if not parts:
+        return None
+    suffix = os.sep + os.sep.join(parts)
+    matches = by_suffix.get(suffix)
+    if matches is None:
+        matches = [p for p in by_name.get(parts[-1], ())
+                   if p.endswith(suffix)]
+        by_suffix[suffix] = matches
+    if not matches:
+        # Not a file of the solution, like a system header.
+        return None
+    return _find_closest_path(matches, dirpath)
+
+
+def load_include_graph(graphpath, lookup_only=False):
+    """ Loads a saved include graph. Returns an empty graph if nothing
+        valid was saved yet. If `lookup_only` is set, only what's needed to
+        find the closest units is loaded, which is a lot faster.
+    """
+    graph = IncludeGraph()
+    try:
+        with open(graphpath, 'rb') as fp:
+            # The closest units are saved before the scanned files, so that
+            # lookups can stop reading early.
+            if pickle.load(fp) != GRAPH_VERSION:
+                return graph
+            graph.closest_units = pickle.load(fp)
+            if not lookup_only:
+                graph.files = pickle.load(fp)
+                graph.projects = pickle.load(fp)
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        logger.warning(f"Ignoring invalid include graph: {ex}")
+        graph = IncludeGraph()
+    return graph
+
+
+def save_include_graph(graph, graphpath):
+    """ Saves an include graph. The resolved includes aren't saved, since
+        they're resolved again whenever any file changes anyway.
+    """
+    with atomic_write(graphpath, 'wb') as fp:
+        pickle.dump(GRAPH_VERSION, fp)
+        pickle.dump(graph.closest_units, fp)
+        pickle.dump(graph.files, fp)
+        pickle.dump(graph.projects, fp)
+
+
+# Loaded graphs, keyed by path, as (graph, graph file time).
+_graphs = {}
+
+
+def get_include_graph(graphpath):
+    """ Returns the saved include graph, for looking up closest units only,
+        re-using the one loaded by a previous call if the file didn't
+        change. Returns `None` if the graph was never built.
+    """
+    try:
+        graph_dt = os.path.getmtime(graphpath)
+    except OSError:
+        return None
+    entry = _graphs.get(graphpath)
+    if entry is not None and entry[1] == graph_dt:
+        return entry[0]
+    graph = load_include_graph(graphpath, lookup_only=True)
+    _graphs[graphpath] = (graph, graph_dt)
+    return graph
+
+
+def update_include_graph(cache, graphpath, jobs=None):
+    """ Updates the saved include graph with the current C/C++ files of
+        the given solution cache. Returns the number of scanned files.
+    """
+    from vsapi import iter_project_files
+    from vsutil import ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR
+    projs = [p for p in cache.slnobj.projects if not p.is_folder]
+    paths = {}
+    for proj, projpaths in zip(projs, iter_project_files(
+            projs, (ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR))):
+        # Files in several projects go with the first one.
+        for path in projpaths:
+            paths.setdefault(path, proj.guid)
+
+    with file_lock(graphpath + '.lock'):
+        graph = load_include_graph(graphpath)
+        scanned, changed = graph.update(paths, jobs=jobs)
+        if changed or not os.path.exists(graphpath):
+            save_include_graph(graph, graphpath)
+    return scanned
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Updates the include graph of a solution, or finds the "
+                     "translation unit that includes a header."))
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('-c', '--cache',
+                        required=True,
+                        help=("The path to the solution cache. The include "
+                              "graph is saved next to it."))
+    parser.add_argument('-q', '--query',
+                        action='append',
+                        help=("Print the closest translation unit including "
+                              "the given file(s), instead of updating the "
+                              "graph."))
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        help="How many processes to scan files with.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    from vsapi import find_including_unit, update_include_graph
+    if args.query:
+        for path in args.query:
+            unit = find_including_unit(args.solution, os.path.abspath(path),
+                                       cachepath=args.cache)
+            print(unit[0] if unit else '')
+        return
+
+    scanned = update_include_graph(args.solution, args.cache, jobs=args.jobs)
+    logger.info(f"Scanned {scanned} files.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import logging
+from logutil import setup_logging, add_profile_arguments, profiling
+from vsapi import find_affected_projects, get_project_dependencies
+
+
+logger = logging.getLogger(__name__)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Lists the projects that need to be rebuilt when the "
+                     "given files change, in build order."))
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('files',
+                        nargs='*',
+                        help="The changed files (sources or projects).")
+    parser.add_argument('-c', '--cache',
+                        help="The path to the solution cache.")
+    parser.add_argument('-d', '--dependencies-of',
+                        metavar='PROJECT',
+                        help=("Instead, list the projects that the given "
+                              "project depends on."))
+    parser.add_argument('-r', '--recursive',
+                        action='store_true',
+                        help="With --dependencies-of, list indirect "
+                             "dependencies too.")
+    parser.add_argument('-p', '--paths',
+                        action='store_true',
+                        help="Print project paths instead of names.")
+    parser.add_argument('-f', '--full-names',
+                        action='store_true',
+                        help=("Print full names for nested projects, which "
+                              "is what MSBuild names their targets."))
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    # Allow options between the solution and the files.
+    args = parser.parse_intermixed_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    if args.dependencies_of:
+        names = get_project_dependencies(args.solution, args.dependencies_of,
+                                         args.cache,
+                                         recursive=args.recursive)
+        for name in names:
+            print(name)
+        return
+
+    projs = find_affected_projects(args.solution, args.files, args.cache)
+    logger.debug("Found {0} affected projects:".format(len(projs)))
+    if args.paths:
+        key = 'path'
+    elif args.full_names:
+        key = 'full_name'
+    else:
+        key = 'name'
+    for proj in projs:
+        print(proj[key])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import argparse
 import logging
-from logutil import setup_logging
-from vsutil import SolutionCache
+from logutil import setup_logging, add_profile_arguments, profiling
+from sln_meta import get_sln_meta
 
 
 logger = logging.getLogger(__name__)
@@ -16,15 +16,19 @@ def main(args=None):
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help="Show verbose information.")
+    add_profile_arguments(parser)
     args = parser.parse_args(args)
     setup_logging(args.verbose)
 
-    cache, _ = SolutionCache.load_or_rebuild(args.solution, args.cache)
-    sec = cache.slnobj.globalsection('SolutionConfigurationPlatforms')
-    for e in sec.entries:
-        config, platform = e.name.split('|')
-        if config != "Invalid" and platform != "Invalid":
-            print(e.name)
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    # Don't go through `vsapi`, which takes a while to import, and is only
+    # needed if the solution metadata has to be saved again.
+    for name in get_sln_meta(args.solution, args.cache)['configs']:
+        print(name)
 
 
 if __name__ == '__main__':
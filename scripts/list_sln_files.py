@@ -1,13 +1,237 @@
 import argparse
 import logging
+import os
 import os.path
-from logutil import setup_logging
+import sys
+import time
+from fsutil import atomic_write
+from logutil import setup_logging, add_profile_arguments, profiling
+from vsapi import iter_project_files
 from vsutil import SolutionCache, ITEM_TYPE_SOURCE_FILES
 
 
 logger = logging.getLogger(__name__)
 
 
+def _get_list_cache_path(list_cache, project, itemtypes, separator):
+    """ Returns the path of the file list cache for the given filters.
+        The base path given on the command line is suffixed with a hash
+        of the filters so that differently filtered lists don't trample
+        each other.
+    """
+    import hashlib
+    key = '\n'.join([
+        project or '',
+        ';'.join(sorted(itemtypes)),
+        repr(separator)])
+    keyhash = hashlib.sha1(key.encode('utf8')).hexdigest()[:12]
+    name, ext = os.path.splitext(list_cache)
+    return '%s-%s%s' % (name, keyhash, ext)
+
+
+def _iter_file_chunks(projs, itemtypes, separator):
+    """ Yields, for each project, one chunk of text with the absolute
+        paths of its items, each path followed by the separator.
+    """
+    for paths in iter_project_files(projs, itemtypes):
+        if paths:
+            paths.append('')
+            yield separator.join(paths)
+
+
+_cmd_launcher_template = """@echo off
+rem Generated by vimcrosoft's list_sln_files.py, do not edit.
+setlocal
+set "LIST={list}"
+set "STAMP={stamp}"
+set "INPUTS={inputs}"
+if "%~1"=="--write-stamp" (
+    call :stamp > "%STAMP%"
+    exit /b 0
+)
+if not exist "%LIST%" goto fallback
+if not exist "%STAMP%" goto fallback
+set "CURSTAMP=%STAMP%.%RANDOM%"
+call :stamp > "%CURSTAMP%"
+fc /b "%STAMP%" "%CURSTAMP%" > nul 2>&1
+if errorlevel 1 (
+    del "%CURSTAMP%" > nul 2>&1
+    goto fallback
+)
+del "%CURSTAMP%" > nul 2>&1
+type "%LIST%"
+exit /b 0
+:fallback
+{fallback}
+exit /b %errorlevel%
+:stamp
+for /f "usebackq delims=" %%F in ("%INPUTS%") do @echo %%~tF %%~zF %%F
+exit /b 0
+"""
+
+_sh_launcher_template = """#!/bin/sh
+# Generated by vimcrosoft's list_sln_files.py, do not edit.
+list={list}
+stamp={stamp}
+inputs={inputs}
+fallback() {{
+    exec {fallback}
+}}
+[ -f "$list" ] && [ -f "$stamp" ] && [ -f "$inputs" ] || fallback
+while IFS= read -r f; do
+    case "$f" in
+        -*) [ -e "${{f#-}}" ] && fallback ;;
+        *) [ "${{f#+}}" -nt "$stamp" ] && fallback ;;
+    esac
+done < "$inputs"
+exec cat "$list"
+"""
+
+
+def _get_launcher_fallback_args(args):
+    """ Returns the command line to run this script again with the same
+        arguments, for when the launcher finds that the list is stale.
+    """
+    scriptpath = os.path.abspath(__file__)
+    if os.path.isfile(scriptpath):
+        fallback = ['python', scriptpath]
+    else:
+        # We're running from the zipapp built by `make_zipapp.py`, so run
+        # that with the matching sub-command.
+        fallback = ['python', os.path.dirname(scriptpath), 'list-files']
+    fallback.append(os.path.abspath(args.solution))
+    if args.cache:
+        fallback += ['--cache', os.path.abspath(args.cache)]
+    fallback += ['--list-cache', os.path.abspath(args.list_cache),
+                 '--launcher', os.path.abspath(args.launcher)]
+    if args.project:
+        fallback += ['--project', args.project]
+    for t in (args.type or []):
+        fallback += ['--type', t]
+    if args.null:
+        fallback.append('--null')
+    return fallback
+
+
+def _write_launcher(args, list_cache):
+    """ Writes a tiny shell script that prints the file list cache directly
+        if its validity stamp still matches the solution and project files,
+        or runs this script otherwise.
+    """
+    import shlex
+    import subprocess
+    fallback = _get_launcher_fallback_args(args)
+    paths = {'list': os.path.abspath(list_cache),
+             'stamp': os.path.abspath(list_cache + '.stamp'),
+             'inputs': os.path.abspath(list_cache + '.inputs')}
+    if os.name == 'nt':
+        text = _cmd_launcher_template.format(
+            fallback=subprocess.list2cmdline(fallback), **paths)
+    else:
+        text = _sh_launcher_template.format(
+            fallback=' '.join([shlex.quote(a) for a in fallback]),
+            **{k: shlex.quote(v) for k, v in paths.items()})
+
+    try:
+        with open(args.launcher, 'r') as fp:
+            if fp.read() == text:
+                return
+    except OSError:
+        pass
+
+    logger.debug("Writing file list launcher: %s" % args.launcher)
+    with atomic_write(args.launcher, 'w') as fp:
+        fp.write(text)
+    if os.name != 'nt':
+        os.chmod(args.launcher, 0o755)
+
+
+def _any_modified_since(paths, since):
+    for path in paths:
+        try:
+            if os.path.getmtime(path) >= since:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def _write_stamp(launcher, list_cache, slnpath, projs, start_time):
+    """ Writes the validity stamp of the file list cache, which the launcher
+        uses to know whether it can print the list without running Python.
+        The stamp covers the solution file, all project files, and the
+        directories that wildcard items were expanded from.
+    """
+    inputs = [os.path.abspath(slnpath)] + [p.abspath for p in projs]
+    for p in projs:
+        inputs += p._globdirs.keys()
+    inputs = list(dict.fromkeys(inputs))
+    stamp = list_cache + '.stamp'
+
+    if os.name == 'nt':
+        # The stamp is whatever the launcher itself computes from the file
+        # times and sizes, since batch files can't compare file times.
+        import subprocess
+        with atomic_write(list_cache + '.inputs', 'w') as fp:
+            fp.writelines([i + '\n' for i in inputs])
+        subprocess.run(['cmd', '/c', launcher, '--write-stamp'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # File times in batch files only go down to the minute, so a file
+        # modified during the minute we started in could change again
+        # within that minute, keeping the same stamp.
+        granularity = 60
+    else:
+        # The launcher checks that no input file is newer than the stamp.
+        # Date the stamp from before we read anything, so that files
+        # modified in the meantime are also considered newer.
+        with atomic_write(list_cache + '.inputs', 'w') as fp:
+            fp.writelines([('+' if os.path.exists(i) else '-') + i + '\n'
+                           for i in inputs])
+        with open(stamp, 'w'):
+            pass
+        os.utime(stamp, (start_time, start_time))
+        # Some shells (like older versions of dash) only compare whole
+        # seconds with `-nt`, so a file modified during the second we
+        # started in, after we read it, wouldn't look newer.
+        granularity = 1
+
+    # Don't leave a stamp if an input changed during the minute or second
+    # we started in: the launcher falls back to this script until it runs
+    # later, after which any change shows.
+    if _any_modified_since(inputs, start_time // granularity * granularity):
+        logger.debug("Inputs changed too recently for a stamp.")
+        try:
+            os.remove(stamp)
+        except FileNotFoundError:
+            pass
+        return
+    logger.debug("Wrote file list stamp: %s" % stamp)
+
+
+class _StdoutWriter:
+    """ Writes to stdout until the reader goes away (e.g. when fzf exits
+        before we're done), after which further output is dropped.
+    """
+    def __init__(self):
+        self.closed = False
+
+    def write(self, text):
+        if self.closed:
+            return
+        try:
+            sys.stdout.write(text)
+        except BrokenPipeError:
+            logger.debug("Output pipe was closed.")
+            self.closed = True
+            # Prevent Python from complaining again when it flushes stdout
+            # on exit.
+            try:
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+            except (AttributeError, OSError, ValueError):
+                pass
+
+
 def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('solution',
@@ -20,32 +244,69 @@ def main(args=None):
     parser.add_argument('--list-cache',
                         help=("If the solution cache is valid, use this "
                               "pre-saved file list. Otherwise, compute the "
-                              "file list and save it to the given path."))
+                              "file list and save it to the given path. "
+                              "The path is suffixed with a hash of the "
+                              "filtering options."))
+    parser.add_argument('--launcher',
+                        help=("Also write a launcher script at the given "
+                              "path, which prints the file list cache "
+                              "without running Python when it's still "
+                              "valid. Requires --list-cache."))
     parser.add_argument('-p', '--project',
                         help="Only list files in the named project.")
     parser.add_argument('-t', '--type',
                         action='append',
                         help="The type(s) of items to list.")
+    parser.add_argument('-0', '--null',
+                        action='store_true',
+                        help=("Separate file paths with NUL characters "
+                              "instead of new lines."))
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help="Show verbose information.")
+    add_profile_arguments(parser)
     args = parser.parse_args(args)
     setup_logging(args.verbose)
+    if args.launcher and not args.list_cache:
+        parser.error("--launcher requires --list-cache")
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    start_time = time.time()
+    itemtypes = args.type or ITEM_TYPE_SOURCE_FILES
+    separator = '\0' if args.null else '\n'
+    list_cache = None
+    if args.list_cache:
+        list_cache = _get_list_cache_path(
+            args.list_cache, args.project, itemtypes, separator)
 
     cache, loaded = SolutionCache.load_or_rebuild(args.solution, args.cache,
                                                   args.rebuild_cache)
-    if loaded and args.list_cache:
+    slnobj = cache.slnobj
+    all_projs = list(filter(lambda p: not p.is_folder, slnobj.projects))
+
+    if args.launcher:
+        _write_launcher(args, list_cache)
+
+    if loaded and list_cache:
         caches_exist = True
         try:
             cache_dt = os.path.getmtime(args.cache)
-            list_cache_dt = os.path.getmtime(args.list_cache)
+            list_cache_dt = os.path.getmtime(list_cache)
         except OSError:
             caches_exist = False
         if caches_exist and list_cache_dt > cache_dt:
             logger.debug("Solution cache was valid, re-using the file list cache.")
+            import shutil
             try:
-                with open(args.list_cache, 'r') as fp:
-                    print(fp.read())
+                with open(list_cache, 'r', newline='') as fp:
+                    shutil.copyfileobj(fp, _StdoutWriter())
+                if args.launcher:
+                    _write_stamp(args.launcher, list_cache, args.solution,
+                                 all_projs, start_time)
                 return
             except OSError:
                 logger.debug("File list cache unreachable, recomputing it.")
@@ -53,30 +314,25 @@ def main(args=None):
             logger.debug("Solution cache was valid but file list cache was older, "
                          "recomputing it.")
 
-    slnobj = cache.slnobj
-
-    projs = slnobj.projects
+    projs = all_projs
     if args.project:
         projs = [slnobj.find_project_by_name(args.project)]
-    projs = list(filter(lambda p: not p.is_folder, projs))
 
-    itemtypes = args.type or ITEM_TYPE_SOURCE_FILES
-    items = []
+    out = _StdoutWriter()
+    chunks = _iter_file_chunks(projs, itemtypes, separator)
+    if not list_cache:
+        for chunk in chunks:
+            out.write(chunk)
+        return
 
-    for p in projs:
-        ig = p.defaultitemgroup()
-        if ig is None:
-            continue
-        for i in ig.get_items_of_types(itemtypes):
-            if i.include:
-                file_path = os.path.abspath(os.path.join(p.absdirpath, i.include))
-                print(file_path)
-                items.append(file_path + '\n')
-
-    if args.list_cache:
-        logger.debug("Writing file list cache: %s" % args.list_cache)
-        with open(args.list_cache, 'w') as fp:
-            fp.writelines(items)
+    logger.debug("Writing file list cache: %s" % list_cache)
+    with atomic_write(list_cache, 'w', newline='') as fp:
+        for chunk in chunks:
+            out.write(chunk)
+            fp.write(chunk)
+    if args.launcher:
+        _write_stamp(args.launcher, list_cache, args.solution, all_projs,
+                     start_time)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
 import argparse
 import logging
-from logutil import setup_logging
-from vsutil import SolutionCache
+from logutil import setup_logging, add_profile_arguments, profiling
+from sln_meta import find_project_full_names, get_sln_meta
 
 
 logger = logging.getLogger(__name__)
@@ -16,43 +16,33 @@ def main(args=None):
     parser.add_argument('-f', '--full-names',
                         action='store_true',
                         help="Print full names for nested projects.")
+    parser.add_argument('--prefix',
+                        help=("Only print full names starting with the given "
+                              "prefix (case-insensitive). Implies "
+                              "--full-names."))
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help="Show verbose information.")
+    add_profile_arguments(parser)
     args = parser.parse_args(args)
     setup_logging(args.verbose)
 
-    cache, _ = SolutionCache.load_or_rebuild(args.solution, args.cache)
-    slnobj = cache.slnobj
-    logger.debug("Found {0} projects:".format(len(slnobj.projects)))
-
-    non_folder_projs = list(filter(lambda p: not p.is_folder,
-                                   slnobj.projects))
-    if args.full_names:
-        parenting = {}
-        nesting_sec = slnobj.globalsection("NestedProjects")
-        if nesting_sec:
-            for entry in nesting_sec.entries:
-                child_guid, parent_guid = (entry.name.strip('{}'),
-                                           entry.value.strip('{}'))
-                child = slnobj.find_project_by_guid(child_guid, False)
-                parent = slnobj.find_project_by_guid(parent_guid, False)
-                parenting[child] = parent
-
-        for p in non_folder_projs:
-            full_name = p.name
-            cur_p = p
-            while True:
-                cur_p = parenting.get(cur_p)
-                if not cur_p:
-                    break
-                full_name = cur_p.name + "\\" + full_name
-            print(full_name)
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    # Don't go through `vsapi`, which takes a while to import, and is only
+    # needed if the solution metadata has to be saved again.
+    meta = get_sln_meta(args.solution, args.cache)
+    if args.full_names or args.prefix:
+        names = find_project_full_names(meta, args.prefix)
     else:
-        for p in non_folder_projs:
-            print(p.name)
+        names = meta['projects']
+    logger.debug("Found {0} projects:".format(len(names)))
+    for name in names:
+        print(name)
 
 
 if __name__ == '__main__':
     main()
-
@@ -1,4 +1,9 @@
+import collections
+import contextlib
+import functools
 import logging
+import sys
+import time
 
 
 def setup_logging(verbose):
@@ -7,3 +12,147 @@ def setup_logging(verbose):
         loglevel = logging.DEBUG
     logging.basicConfig(level=loglevel)
 
+
+class SpanStats:
+    """ Aggregated timings for all the spans of a given name. """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+
+_span_stats = {}
+_traced_calls = []
+
+# How many traced calls to remember in `recent_calls`.
+RECENT_CALLS_MAX = 100
+
+recent_calls = collections.deque(maxlen=RECENT_CALLS_MAX)
+
+
+class span:
+    """ A named timing span, to be used with a `with` statement. Timings
+        are aggregated by name, and also recorded on the current traced
+        call, if any (see `traced_call`).
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        duration = time.perf_counter() - self.start
+        stats = _span_stats.get(self.name)
+        if stats is None:
+            stats = SpanStats(self.name)
+            _span_stats[self.name] = stats
+        stats.add(duration)
+        if _traced_calls:
+            _traced_calls[-1]['spans'].append((self.name, duration))
+        return False
+
+
+def traced(name):
+    """ A decorator that wraps a function in a timing span. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def traced_call(name, **info):
+    """ Records the timings of one call (e.g. one request from ycmd), along
+        with the spans that happened during it, in the bounded
+        `recent_calls` buffer.
+    """
+    record = {'name': name,
+              'info': info,
+              'time': time.time(),
+              'duration': None,
+              'spans': []}
+    _traced_calls.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['duration'] = time.perf_counter() - start
+        _traced_calls.pop()
+        recent_calls.append(record)
+
+
+def get_span_stats():
+    """ Returns the aggregated span timings, slowest first. """
+    return sorted(_span_stats.values(), key=lambda s: s.total, reverse=True)
+
+
+def reset_span_stats():
+    _span_stats.clear()
+
+
+def format_span_summary():
+    lines = ["%-32s %8s %12s %12s" % ("span", "count", "total (ms)", "max (ms)")]
+    for s in get_span_stats():
+        lines.append("%-32s %8d %12.2f %12.2f" % (
+            s.name, s.count, s.total * 1000, s.max * 1000))
+    return '\n'.join(lines) + '\n'
+
+
+def format_recent_calls():
+    lines = []
+    for call in recent_calls:
+        lines.append("%s %s: %.2fms" % (
+            time.strftime('%H:%M:%S', time.localtime(call['time'])),
+            call['name'], call['duration'] * 1000))
+        for k, v in call['info'].items():
+            lines.append("    %s=%s" % (k, v))
+        for name, duration in call['spans']:
+            lines.append("    [%s] %.2fms" % (name, duration * 1000))
+    return '\n'.join(lines) + '\n'
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help="Print a summary of timing spans on exit.")
+    parser.add_argument('--profile-output',
+                        help=("Run under cProfile and write the stats to "
+                              "the given file. Implies --profile."))
+
+
+@contextlib.contextmanager
+def profiling(args):
+    """ Profiles the body of the `with` statement according to the options
+        added by `add_profile_arguments`.
+    """
+    if not args.profile and not args.profile_output:
+        yield
+        return
+
+    reset_span_stats()
+    prof = None
+    if args.profile_output:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+    try:
+        yield
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(args.profile_output)
+        sys.stderr.write(format_span_summary())
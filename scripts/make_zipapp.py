@@ -0,0 +1,90 @@
+import argparse
+import logging
+import os
+import os.path
+import py_compile
+import shutil
+import tempfile
+import zipapp
+from logutil import setup_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# Scripts that are only useful for developing vimcrosoft itself.
+EXCLUDED_SCRIPTS = {
+    'make_zipapp.py',
+    'bench_startup.py',
+    'gen_synthetic_sln.py',
+    'run_benchmarks.py',
+}
+
+
+def make_zipapp(outpath, interpreter=None, compressed=False,
+                precompile=True):
+    """ Packs the scripts into a single zipapp whose entry point is the
+        `vimcrosoft` command, so that it can be run with
+        `python vimcrosoft.pyz <command> ...`.
+
+        Python doesn't write bytecode caches for modules imported from a
+        zip file, so unless `precompile` is false, the scripts are also
+        compiled and stored next to their source. The compiled files are
+        ignored if the zipapp is run by a different version of Python.
+    """
+    scriptsdir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as stagedir:
+        for name in sorted(os.listdir(scriptsdir)):
+            if (not name.endswith('.py') or name == '__init__.py' or
+                    name in EXCLUDED_SCRIPTS):
+                continue
+            src = os.path.join(scriptsdir, name)
+            dst = os.path.join(stagedir, name)
+            shutil.copy2(src, dst)
+            if precompile:
+                # Use the old layout, with `foo.pyc` next to `foo.py`, which
+                # is what zipimport looks for. Don't check the timestamps
+                # since the sources can't change inside the zipapp.
+                py_compile.compile(
+                    dst, cfile=(dst + 'c'), dfile=name, doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            logger.debug("Adding: %s" % name)
+
+        zipapp.create_archive(stagedir, outpath,
+                              interpreter=interpreter,
+                              main='vimcrosoft:run',
+                              compressed=compressed)
+    logger.debug("Wrote zipapp: %s" % outpath)
+    return outpath
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Packs the vimcrosoft scripts into a zipapp.")
+    parser.add_argument('-o', '--output',
+                        default='vimcrosoft.pyz',
+                        help="The path of the zipapp to write.")
+    parser.add_argument('-p', '--python',
+                        help=("The interpreter to put in the zipapp's "
+                              "shebang line, if any."))
+    parser.add_argument('--compress',
+                        action='store_true',
+                        help=("Compress the files in the zipapp. This makes "
+                              "it smaller but slower to start."))
+    parser.add_argument('--no-compile',
+                        action='store_true',
+                        help="Don't add compiled bytecode to the zipapp.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    outpath = make_zipapp(args.output, interpreter=args.python,
+                          compressed=args.compress,
+                          precompile=not args.no_compile)
+    print(outpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+""" Parses MSBuild console output into quickfix entries, printed as one
+    JSON object per line as soon as they're found, e.g.:
+
+        msbuild Solution.sln | python parse_build_output.py -s Solution.sln
+
+    Or, to run MSBuild and parse its output as it builds:
+
+        python parse_build_output.py -s Solution.sln -- msbuild Solution.sln
+
+    Diagnostics are parsed in a single pass, so memory doesn't grow with
+    the size of the log, except for remembering which diagnostics were
+    already printed: MSBuild repeats diagnostics from shared headers once
+    per project, and again in its final summary.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os.path
+import re
+import sys
+from logutil import add_profile_arguments, profiling, setup_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# Quickfix entry types for each MSBuild diagnostic category.
+DIAGNOSTIC_TYPES = {
+    'error': 'E',
+    'warning': 'W',
+    'note': 'I',
+}
+
+# The prefix of lines logged when building with `/m`, which is the ID of
+# the project instance that logged them.
+_prefix_re = re.compile(r'^\s*(?P<id>\d+)>')
+
+# A canonical MSBuild diagnostic, i.e.:
+#   Origin[(Position)] : [Subcategory] Category [Code] : Text [Project]
+_diag_re = re.compile(
+    r'^\s*(?P<origin>\S.*?)'
+    r'(?:\((?P<pos>\d+(?:[-,]\d+)*)\))?'
+    r'\s*:\s*'
+    r'(?:(?P<subcat>[A-Za-z][A-Za-z ]*?)\s+)?'
+    r'(?P<cat>error|warning|note)'
+    r'(?:\s+(?P<code>[A-Za-z]+\d+))?'
+    r'\s*:\s?'
+    r'(?P<text>.*?)'
+    r'(?:\s+\[(?P<proj>[^\]]+)\])?\s*$')
+
+# A project starting to build another one, e.g.:
+#   Project "Sln.sln" (1) is building "Proj.vcxproj" (2:3) on node 1 (...)
+_project_re = re.compile(
+    r'^\s*Project "(?P<parent>[^"]+)"(?: \((?P<parent_id>\d+)(?::\d+)?\))?'
+    r'(?: is building "(?P<path>[^"]+)" \((?P<id>\d+)(?::\d+)?\))?')
+
+# A project being done, e.g.:
+#   Done Building Project "Proj.vcxproj" (default targets).
+_done_re = re.compile(r'^\s*Done Building Project "(?P<path>[^"]+)"')
+
+
+class BuildOutputParser:
+    """ Turns lines of MSBuild output into quickfix entries, i.e.
+        dictionaries that can be passed to Vim's `setqflist`, plus a
+        `project` entry with the path to the project that logged them.
+
+        Relative file paths are made absolute against the directory of
+        that project if it's known, and against the solution directory
+        otherwise. Repeated diagnostics are only returned the first time
+        they're found, unless `dedupe` is False.
+    """
+    def __init__(self, slndir=None, dedupe=True):
+        self.slndir = os.path.abspath(slndir or os.getcwd())
+        self.dedupe = dedupe
+        self.counts = {'E': 0, 'W': 0, 'I': 0}
+        self.duplicates = 0
+        self._seen = set()
+        self._abspaths = {}
+        self._projdirs = {}
+        self._projects_by_id = {}
+        self._project_stack = []
+
+    def parse(self, lines):
+        """ Yields the quickfix entries found in the given lines. """
+        feed = self.feed
+        for line in lines:
+            # Most lines are compiler and target chatter, so only run the
+            # regexes on lines that could be interesting.
+            if ('error' in line or 'warning' in line or 'note' in line or
+                    'Project "' in line):
+                entry = feed(line)
+                if entry is not None:
+                    yield entry
+
+    def feed(self, line):
+        """ Parses one line of output, and returns the quickfix entry for
+            it, if any.
+        """
+        instance_id = None
+        m = _prefix_re.match(line)
+        if m:
+            instance_id = m.group('id')
+            line = line[m.end():]
+
+        m = _diag_re.match(line)
+        if m:
+            return self._make_entry(m, instance_id)
+
+        m = _project_re.match(line)
+        if m:
+            path = m.group('path')
+            if path:
+                self._projects_by_id[m.group('id')] = path
+                self._project_stack.append(path)
+            elif not self._project_stack:
+                # The root project, i.e. the solution, or the project
+                # being built on its own.
+                self._project_stack.append(m.group('parent'))
+            return None
+
+        m = _done_re.match(line)
+        if m and self._project_stack:
+            self._project_stack.pop()
+        return None
+
+    def _get_project(self, instance_id):
+        if instance_id is not None:
+            proj = self._projects_by_id.get(instance_id)
+            if proj:
+                return proj
+        if self._project_stack:
+            return self._project_stack[-1]
+        return None
+
+    def _make_entry(self, m, instance_id):
+        etype = DIAGNOSTIC_TYPES[m.group('cat')]
+        text = m.group('text')
+        code = m.group('code')
+        if code:
+            text = '%s: %s' % (code, text)
+        subcat = m.group('subcat')
+        if subcat:
+            # e.g. "fatal error"
+            text = '%s %s' % (subcat, text)
+
+        proj = m.group('proj') or self._get_project(instance_id)
+        projdir = None
+        if proj:
+            proj = self._abspath(proj, self.slndir)
+            projdir = self._projdirs.get(proj)
+            if projdir is None:
+                projdir = self._projdirs[proj] = os.path.dirname(proj)
+
+        entry = {'type': etype, 'text': text, 'valid': 1}
+        origin = m.group('origin')
+        pos = m.group('pos')
+        if pos or os.sep in origin or '/' in origin or '.' in origin:
+            entry['filename'] = self._abspath(origin, projdir or self.slndir)
+            if pos:
+                pos = [p.split('-')[0] for p in pos.split(',')]
+                entry['lnum'] = int(pos[0])
+                if len(pos) > 1:
+                    entry['col'] = int(pos[1])
+        else:
+            # Not a file, but a tool, like `LINK`.
+            entry['module'] = origin
+
+        if self.dedupe:
+            key = (os.path.normcase(entry.get('filename', origin)),
+                   entry.get('lnum'), entry.get('col'), etype, text)
+            if key in self._seen:
+                self.duplicates += 1
+                return None
+            self._seen.add(key)
+
+        if proj:
+            entry['project'] = proj
+        self.counts[etype] += 1
+        return entry
+
+    def _abspath(self, path, basedir):
+        # The same few paths come up over and over again (shared headers,
+        # project files, the final summary...), so remember them.
+        key = (path, basedir)
+        abspath = self._abspaths.get(key)
+        if abspath is None:
+            abspath = path
+            if not os.path.isabs(abspath):
+                abspath = os.path.join(basedir, abspath)
+            abspath = os.path.normpath(abspath)
+            self._abspaths[key] = abspath
+        return abspath
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Parses MSBuild output into quickfix entries, printed "
+                     "as one JSON object per line."))
+    parser.add_argument('-s', '--solution',
+                        help=("The solution being built, whose directory is "
+                              "used to resolve relative paths."))
+    parser.add_argument('-i', '--input',
+                        help=("A file with MSBuild output to parse. Defaults "
+                              "to the standard input."))
+    parser.add_argument('-l', '--log',
+                        help="Also save the raw output to the given file.")
+    parser.add_argument('--no-dedupe',
+                        action='store_true',
+                        help="Print repeated diagnostics every time.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    parser.add_argument('command',
+                        nargs=argparse.REMAINDER,
+                        help=("A command to run, usually MSBuild, whose "
+                              "output is parsed. Put it after `--`."))
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        return _run(args)
+
+
+def _tee(lines, fp):
+    for line in lines:
+        fp.write(line)
+        yield line
+
+
+def _run(args):
+    slndir = None
+    if args.solution:
+        slndir = os.path.dirname(os.path.abspath(args.solution))
+    bop = BuildOutputParser(slndir, dedupe=not args.no_dedupe)
+
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+
+    proc = None
+    with contextlib.ExitStack() as stack:
+        if command:
+            import subprocess
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            stack.callback(proc.wait)
+            # MSBuild writes in the console's encoding, so use the
+            # locale's, and don't choke on anything it can't decode.
+            lines = stack.enter_context(
+                io.TextIOWrapper(proc.stdout, errors='replace'))
+        elif args.input:
+            lines = stack.enter_context(
+                open(args.input, 'r', errors='replace'))
+        else:
+            lines = io.TextIOWrapper(sys.stdin.buffer, errors='replace')
+        if args.log:
+            logfp = stack.enter_context(open(args.log, 'w', encoding='utf8'))
+            lines = _tee(lines, logfp)
+
+        out = sys.stdout
+        for entry in bop.parse(lines):
+            out.write(json.dumps(entry))
+            out.write('\n')
+            # Flush each entry so that Vim gets it while the build goes on.
+            out.flush()
+
+    logger.info("%d errors, %d warnings, %d notes (%d duplicates skipped)" %
+                (bop.counts['E'], bop.counts['W'], bop.counts['I'],
+                 bop.duplicates))
+    if proc is not None:
+        return proc.returncode
+    return 1 if bop.counts['E'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
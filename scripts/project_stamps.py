@@ -0,0 +1,360 @@
+""" Records the modification times and sizes of each project's files after
+    a successful build, and later finds which projects have changed since
+    then (i.e. which projects are "dirty"), e.g.:
+
+        python project_stamps.py record Solution.sln -c .vimcrosoft/slncache.bin
+        python project_stamps.py dirty Solution.sln -c .vimcrosoft/slncache.bin
+
+    Files saved while a build runs may or may not have been compiled, so
+    their new stamps must not be recorded after it. Instead, take the
+    stamps before the build, and only save them once it succeeded:
+
+        python project_stamps.py snapshot Solution.sln -c ... -P pending.bin
+        (build)
+        python project_stamps.py commit Solution.sln -c ... -P pending.bin
+
+    Files are stat'ed in parallel, one directory at a time. On Windows, a
+    directory listing already comes with the times and sizes of its files,
+    so a whole directory costs about as much as a single stat.
+"""
+import argparse
+import logging
+import os
+import os.path
+import pickle
+from fsutil import atomic_write, file_lock
+from logutil import add_profile_arguments, profiling, setup_logging, traced
+
+
+logger = logging.getLogger(__name__)
+
+
+STAMPS_VERSION = 1
+
+
+def get_stamps_path(cachepath):
+    """ Returns the path of the stamps file that goes with the given
+        solution cache.
+    """
+    if not cachepath:
+        raise Exception("Project stamps need a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'stamps.bin')
+
+
+def load_stamps(stampspath):
+    """ Loads the recorded stamps, as a dictionary mapping project GUIDs
+        to stamps. Returns an empty dictionary if nothing valid was
+        recorded yet.
+    """
+    try:
+        with open(stampspath, 'rb') as fp:
+            data = pickle.load(fp)
+    except FileNotFoundError:
+        return {}
+    except Exception as ex:
+        logger.warning(f"Ignoring invalid project stamps: {ex}")
+        return {}
+    if data.get('version') != STAMPS_VERSION:
+        return {}
+    return data['projects']
+
+
+def get_project_files(proj):
+    """ Returns the absolute paths of a project file and of all its items,
+        including conditional ones.
+    """
+    paths = [proj.abspath]
+    ig = proj.defaultitemgroup()
+    if ig is not None:
+        projdir = proj.absdirpath
+        groups = [ig]
+        while groups:
+            group = groups.pop()
+            paths += [os.path.abspath(os.path.join(projdir, i.include))
+                      for i in group.items if i.include]
+            groups += group.conditionals.values()
+    return paths
+
+
+def _stat_dir_files(task):
+    dirpath, paths, prev_dir_mtime = task
+    try:
+        dir_mtime = os.stat(dirpath).st_mtime_ns
+    except OSError:
+        return None, {}
+    if prev_dir_mtime is not None and dir_mtime == prev_dir_mtime:
+        # The caller trusts that nothing changed in this directory.
+        return dir_mtime, None
+
+    stats = {}
+    if os.name == 'nt':
+        # The listing gives us the stats of all the files for free.
+        wanted = {os.path.normcase(os.path.basename(p)): p for p in paths}
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    path = wanted.get(os.path.normcase(entry.name))
+                    if path is not None:
+                        st = entry.stat()
+                        stats[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+    else:
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_mtime_ns, st.st_size)
+    return dir_mtime, stats
+
+
+def group_by_dir(paths):
+    """ Returns the given paths grouped by directory, as a dictionary
+        mapping directories to lists of paths.
+    """
+    by_dir = {}
+    dirname = os.path.dirname
+    for path in paths:
+        by_dir.setdefault(dirname(path), []).append(path)
+    return by_dir
+
+
+@traced('stamps.stat')
+def stat_files(by_dir, jobs=None, dir_mtimes=None):
+    """ Returns the stamps of the given files, grouped by directory (see
+        `group_by_dir`), as a dictionary mapping each directory to its
+        modification time and to a dictionary of `(mtime, size)` file stamps
+        (or `None` for missing files).
+
+        If previous directory times are given, the files in a directory
+        whose time hasn't changed are skipped, and their stamps are `None`
+        instead of a dictionary.
+    """
+    dir_mtimes = dir_mtimes or {}
+    tasks = [(d, paths, dir_mtimes.get(d)) for d, paths in by_dir.items()]
+    if jobs is None:
+        jobs = min(32, (os.cpu_count() or 1) + 4)
+    if jobs > 1 and len(tasks) > 1:
+        # Stat-ing files is I/O that releases the GIL, so threads are
+        # enough.
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_stat_dir_files, tasks))
+    else:
+        results = [_stat_dir_files(t) for t in tasks]
+
+    dir_stamps = {}
+    for (dirpath, paths, _), (dir_mtime, stats) in zip(tasks, results):
+        if stats is not None:
+            stats = {p: stats.get(p) for p in paths}
+        dir_stamps[dirpath] = (dir_mtime, stats)
+    return dir_stamps
+
+
+def take_stamps(cache, projects=None, jobs=None):
+    """ Returns the current stamps of the files of the given projects (by
+        name or full name, e.g. `Folder\\Project`), or of all projects, as
+        a dictionary mapping project GUIDs to stamps. Save them with
+        `save_stamps` once these projects were successfully built.
+    """
+    projs = [p for p in cache.slnobj.projects if not p.is_folder]
+    if projects:
+        names = {n.lower() for n in projects}
+        projs = [p for p in projs
+                 if (p.name.lower() in names or
+                     cache.get_project_full_name(p.guid).lower() in names)]
+        if not projs:
+            logger.warning(f"No projects named: {', '.join(projects)}")
+
+    dirs_by_guid = {p.guid: group_by_dir(get_project_files(p))
+                    for p in projs}
+    all_dirs = {}
+    for by_dir in dirs_by_guid.values():
+        for dirpath, paths in by_dir.items():
+            all_dirs.setdefault(dirpath, set()).update(paths)
+    dir_stamps = stat_files(all_dirs, jobs=jobs)
+
+    # Each project's stamps are its files' stamps grouped by directory,
+    # along with the directory's modification time.
+    stamps = {}
+    for proj in projs:
+        projstamps = {}
+        for dirpath, paths in dirs_by_guid[proj.guid].items():
+            dir_mtime, stats = dir_stamps[dirpath]
+            projstamps[dirpath] = (dir_mtime, {p: stats[p] for p in paths})
+        stamps[proj.guid] = projstamps
+    logger.debug(f"Took stamps of {len(projs)} projects "
+                 f"({len(all_dirs)} directories).")
+    return stamps
+
+
+def save_stamps(stampspath, new_stamps):
+    """ Saves the given project stamps (see `take_stamps`), replacing the
+        previous stamps of these projects.
+    """
+    with file_lock(stampspath + '.lock'):
+        stamps = load_stamps(stampspath)
+        stamps.update(new_stamps)
+        with atomic_write(stampspath, 'wb') as fp:
+            pickle.dump({'version': STAMPS_VERSION, 'projects': stamps}, fp)
+
+
+def record_stamps(cache, stampspath, projects=None, jobs=None):
+    """ Records the current stamps of the files of the given projects, or
+        of all projects. This should be called right after a successful
+        build of these projects, and only if none of their files changed
+        during the build. Otherwise, take the stamps before the build, and
+        save them after it.
+    """
+    save_stamps(stampspath, take_stamps(cache, projects=projects, jobs=jobs))
+
+
+def save_pending_stamps(stamps, pendingpath):
+    """ Saves stamps taken before a build, until it succeeds. """
+    with atomic_write(pendingpath, 'wb') as fp:
+        pickle.dump({'version': STAMPS_VERSION, 'projects': stamps}, fp)
+
+
+def commit_pending_stamps(stampspath, pendingpath):
+    """ Saves the stamps that were taken before a build that succeeded, and
+        removes the pending stamps file. Returns how many projects' stamps
+        were saved.
+    """
+    stamps = load_stamps(pendingpath)
+    if stamps:
+        save_stamps(stampspath, stamps)
+    try:
+        os.remove(pendingpath)
+    except FileNotFoundError:
+        pass
+    return len(stamps)
+
+
+def find_dirty_projects(cache, stampspath, jobs=None, trust_dir_mtime=False):
+    """ Returns the GUIDs of the projects whose files changed since their
+        stamps were recorded, in build order. Projects without recorded
+        stamps are dirty.
+
+        If `trust_dir_mtime` is set, directories whose modification time
+        hasn't changed are assumed to have unchanged files. This is only
+        true if files are always saved by replacing them (like Vim does by
+        default on Windows), since editing a file in place doesn't change
+        its directory's modification time.
+    """
+    stamps = load_stamps(stampspath)
+    dirty = set()
+    to_check = {}
+    for proj in cache.slnobj.projects:
+        if proj.is_folder:
+            continue
+        prev = stamps.get(proj.guid)
+        if prev is None:
+            dirty.add(proj.guid)
+            continue
+        # The project file is stamped too, so its list of items can only
+        # change without it if some items come from wildcards.
+        if proj._globdirs:
+            prev_files = {p for _, files in prev.values() for p in files}
+            if set(get_project_files(proj)) != prev_files:
+                dirty.add(proj.guid)
+                continue
+        to_check[proj.guid] = prev
+
+    all_dirs = {}
+    prev_dir_mtimes = {} if trust_dir_mtime else None
+    for prev in to_check.values():
+        for dirpath, (dir_mtime, files) in prev.items():
+            all_dirs.setdefault(dirpath, set()).update(files)
+            if trust_dir_mtime:
+                prev_dir_mtimes[dirpath] = dir_mtime
+    dir_stamps = stat_files(all_dirs, jobs=jobs, dir_mtimes=prev_dir_mtimes)
+
+    for guid, prev in to_check.items():
+        for dirpath, (_, files) in prev.items():
+            _, cur_files = dir_stamps[dirpath]
+            if cur_files is None:
+                # Skipped, unchanged directory.
+                continue
+            changed = [p for p, stamp in files.items()
+                       if cur_files[p] != stamp]
+            if changed:
+                logger.debug(f"Changed files: {changed}")
+                dirty.add(guid)
+                break
+    return [g for g in cache.build_order if g in dirty]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=("Records the stamps of each project's files, or lists "
+                     "the projects whose files changed since then."))
+    parser.add_argument('action',
+                        choices=['record', 'dirty', 'snapshot', 'commit'],
+                        help=("Whether to record stamps, list dirty projects, "
+                              "take stamps before a build, or save those "
+                              "taken stamps after it succeeded."))
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('-c', '--cache',
+                        required=True,
+                        help=("The path to the solution cache. The stamps are "
+                              "saved next to it."))
+    parser.add_argument('-p', '--project',
+                        action='append',
+                        help=("When recording or taking stamps, only do it "
+                              "for the given project(s), by name or full "
+                              "name."))
+    parser.add_argument('-P', '--pending',
+                        help=("The file where `snapshot` saves stamps until "
+                              "`commit` is called."))
+    parser.add_argument('-f', '--full-names',
+                        action='store_true',
+                        help=("Print full names for nested dirty projects, "
+                              "which is what MSBuild names their targets."))
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        help="How many files to stat in parallel.")
+    parser.add_argument('--trust-dir-mtime',
+                        action='store_true',
+                        help=("Skip directories whose modification time "
+                              "didn't change. Only use this if files are "
+                              "never modified in place."))
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
+    from vsapi import (commit_project_stamps, find_dirty_projects,
+                       record_project_stamps, snapshot_project_stamps)
+    if args.action == 'record':
+        record_project_stamps(args.solution, args.cache,
+                              projects=args.project, jobs=args.jobs)
+        return
+    if args.action in ('snapshot', 'commit'):
+        if not args.pending:
+            raise Exception(f"`{args.action}` needs a --pending file.")
+        if args.action == 'snapshot':
+            snapshot_project_stamps(args.solution, args.cache, args.pending,
+                                    projects=args.project, jobs=args.jobs)
+        else:
+            commit_project_stamps(args.solution, args.cache, args.pending)
+        return
+
+    projs = find_dirty_projects(args.solution, args.cache, jobs=args.jobs,
+                                trust_dir_mtime=args.trust_dir_mtime)
+    logger.debug("Found {0} dirty projects:".format(len(projs)))
+    key = 'full_name' if args.full_names else 'name'
+    for proj in projs:
+        print(proj[key])
+
+
+if __name__ == '__main__':
+    main()
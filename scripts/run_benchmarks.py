@@ -0,0 +1,562 @@
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+from logutil import setup_logging
+from gen_synthetic_sln import GENERATOR_VERSION, generate_solution
+
+
+logger = logging.getLogger(__name__)
+
+
+# Scales are (projects, items per project).
+SCALES = {
+    'small': (20, 100),
+    'medium': (200, 200),
+    'large': (1400, 200),
+}
+
+DEFAULT_SCALES = ('small', 'medium')
+
+# How much slower than the baseline a benchmark can be before it's flagged.
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchContext:
+    """ The synthetic solution that benchmarks run against. """
+    def __init__(self, scale, slnpath):
+        self.scale = scale
+        self.slnpath = slnpath
+        self.slndir = os.path.dirname(slnpath)
+        self.cachedir = os.path.join(self.slndir, '.vimcrosoft')
+        self.cachepath = os.path.join(self.cachedir, 'slncache.bin')
+        # Keep parsed projects out of the user's own project store.
+        self.storedir = os.path.join(self.slndir, '.vimcrosoft-store')
+
+    def delete_cache(self, store=True):
+        if os.path.isdir(self.cachedir):
+            shutil.rmtree(self.cachedir)
+        if store and os.path.isdir(self.storedir):
+            shutil.rmtree(self.storedir)
+        self._write_store_marker()
+
+    def ensure_cache(self):
+        from vsutil import SolutionCache
+        self._write_store_marker()
+        SolutionCache.load_or_rebuild(self.slnpath, self.cachepath)
+
+    def _write_store_marker(self):
+        from vsutil import PROJECT_STORE_MARKER
+        os.makedirs(self.cachedir, exist_ok=True)
+        with open(os.path.join(self.cachedir, PROJECT_STORE_MARKER), 'w',
+                  encoding='utf8') as fp:
+            fp.write(self.storedir)
+
+    def ensure_build_log(self):
+        """ Returns the path to a synthetic MSBuild log for the solution,
+            generating it if needed.
+        """
+        logpath = os.path.join(self.slndir, 'build.log')
+        if not os.path.isfile(logpath):
+            from gen_synthetic_sln import generate_build_log
+            projects, items = SCALES[self.scale]
+            generate_build_log(self.slndir, projects=projects, items=items)
+        return logpath
+
+    def sample_items(self, count=20):
+        """ Returns a spread-out sample of item paths in the solution. """
+        from vsutil import SolutionCache
+        cache, _ = SolutionCache.load_or_rebuild(self.slnpath, self.cachepath)
+        paths = sorted(p for items in cache.index.values() for p in items
+                       if p.endswith('.cpp') or p.endswith('.h'))
+        step = max(1, len(paths) // count)
+        return paths[::step][:count]
+
+
+@contextlib.contextmanager
+def _silenced_stdout():
+    prevout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = prevout
+
+
+def bench_parse_sln_file(ctx):
+    from vsutil import parse_sln_file
+    yield
+    parse_sln_file(ctx.slnpath)
+
+
+def bench_cache_cold(ctx):
+    from vsutil import SolutionCache
+    ctx.delete_cache()
+    yield
+    SolutionCache.load_or_rebuild(ctx.slnpath, ctx.cachepath)
+
+
+def bench_switch_solution(ctx):
+    # Another solution already parsed all the projects in the store, so
+    # only the solution file should need parsing.
+    from vsutil import SolutionCache
+    ctx.ensure_cache()
+    ctx.delete_cache(store=False)
+    yield
+    SolutionCache.load_or_rebuild(ctx.slnpath, ctx.cachepath)
+
+
+def bench_sln_add_project(ctx):
+    # Adding a project changes the solution file, but the other projects
+    # should be re-used from the previous cache rather than parsed again.
+    from vsutil import SolutionCache
+    from gen_synthetic_sln import add_project
+    slnpath = os.path.join(ctx.slndir, 'AddProject.sln')
+    cachepath = os.path.join(ctx.cachedir, 'addproject.bin')
+    ctx.ensure_cache()
+    shutil.copyfile(ctx.slnpath, slnpath)
+    SolutionCache.load_or_rebuild(slnpath, cachepath)
+    add_project(slnpath, 'AddedProject', items=SCALES[ctx.scale][1])
+    # Make sure the solution looks newer than the cache, even with coarse
+    # file times.
+    cache_dt = os.path.getmtime(cachepath)
+    os.utime(slnpath, (cache_dt + 1, cache_dt + 1))
+    yield
+    SolutionCache.load_or_rebuild(slnpath, cachepath)
+
+
+def bench_cache_warm(ctx):
+    from vsutil import SolutionCache
+    ctx.ensure_cache()
+    yield
+    SolutionCache.load_or_rebuild(ctx.slnpath, ctx.cachepath)
+
+
+def bench_find_item_project(ctx):
+    from vshelpers import find_item_project
+    ctx.ensure_cache()
+    items = ctx.sample_items()
+    yield
+    for item in items:
+        find_item_project(item, ctx.slnpath, ctx.cachepath)
+
+
+def bench_list_sln_files(ctx):
+    import list_sln_files
+    ctx.ensure_cache()
+    yield
+    with _silenced_stdout():
+        list_sln_files.main([ctx.slnpath, '-c', ctx.cachepath])
+
+
+def bench_list_sln_projects(ctx):
+    import list_sln_projects
+    ctx.ensure_cache()
+    yield
+    with _silenced_stdout():
+        list_sln_projects.main([ctx.slnpath, '-c', ctx.cachepath,
+                                '--full-names'])
+
+
+def bench_list_sln_configs(ctx):
+    import list_sln_configs
+    ctx.ensure_cache()
+    yield
+    with _silenced_stdout():
+        list_sln_configs.main([ctx.slnpath, '-c', ctx.cachepath])
+
+
+def bench_api_list_projects(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    vsapi.list_projects(ctx.slnpath, ctx.cachepath)
+    yield
+    vsapi.list_projects(ctx.slnpath, ctx.cachepath)
+
+
+def bench_api_list_files(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    vsapi.list_files(ctx.slnpath, ctx.cachepath)
+    yield
+    vsapi.list_files(ctx.slnpath, ctx.cachepath)
+
+
+def bench_affected_projects(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    items = ctx.sample_items()
+    vsapi.find_affected_projects(ctx.slnpath, items[:1], ctx.cachepath)
+    yield
+    for item in items:
+        vsapi.find_affected_projects(ctx.slnpath, [item], ctx.cachepath)
+
+
+def bench_dirty_projects(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    vsapi.record_project_stamps(ctx.slnpath, ctx.cachepath)
+    yield
+    vsapi.find_dirty_projects(ctx.slnpath, ctx.cachepath)
+
+
+def bench_include_graph_cold(ctx):
+    import vsapi
+    from include_graph import get_include_graph_path
+    ctx.ensure_cache()
+    graphpath = get_include_graph_path(ctx.cachepath)
+    if os.path.exists(graphpath):
+        os.remove(graphpath)
+    yield
+    vsapi.update_include_graph(ctx.slnpath, ctx.cachepath)
+
+
+def bench_include_graph_warm(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    vsapi.update_include_graph(ctx.slnpath, ctx.cachepath)
+    yield
+    vsapi.update_include_graph(ctx.slnpath, ctx.cachepath)
+
+
+def bench_file_shards_cold(ctx):
+    import vsapi
+    from file_shards import get_shards_dir
+    ctx.ensure_cache()
+    shardsdir = get_shards_dir(ctx.cachepath)
+    if os.path.isdir(shardsdir):
+        shutil.rmtree(shardsdir)
+    yield
+    vsapi.update_file_shards(ctx.slnpath, ctx.cachepath)
+
+
+def bench_file_shards_warm(ctx):
+    import vsapi
+    ctx.ensure_cache()
+    vsapi.update_file_shards(ctx.slnpath, ctx.cachepath)
+    yield
+    vsapi.update_file_shards(ctx.slnpath, ctx.cachepath)
+
+
+def _get_find_files_queries(ctx):
+    # For a sample of files: their name, a scattered abbreviation of it,
+    # and their name along with their project's.
+    queries = []
+    for path in ctx.sample_items(10):
+        name = os.path.splitext(os.path.basename(path))[0]
+        projname = os.path.relpath(path, ctx.slndir).split(os.sep)[1]
+        queries += [name, name[0] + name[-2:], '%s %s' % (projname, name)]
+    return queries
+
+
+def bench_find_files_index(ctx):
+    import vsapi
+    from find_files import get_file_index_path
+    ctx.ensure_cache()
+    vsapi.clear_caches()
+    vsapi.get_solution_cache(ctx.slnpath, ctx.cachepath)
+    indexpath = get_file_index_path(ctx.cachepath)
+    if os.path.exists(indexpath):
+        os.remove(indexpath)
+    vsapi._file_indices.clear()
+    yield
+    vsapi.get_file_index(ctx.slnpath, ctx.cachepath)
+
+
+def bench_find_files(ctx):
+    # Queries per second are 30 divided by the time of this one.
+    import vsapi
+    ctx.ensure_cache()
+    queries = _get_find_files_queries(ctx)
+    vsapi.get_file_index(ctx.slnpath, ctx.cachepath)
+    yield
+    for query in queries:
+        vsapi.find_files(ctx.slnpath, query, cachepath=ctx.cachepath)
+
+
+# A plain text pattern and a regex one.
+SEARCH_PATTERNS = ('file37.h', r'^#include "module\d/file3\d\.h"')
+
+
+def _search_sln_files(ctx, jobs):
+    import vsapi
+    from search_sln_files import search_files
+    ctx.ensure_cache()
+    paths = vsapi.list_files(ctx.slnpath, ctx.cachepath)
+    yield
+    for pattern in SEARCH_PATTERNS:
+        for _ in search_files(paths, pattern, jobs=jobs):
+            pass
+
+
+def bench_search_files(ctx):
+    yield from _search_sln_files(ctx, None)
+
+
+def bench_search_files_serial(ctx):
+    yield from _search_sln_files(ctx, 1)
+
+
+def bench_ycm_settings(ctx):
+    import ycm_extra_conf
+    ctx.ensure_cache()
+    items = ctx.sample_items(5)
+    yield
+    for item in items:
+        ycm_extra_conf.Settings(
+            language='cfamily',
+            filename=item,
+            from_cli=True,
+            client_data={'solution': ctx.slnpath,
+                         'slncache': ctx.cachepath,
+                         'env': {'Configuration': 'Debug',
+                                 'Platform': 'x64'}})
+
+
+def bench_resolve_groups(ctx):
+    # What getting flags costs without precomputed configuration views:
+    # resolve each project's groups, and read the flags of its C++ items.
+    from vsutil import (SolutionCache, ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR,
+                        get_item_flag_metadata)
+    ctx.ensure_cache()
+    cache, _ = SolutionCache.load_or_rebuild(ctx.slnpath, ctx.cachepath)
+    projs = [p for p in cache.slnobj.projects if not p.is_folder]
+    for proj in projs:
+        proj._ensure_loaded()
+    yield
+    for proj in projs:
+        env = {'Configuration': 'Debug', 'Platform': 'x64'}
+        proj.propertygroup('Configuration', env).get('ConfigurationType')
+        proj.defaultpropertygroup(env).get('NMakeIncludeSearchPath')
+        ig = proj.defaultitemgroup(env)
+        get_item_flag_metadata(proj.absdirpath, ig.get_items_of_types(
+            (ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR)))
+
+
+def bench_parse_build_output(ctx):
+    from parse_build_output import BuildOutputParser
+    logpath = ctx.ensure_build_log()
+    yield
+    with open(logpath, 'r') as fp:
+        for _ in BuildOutputParser(ctx.slndir).parse(fp):
+            pass
+
+
+BENCHMARKS = {
+    'parse_sln_file': bench_parse_sln_file,
+    'cache_cold': bench_cache_cold,
+    'switch_solution': bench_switch_solution,
+    'sln_add_project': bench_sln_add_project,
+    'cache_warm': bench_cache_warm,
+    'find_item_project': bench_find_item_project,
+    'list_sln_files': bench_list_sln_files,
+    'list_sln_projects': bench_list_sln_projects,
+    'list_sln_configs': bench_list_sln_configs,
+    'api_list_projects': bench_api_list_projects,
+    'api_list_files': bench_api_list_files,
+    'ycm_settings': bench_ycm_settings,
+    'affected_projects': bench_affected_projects,
+    'dirty_projects': bench_dirty_projects,
+    'include_graph_cold': bench_include_graph_cold,
+    'include_graph_warm': bench_include_graph_warm,
+    'resolve_groups': bench_resolve_groups,
+    'file_shards_cold': bench_file_shards_cold,
+    'file_shards_warm': bench_file_shards_warm,
+    'find_files_index': bench_find_files_index,
+    'find_files': bench_find_files,
+    'search_files': bench_search_files,
+    'search_files_serial': bench_search_files_serial,
+    'parse_build_output': bench_parse_build_output,
+}
+
+
+def run_benchmark(func, ctx, repeat):
+    """ Runs a benchmark several times and returns the best time, in
+        seconds. Benchmark functions are generators: everything before
+        their `yield` is setup, and isn't timed.
+    """
+    best = None
+    for _ in range(repeat):
+        it = func(ctx)
+        next(it)
+        gc.collect()
+        start = time.perf_counter()
+        for _ in it:
+            pass
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def measure_allocations(func, ctx):
+    """ Runs a benchmark once under `tracemalloc`, and returns how many
+        bytes it allocated at its peak, on top of what was already
+        allocated when it started.
+    """
+    import tracemalloc
+    it = func(ctx)
+    next(it)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in it:
+            pass
+        _, peak_size = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_size - start_size
+
+
+def prepare_scale(workdir, scale):
+    """ Generates the synthetic solution for a given scale, unless it was
+        already generated by a previous run.
+    """
+    projects, items = SCALES[scale]
+    outdir = os.path.join(workdir, scale)
+    slnpath = os.path.join(outdir, 'Synthetic.sln')
+    stamppath = os.path.join(outdir, 'generated.json')
+    params = {'projects': projects, 'items': items,
+              'version': GENERATOR_VERSION}
+    try:
+        with open(stamppath, 'r') as fp:
+            if json.load(fp) == params:
+                return BenchContext(scale, slnpath)
+    except (OSError, ValueError):
+        pass
+
+    logger.info("Generating %s solution (%d projects, %d items each)..." %
+                (scale, projects, items))
+    if os.path.isdir(outdir):
+        shutil.rmtree(outdir)
+    generate_solution(outdir, projects=projects, items=items,
+                      write_items=True)
+    with open(stamppath, 'w') as fp:
+        json.dump(params, fp)
+    return BenchContext(scale, slnpath)
+
+
+def compare_results(results, baseline, threshold):
+    """ Compares results against a baseline, and returns the list of
+        regressions as (scale, benchmark, baseline time, new time) tuples.
+    """
+    regressions = []
+    for scale, benches in results.items():
+        for name, duration in benches.items():
+            base = baseline.get(scale, {}).get(name)
+            if base and duration > base * (1.0 + threshold):
+                regressions.append((scale, name, base, duration))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Runs benchmarks over synthetic solutions.")
+    parser.add_argument('-s', '--scale',
+                        action='append',
+                        choices=list(SCALES.keys()),
+                        help=("The scale(s) of solutions to benchmark. "
+                              "Defaults to: %s" % ', '.join(DEFAULT_SCALES)))
+    parser.add_argument('-b', '--bench',
+                        action='append',
+                        choices=list(BENCHMARKS.keys()),
+                        help="The benchmark(s) to run. Defaults to all.")
+    parser.add_argument('-w', '--workdir',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'vimcrosoft-bench'),
+                        help="Where to generate the synthetic solutions.")
+    parser.add_argument('-n', '--repeat',
+                        type=int, default=3,
+                        help="How many times to run each benchmark.")
+    parser.add_argument('--baseline',
+                        help=("A results file to compare against. Defaults "
+                              "to the baseline saved in the work directory, "
+                              "if any."))
+    parser.add_argument('--save-baseline',
+                        action='store_true',
+                        help=("Save the results as the baseline in the work "
+                              "directory."))
+    parser.add_argument('--threshold',
+                        type=float, default=DEFAULT_THRESHOLD,
+                        help=("The relative slowdown over the baseline that "
+                              "is flagged as a regression."))
+    parser.add_argument('--allocations',
+                        action='store_true',
+                        help=("Also run each benchmark once under tracemalloc "
+                              "and print its peak allocated memory."))
+    parser.add_argument('-o', '--output',
+                        help="Save the results to the given file.")
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+    if not args.verbose:
+        # Some of the code we benchmark is quite chatty.
+        logging.getLogger().setLevel(logging.WARNING)
+        logger.setLevel(logging.INFO)
+
+    scales = args.scale or DEFAULT_SCALES
+    benches = args.bench or list(BENCHMARKS.keys())
+
+    baseline = {}
+    baseline_path = args.baseline
+    if not baseline_path and not args.save_baseline:
+        baseline_path = os.path.join(args.workdir, 'baseline.json')
+        if not os.path.isfile(baseline_path):
+            baseline_path = None
+    if baseline_path:
+        logger.info("Comparing against baseline: %s" % baseline_path)
+        with open(baseline_path, 'r') as fp:
+            baseline = json.load(fp)
+
+    results = {}
+    for scale in scales:
+        ctx = prepare_scale(args.workdir, scale)
+        results[scale] = {}
+        for name in benches:
+            duration = run_benchmark(BENCHMARKS[name], ctx, args.repeat)
+            results[scale][name] = duration
+
+            line = "%-8s %-20s %10.2fms" % (scale, name, duration * 1000)
+            base = baseline.get(scale, {}).get(name)
+            if base:
+                line += "  (baseline %.2fms, %+.0f%%)" % (
+                    base * 1000, (duration / base - 1.0) * 100)
+            if args.allocations:
+                peak = measure_allocations(BENCHMARKS[name], ctx)
+                line += "  [peak %.1fKB]" % (peak / 1024)
+            print(line)
+
+    outputs = []
+    if args.output:
+        outputs.append(args.output)
+    if args.save_baseline:
+        outputs.append(os.path.join(args.workdir, 'baseline.json'))
+    for output in outputs:
+        with open(output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        logger.info("Saved results to: %s" % output)
+
+    if baseline:
+        regressions = compare_results(results, baseline, args.threshold)
+        for scale, name, base, duration in regressions:
+            print("REGRESSION: %s %s went from %.2fms to %.2fms" %
+                  (scale, name, base * 1000, duration * 1000))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+""" Searches the contents of the files of a solution, and prints matching
+    lines in quickfix format as soon as they're found, e.g.:
+
+        python search_sln_files.py Solution.sln -c .vimcrosoft/slncache.bin \\
+            "MyClass::\\w+"
+
+    Only the files listed in the solution's projects are searched, which can
+    be a lot less than searching the whole source tree. Files are split in
+    chunks that are searched by a pool of processes, and printed in order.
+    Big files are memory-mapped rather than read, and patterns without any
+    special regex characters are looked for as plain bytes, which is a lot
+    faster than running a regex.
+"""
+import argparse
+import collections
+import json
+import logging
+import mmap
+import os
+import os.path
+import re
+import sys
+from logutil import add_profile_arguments, profiling, setup_logging, traced
+
+
+logger = logging.getLogger(__name__)
+
+
+# How many files each process searches at a time. Results are printed one
+# chunk at a time, so smaller chunks show the first results sooner.
+CHUNK_SIZE = 256
+
+# Searching more files than this is worth starting processes for.
+MIN_PARALLEL_FILES = 1024
+
+# Files smaller than this are read rather than memory-mapped, which is
+# cheaper for them.
+MIN_MMAP_SIZE = 64 * 1024
+
+# Characters that make a pattern a regex rather than plain text.
+_REGEX_CHARS = frozenset(b'.^$*+?{}[]\\|()')
+
+
+def _compile_pattern(pattern, ignore_case=False, fixed_strings=False):
+    """ Returns what `_search_data` needs to look for the given pattern:
+        either bytes to find as is, or a compiled bytes regex.
+    """
+    bpattern = pattern.encode('utf8')
+    if not fixed_strings and any(c in _REGEX_CHARS for c in bpattern):
+        # Match `^` and `$` at each line, like `grep`.
+        flags = re.MULTILINE
+        if ignore_case:
+            flags |= re.IGNORECASE
+        return re.compile(bpattern, flags)
+    if ignore_case:
+        return re.compile(re.escape(bpattern), re.IGNORECASE)
+    # Literal fast path.
+    return bpattern
+
+
+def _search_data(data, matcher):
+    """ Yields the line number, column and text of the lines that match in
+        the given data. Only the first match of each line is reported.
+    """
+    if isinstance(matcher, bytes):
+        if not matcher:
+            return
+        find = data.find
+        pos = find(matcher)
+        if pos < 0:
+            return
+    else:
+        m = matcher.search(data)
+        if m is None:
+            return
+        pos = m.start()
+
+    lnum = 1
+    counted = 0
+    while pos >= 0:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end < 0:
+            line_end = len(data)
+        # Memory maps can't count, but slices of them are bytes.
+        lnum += data[counted:line_start].count(b'\n')
+        counted = line_start
+        text = data[line_start:line_end].rstrip(b'\r')
+        yield lnum, pos - line_start + 1, text.decode('utf8', 'replace')
+
+        # Go to the next line.
+        if line_end >= len(data):
+            return
+        if isinstance(matcher, bytes):
+            pos = find(matcher, line_end + 1)
+        else:
+            m = matcher.search(data, line_end + 1)
+            pos = m.start() if m is not None else -1
+
+
+def search_file(path, matcher):
+    """ Returns the matches in the given file, as (line number, column,
+        text) tuples.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size < MIN_MMAP_SIZE:
+                return list(_search_data(fp.read(), matcher))
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return list(_search_data(data, matcher))
+    except OSError as ex:
+        logger.debug(f"Can't search file {path}: {ex}")
+        return []
+
+
+def _search_files(paths, matcher):
+    results = []
+    for path in paths:
+        for lnum, col, text in search_file(path, matcher):
+            results.append((path, lnum, col, text))
+    return results
+
+
+@traced('search.files')
+def search_files(paths, pattern, ignore_case=False, fixed_strings=False,
+                 jobs=None):
+    """ Searches the given files for a pattern, which is a Python regular
+        expression unless `fixed_strings` is set. Yields, for each
+        matching line, a (path, line number, column, text) tuple, in the
+        order of the given files.
+    """
+    matcher = _compile_pattern(pattern, ignore_case, fixed_strings)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    chunks = [paths[i:i + CHUNK_SIZE]
+              for i in range(0, len(paths), CHUNK_SIZE)]
+    # Don't start processes from inside Vim: on Windows, that would
+    # start new Vim instances.
+    if (jobs > 1 and len(paths) >= MIN_PARALLEL_FILES and
+            'vim' not in sys.modules):
+        from concurrent.futures import ProcessPoolExecutor
+        # Only queue a few chunks ahead of the one being printed, so that
+        # there's not much left to search when the caller stops early
+        # (e.g. because the output pipe was closed).
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        pending = collections.deque()
+        remaining = iter(chunks)
+        try:
+            for chunk in remaining:
+                pending.append(pool.submit(_search_files, chunk, matcher))
+                if len(pending) >= jobs * 2:
+                    break
+            while pending:
+                results = pending.popleft().result()
+                chunk = next(remaining, None)
+                if chunk is not None:
+                    pending.append(pool.submit(_search_files, chunk, matcher))
+                yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown()
+    else:
+        for chunk in chunks:
+            yield from _search_files(chunk, matcher)
+
+
+def format_match(match):
+    """ Formats a match like `grep` does for Vim's default 'grepformat',
+        i.e. `path:line:column:text`.
+    """
+    path, lnum, col, text = match
+    return '%s:%d:%d:%s' % (path, lnum, col, text)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Searches the contents of the files of a solution.")
+    parser.add_argument('solution',
+                        help="The path to the Visual Studio solution file.")
+    parser.add_argument('pattern',
+                        help="The Python regular expression to look for.")
+    parser.add_argument('-c', '--cache',
+                        help="The solution cache file to load.")
+    parser.add_argument('-p', '--project',
+                        help="Only search files in the named project.")
+    parser.add_argument('-t', '--type',
+                        action='append',
+                        help="The type(s) of items to search.")
+    parser.add_argument('-F', '--fixed-strings',
+                        action='store_true',
+                        help="Look for the pattern as plain text.")
+    parser.add_argument('-i', '--ignore-case',
+                        action='store_true',
+                        help="Ignore case when matching.")
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        help="How many processes to search files with.")
+    parser.add_argument('--json',
+                        action='store_true',
+                        help=("Print quickfix entries as one JSON object per "
+                              "line, instead of `path:line:column:text`."))
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Show verbose information.")
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
+    setup_logging(args.verbose)
+
+    with profiling(args):
+        return _run(args)
+
+
+def _run(args):
+    from vsapi import list_files
+    paths = list_files(args.solution, args.cache, project=args.project,
+                       itemtypes=args.type)
+    # A file can belong to several projects.
+    paths = list(dict.fromkeys(paths))
+    logger.debug(f"Searching {len(paths)} files.")
+
+    out = sys.stdout
+    count = 0
+    matches = search_files(paths, args.pattern,
+                           ignore_case=args.ignore_case,
+                           fixed_strings=args.fixed_strings,
+                           jobs=args.jobs)
+    try:
+        for match in matches:
+            if args.json:
+                path, lnum, col, text = match
+                out.write(json.dumps({'filename': path, 'lnum': lnum,
+                                      'col': col, 'text': text}))
+                out.write('\n')
+            else:
+                out.write(format_match(match))
+                out.write('\n')
+            # Flush each match so that Vim gets it while the search goes
+            # on.
+            out.flush()
+            count += 1
+    except BrokenPipeError:
+        # The reader went away (e.g. `head`), so stop searching. Prevent
+        # Python from complaining again when it flushes stdout on exit.
+        logger.debug("Output pipe was closed.")
+        matches.close()
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, out.fileno())
+    logger.info(f"Found {count} matches.")
+    return 0 if count else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
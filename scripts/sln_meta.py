@@ -0,0 +1,125 @@
+""" A small file next to the solution cache with what command completion
+    needs, i.e. the solution's configurations and project names, so that
+    completing a project name doesn't load the whole solution cache, with
+    every project's items.
+
+    The file is written along with the solution cache, and is only checked
+    against the stamp of the solution file: configurations and projects are
+    listed in the solution file, so changes to the projects themselves
+    don't matter. This module doesn't import `vsutil`, which takes a while,
+    unless the file needs to be written again.
+"""
+import json
+import logging
+import os
+import os.path
+from cache_root import touch_cache
+from fsutil import atomic_write
+
+
+logger = logging.getLogger(__name__)
+
+
+META_VERSION = 1
+
+
+def get_meta_path(cachepath):
+    """ Returns the path of the metadata file that goes with the given
+        solution cache.
+    """
+    if not cachepath:
+        raise Exception("Solution metadata needs a solution cache path.")
+    return os.path.join(os.path.dirname(cachepath), 'slnmeta.json')
+
+
+def get_sln_stamp(slnpath):
+    """ Returns the stamp of the given solution file, which the metadata
+        is valid for.
+    """
+    st = os.stat(slnpath)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def make_sln_meta(cache, sln_stamp=None):
+    """ Returns the metadata of the given solution cache, as a dictionary
+        of plain values.
+    """
+    return {'version': META_VERSION,
+            'solution': os.path.abspath(cache.slnobj.path),
+            'stamp': sln_stamp,
+            'configs': cache.get_solution_configurations(),
+            'projects': cache.get_project_names(),
+            'full_names': cache.find_project_full_names()}
+
+
+def save_sln_meta(meta, metapath):
+    """ Saves solution metadata. """
+    try:
+        with atomic_write(metapath, 'w', encoding='utf8') as fp:
+            json.dump(meta, fp)
+    except OSError as ex:
+        logger.warning(f"Can't save solution metadata: {ex}")
+
+
+def load_sln_meta(metapath, slnpath):
+    """ Loads the saved metadata of the given solution. Returns `None` if
+        there's none, or if the solution file changed since.
+    """
+    try:
+        with open(metapath, 'r', encoding='utf8') as fp:
+            meta = json.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.debug(f"Ignoring invalid solution metadata: {ex}")
+        return None
+    if meta.get('version') != META_VERSION:
+        return None
+    if (os.path.normcase(meta['solution']) !=
+            os.path.normcase(os.path.abspath(slnpath))):
+        return None
+    try:
+        if meta['stamp'] != get_sln_stamp(slnpath):
+            logger.debug("Solution changed since its metadata was saved.")
+            return None
+    except OSError:
+        return None
+    return meta
+
+
+def get_sln_meta(solution, cachepath=None):
+    """ Returns the metadata of the given solution, from the file saved
+        next to the solution cache if it's still valid. Otherwise, the
+        solution cache is loaded, and the file is saved again.
+    """
+    if not solution:
+        raise Exception("No solution path was provided!")
+    metapath = None
+    if cachepath:
+        # The solution cache isn't loaded, but it's still being used.
+        touch_cache(cachepath, solution)
+        metapath = get_meta_path(cachepath)
+        meta = load_sln_meta(metapath, solution)
+        if meta is not None:
+            return meta
+
+    from vsapi import get_solution_cache
+    # Get the stamp first, so that if the solution changes in the meantime,
+    # we don't save old metadata as valid.
+    sln_stamp = get_sln_stamp(solution)
+    cache = get_solution_cache(solution, cachepath)
+    meta = make_sln_meta(cache, sln_stamp)
+    if metapath:
+        save_sln_meta(meta, metapath)
+    return meta
+
+
+def find_project_full_names(meta, prefix=None):
+    """ Returns the sorted full names of the solution's projects, optionally
+        only those starting with the given prefix (case-insensitive).
+    """
+    names = meta['full_names']
+    if not prefix:
+        return names
+    prefix = prefix.lower()
+    return [n for n in names if n.lower().startswith(prefix)]
@@ -0,0 +1,112 @@
+""" The single entry point for all of vimcrosoft's scripts, e.g.:
+
+        python vimcrosoft.py list-files path/to/Solution.sln
+
+    Each sub-command is implemented by one of the other scripts, which is
+    only imported when that sub-command runs. Keep the imports here to a
+    minimum: this is what every external call from Vim pays for before
+    doing any work.
+"""
+import os.path
+import sys
+
+
+sys.path.append(os.path.dirname(__file__))
+
+
+# Sub-command names, mapped to the module implementing them and a short
+# description.
+COMMANDS = {
+    'list-files': ('list_sln_files',
+                   "List the files in a solution."),
+    'list-projects': ('list_sln_projects',
+                      "List the projects in a solution."),
+    'list-configs': ('list_sln_configs',
+                     "List the configurations of a solution."),
+    'list-affected': ('list_affected_projects',
+                      "List the projects affected by changes to some files."),
+    'stamps': ('project_stamps',
+               "Record project stamps, or list dirty projects."),
+    'shards': ('file_shards',
+               "Update per-project file lists, or list what changed."),
+    'includes': ('include_graph',
+                 "Update the include graph, or find who includes a file."),
+    'find-files': ('find_files',
+                   "Fuzzy-find files in a solution."),
+    'search': ('search_sln_files',
+               "Search the contents of the files in a solution."),
+    'find-companion': ('find_companion',
+                       "Find the companion of a file (e.g. its header)."),
+    'get-proj-config': ('get_proj_config',
+                        "Get a project's configuration for a solution "
+                        "configuration."),
+    'build-cache': ('build_sln_cache',
+                    "Build or refresh a solution cache."),
+    'dump-cache': ('dump_sln_cache',
+                   "Print information about a solution cache."),
+    'cache-stats': ('cache_stats',
+                    "Print a solution cache's hit/miss statistics."),
+    'gc': ('cache_root',
+           "Remove old solution caches from the central cache root."),
+    'parse-build': ('parse_build_output',
+                    "Parse MSBuild output into quickfix entries."),
+    'flags': ('ycm_extra_conf',
+              "Print the compiler flags for a file."),
+}
+
+
+def _print_usage(out):
+    out.write("usage: vimcrosoft <command> [<args>...]\n\n"
+              "Commands:\n")
+    for name, (_, desc) in COMMANDS.items():
+        out.write("  %-18s %s\n" % (name, desc))
+    out.write("\nRun `vimcrosoft <command> --help` for help on a "
+              "command.\n")
+
+
+def get_command_module(name):
+    """ Returns the name of the module implementing the given sub-command.
+        Module names are also accepted, so that callers that know about
+        the individual scripts can go through here too.
+    """
+    cmd = COMMANDS.get(name)
+    if cmd is not None:
+        return cmd[0]
+    for modname, _ in COMMANDS.values():
+        if modname == name:
+            return modname
+    return None
+
+
+def main(args=None):
+    # Don't use argparse here: it's only imported by the sub-command that
+    # actually runs.
+    if args is None:
+        args = sys.argv[1:]
+    args = list(args)
+
+    if not args or args[0] in ('-h', '--help'):
+        _print_usage(sys.stdout if args else sys.stderr)
+        return 0 if args else 2
+
+    modname = get_command_module(args[0])
+    if modname is None:
+        sys.stderr.write("vimcrosoft: unknown command '%s'\n\n" % args[0])
+        _print_usage(sys.stderr)
+        return 2
+
+    import importlib
+    mod = importlib.import_module(modname)
+    return mod.main(args[1:])
+
+
+def run():
+    """ Runs the command line and exits with its return code. This is the
+        zipapp's entry point, since zipapp doesn't exit with whatever the
+        entry point returns.
+    """
+    sys.exit(main())
+
+
+if __name__ == '__main__':
+    run()
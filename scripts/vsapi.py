@@ -0,0 +1,399 @@
+""" Functions that return solution information as plain Python values
+    (lists, dictionaries and strings), for calling from Vim with `py3eval`,
+    which turns them directly into Vim values. The command line scripts are
+    thin wrappers around these functions.
+
+    Solution caches are kept in memory between calls, and only re-loaded
+    when the solution, its projects, or the cache file change.
+"""
+import os.path
+import logging
+import time
+from cache_root import touch_cache
+from sln_meta import find_project_full_names, get_sln_meta
+from vshelpers import find_item_project_in_cache
+from vsutil import (SolutionCache, ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR,
+                    ITEM_TYPE_SOURCE_FILES)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Loaded caches, keyed by solution and cache paths, as
+# (cache, cache file time, time the cache was checked against).
+_caches = {}
+
+
+def _get_cache_file_time(cachepath):
+    if cachepath:
+        try:
+            return os.path.getmtime(cachepath)
+        except OSError:
+            pass
+    return None
+
+
+def get_solution_cache(solution, cachepath=None):
+    """ Returns the cache for the given solution, re-using the one loaded
+        by a previous call if it's still valid.
+    """
+    if not solution:
+        raise Exception("No solution path was provided!")
+    solution = os.path.abspath(solution)
+    cachepath = os.path.abspath(cachepath) if cachepath else None
+    key = (solution, cachepath)
+
+    entry = _caches.get(key)
+    if entry is not None:
+        cache, cache_file_dt, check_dt = entry
+        # If another process re-saved the cache file, load it again rather
+        # than keep an older copy around.
+        if (_get_cache_file_time(cachepath) == cache_file_dt and
+                cache.is_up_to_date(check_dt)):
+            logger.debug("Re-using loaded solution cache.")
+            return cache
+        del _caches[key]
+
+    start_time = time.time()
+    cache, loaded = SolutionCache.load_or_rebuild(solution, cachepath)
+    if not cachepath:
+        # Without a cache file, the cache isn't built by default.
+        cache.build_cache()
+    cache_file_dt = _get_cache_file_time(cachepath)
+    # A loaded cache was valid up to when it was saved. A rebuilt one was
+    # valid up to when we started reading the solution.
+    check_dt = cache_file_dt if (loaded and cache_file_dt) else start_time
+    _caches[key] = (cache, cache_file_dt, check_dt)
+    return cache
+
+
+def clear_caches():
+    """ Forgets all loaded solution caches. """
+    _caches.clear()
+
+
+def list_projects(solution, cachepath=None, full_names=True, prefix=None):
+    """ Returns the names of the projects in the solution. Full names
+        include the solution folders the projects are nested in. If a
+        prefix is given, only the full names starting with it (ignoring
+        case) are returned.
+
+        This only needs the metadata saved next to the cache (see
+        `sln_meta`), not the cache itself.
+    """
+    meta = get_sln_meta(solution, cachepath)
+    if full_names or prefix:
+        return find_project_full_names(meta, prefix or None)
+    return meta['projects']
+
+
+def list_configs(solution, cachepath=None):
+    """ Returns the solution's configurations, as `Config|Platform`
+        strings. Like `list_projects`, this doesn't need the cache.
+    """
+    return get_sln_meta(solution, cachepath)['configs']
+
+
+def iter_project_files(projs, itemtypes):
+    """ Yields, for each given project, the list of absolute paths of its
+        items of the given types. Projects without items (e.g. because
+        their file is missing) get an empty list, so that the lists can be
+        zipped with the projects.
+    """
+    for p in projs:
+        ig = p.defaultitemgroup()
+        if ig is None:
+            yield []
+            continue
+        projdir = p.absdirpath
+        yield [os.path.abspath(os.path.join(projdir, i.include))
+               for i in ig.get_items_of_types(itemtypes)
+               if i.include]
+
+
+def list_files(solution, cachepath=None, project=None, itemtypes=None):
+    """ Returns the absolute paths of the items in the solution, or in the
+        given project. By default, only source files are listed.
+    """
+    cache = get_solution_cache(solution, cachepath)
+    slnobj = cache.slnobj
+    if project:
+        projs = [slnobj.find_project_by_name(project, missing_ok=False)]
+    else:
+        projs = [p for p in slnobj.projects if not p.is_folder]
+
+    paths = []
+    for projpaths in iter_project_files(projs,
+                                        itemtypes or ITEM_TYPE_SOURCE_FILES):
+        paths += projpaths
+    return paths
+
+
+def _project_info(cache, proj):
+    return {'name': proj.name,
+            'full_name': cache.get_project_full_name(proj.guid),
+            'path': proj.abspath,
+            'guid': proj.guid}
+
+
+def find_item_project(solution, filename, cachepath=None):
+    """ Returns information about the project that the given file belongs
+        to, as a dictionary with its `name`, `full_name` (e.g.
+        `Folder\\Project`), `path` and `guid`.
+    """
+    cache = get_solution_cache(solution, cachepath)
+    proj = find_item_project_in_cache(cache, filename)
+    return _project_info(cache, proj)
+
+
+def _get_companion_score(item_path, ref_path):
+    for i, c in enumerate(zip(item_path, ref_path)):
+        if c[0] != c[1]:
+            return i
+    return min(len(item_path), len(ref_path))
+
+
+def find_companion(solution, filename, cachepath=None,
+                   companion_name=None, companion_type=None):
+    """ Returns the path of the "companion" of the given file, i.e. its
+        header if it's a source file, and vice-versa. Returns None if no
+        companion was found in the file's project.
+    """
+    # Try to guess the default companion file if needed.
+    if companion_name is None or companion_type is None:
+        primary_name, primary_ext = os.path.splitext(filename)
+        primary_name = os.path.basename(primary_name)
+        if primary_ext == '.cpp':
+            companion_name = primary_name + '.h'
+            companion_type = ITEM_TYPE_CPP_HDR
+        elif primary_ext == '.h':
+            companion_name = primary_name + '.cpp'
+            companion_type = ITEM_TYPE_CPP_SRC
+        else:
+            raise Exception("Can't guess the companion file for: %s" % filename)
+
+    # Find the primary file in the solution.
+    cache = get_solution_cache(solution, cachepath)
+    proj = find_item_project_in_cache(cache, filename)
+    logger.debug("Found project %s: %s" % (proj.name, proj.abspath))
+
+    # Look for the companion file in that project:
+    candidates = []
+    dfgroup = proj.defaultitemgroup()
+    for cur_item in dfgroup.get_items_of_type(companion_type):
+        cur_item_name = os.path.basename(cur_item.include)
+        if cur_item_name == companion_name:
+            cur_item_path = proj.get_abs_item_include(cur_item)
+            candidates.append((cur_item, _get_companion_score(cur_item_path, filename)))
+    candidates = sorted(candidates, key=lambda i: i[1], reverse=True)
+    logger.debug("Found candidates: %s" % [(c[0].include, c[1]) for c in candidates])
+    if candidates:
+        return proj.get_abs_item_include(candidates[0][0])
+    return None
+
+
+def _find_sln_config(slnobj, slnconfig):
+    """ Finds the solution configuration matching the given one, where
+        spaces may have been replaced by underscores (e.g. on the command
+        line).
+    """
+    sec = slnobj.globalsection('SolutionConfigurationPlatforms')
+    if sec:
+        slnconfig_key = slnconfig.replace(' ', '_')
+        for e in sec.entries:
+            if e.name.replace(' ', '_') == slnconfig_key:
+                return e.name
+    return slnconfig
+
+
+def get_project_config(solution, project, sln_config, cachepath=None):
+    """ Returns the project configuration that the given project builds in
+        the given solution configuration, as a dictionary with the `config`
+        name and whether the project is built at all (`build`). Returns
+        None if the project has no configuration for it.
+    """
+    cache = get_solution_cache(solution, cachepath)
+    proj = cache.slnobj.find_project_by_name(project)
+    if proj is None:
+        raise Exception("No such project: %s" % project)
+
+    sln_config = _find_sln_config(cache.slnobj, sln_config)
+    projcfg = cache.find_project_configuration(proj.guid, sln_config)
+    if projcfg is None:
+        return None
+    return {'config': projcfg[0], 'build': projcfg[1]}
+
+
+def find_affected_projects(solution, filenames, cachepath=None):
+    """ Returns the projects that need to be rebuilt when the given files
+        change, i.e. the projects containing them and all the projects
+        that depend on those, in build order. Projects are returned as
+        dictionaries like those of `find_item_project`.
+    """
+    cache = get_solution_cache(solution, cachepath)
+    guids = cache.find_affected_projects(filenames)
+    slnobj = cache.slnobj
+    return [_project_info(cache, slnobj.find_project_by_guid(g))
+            for g in guids]
+
+
+def get_project_dependencies(solution, project, cachepath=None,
+                             recursive=False):
+    """ Returns the names of the projects that the given project depends
+        on, either directly or, if `recursive`, indirectly too, in build
+        order.
+    """
+    cache = get_solution_cache(solution, cachepath)
+    slnobj = cache.slnobj
+    proj = slnobj.find_project_by_name(project, missing_ok=False)
+    guids = cache.get_project_dependencies(proj.guid, recursive=recursive)
+    return [slnobj.find_project_by_guid(g).name for g in guids]
+
+
+def record_project_stamps(solution, cachepath, projects=None, jobs=None):
+    """ Records the stamps of the files of the given projects (by name or
+        full name), or of all projects, so that `find_dirty_projects` can
+        later tell which ones changed.
+    """
+    from project_stamps import get_stamps_path, record_stamps
+    cache = get_solution_cache(solution, cachepath)
+    record_stamps(cache, get_stamps_path(cachepath), projects=projects,
+                  jobs=jobs)
+
+
+def snapshot_project_stamps(solution, cachepath, pendingpath, projects=None,
+                            jobs=None):
+    """ Takes the stamps of the files of the given projects (by name or
+        full name), or of all projects, right before building them. They're
+        kept in the given file until `commit_project_stamps` is called after
+        the build succeeds.
+    """
+    from project_stamps import save_pending_stamps, take_stamps
+    cache = get_solution_cache(solution, cachepath)
+    save_pending_stamps(take_stamps(cache, projects=projects, jobs=jobs),
+                        pendingpath)
+
+
+def commit_project_stamps(solution, cachepath, pendingpath):
+    """ Saves the stamps taken by `snapshot_project_stamps`, once the build
+        succeeded. Returns how many projects' stamps were saved.
+    """
+    from project_stamps import commit_pending_stamps, get_stamps_path
+    return commit_pending_stamps(get_stamps_path(cachepath), pendingpath)
+
+
+def find_dirty_projects(solution, cachepath, jobs=None,
+                        trust_dir_mtime=False):
+    """ Returns the projects whose files changed since their stamps were
+        last recorded, in build order, as dictionaries like those of
+        `find_item_project`.
+    """
+    from project_stamps import get_stamps_path, find_dirty_projects
+    cache = get_solution_cache(solution, cachepath)
+    guids = find_dirty_projects(cache, get_stamps_path(cachepath), jobs=jobs,
+                                trust_dir_mtime=trust_dir_mtime)
+    slnobj = cache.slnobj
+    return [_project_info(cache, slnobj.find_project_by_guid(g))
+            for g in guids]
+
+
+def update_include_graph(solution, cachepath, jobs=None):
+    """ Updates the include graph of the solution's C/C++ files, which is
+        saved next to the solution cache. Only the files that changed since
+        the last update are scanned again. Returns how many were scanned.
+    """
+    from include_graph import get_include_graph_path, update_include_graph
+    cache = get_solution_cache(solution, cachepath)
+    return update_include_graph(cache, get_include_graph_path(cachepath),
+                                jobs=jobs)
+
+
+def find_including_unit(solution, filename, cachepath=None,
+                        build_graph=False):
+    """ Returns the path of the translation unit (e.g. a `.cpp` file) that
+        includes the given file through the fewest `#include` directives,
+        according to the last include graph update, along with the GUID of
+        the unit's project. Returns None if there's no such file, or if the
+        include graph was never built and `build_graph` isn't set.
+    """
+    if not cachepath:
+        return None
+    from include_graph import get_include_graph_path, get_include_graph
+    graphpath = get_include_graph_path(cachepath)
+    graph = get_include_graph(graphpath)
+    if graph is None:
+        if not build_graph:
+            return None
+        logger.debug("Building include graph for the first time.")
+        update_include_graph(solution, cachepath)
+        graph = get_include_graph(graphpath)
+        if graph is None:
+            return None
+    return graph.find_closest_unit(filename)
+
+
+def update_file_shards(solution, cachepath):
+    """ Updates the per-project file lists saved next to the solution
+        cache, for external indexers. Only the lists of projects whose
+        files changed are written again. Returns the new generation of the
+        lists.
+    """
+    from file_shards import get_shards_dir, update_shards
+    cache = get_solution_cache(solution, cachepath)
+    return update_shards(cache, get_shards_dir(cachepath))
+
+
+def get_file_changes(solution, cachepath, since=0, manifest_id=None):
+    """ Updates the per-project file lists, and returns the files added
+        and removed since the given generation of these lists, as a
+        dictionary with the current manifest `id` and `generation`, and the
+        `added` and `removed` lists of paths. If the changes since then are
+        too old, or `manifest_id` isn't the id of the current manifest, all
+        files are listed as added, and `full` is set.
+    """
+    from file_shards import get_changes, get_shards_dir
+    update_file_shards(solution, cachepath)
+    return get_changes(get_shards_dir(cachepath), int(since), manifest_id)
+
+
+# Loaded file finder indices, keyed by solution and cache paths.
+_file_indices = {}
+
+
+def get_file_index(solution, cachepath=None):
+    """ Returns the file finder index of the given solution, re-using the
+        one loaded by a previous call, or the one saved next to the cache,
+        if it's still valid.
+    """
+    from find_files import (build_file_index, get_file_index_path,
+                            load_file_index, save_file_index)
+    solution = os.path.abspath(solution)
+    cachepath = os.path.abspath(cachepath) if cachepath else None
+    key = (solution, cachepath)
+    index = _file_indices.get(key)
+    if index is not None and index.is_up_to_date():
+        return index
+
+    index = None
+    if cachepath:
+        index = load_file_index(get_file_index_path(cachepath), solution)
+        if index is not None:
+            touch_cache(cachepath, solution)
+    if index is None:
+        check_time = time.time()
+        cache = get_solution_cache(solution, cachepath)
+        index = build_file_index(cache, check_time)
+        if cachepath:
+            save_file_index(index, get_file_index_path(cachepath))
+    _file_indices[key] = index
+    return index
+
+
+def find_files(solution, query, cachepath=None, limit=20, budget=0.1):
+    """ Returns the absolute paths of the solution files that best match
+        the given fuzzy query, best match first. Matching stops after
+        `budget` seconds, returning the best matches found until then.
+    """
+    index = get_file_index(solution, cachepath)
+    indices, _ = index.find(query, limit=int(limit), budget=float(budget))
+    return [index.get_abs_path(i) for i in indices]
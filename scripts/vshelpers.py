@@ -1,5 +1,7 @@
 import os.path
 import logging
+from cache_root import get_sln_cache_dir
+from logutil import span
 from vsutil import SolutionCache
 
 
@@ -9,7 +11,7 @@ config_format = 2  # Keep in sync with vimcrosoft.vim
 
 
 def load_vimcrosoft_auto_env(sln_file, build_env):
-    cache_file = os.path.join(os.path.dirname(sln_file), '.vimcrosoft', 'config.txt')
+    cache_file = os.path.join(get_sln_cache_dir(sln_file), 'config.txt')
     if not os.path.isfile(cache_file):
         logger.warn("No Vimcrosoft cache file found, you will probably have to specify "
                     "all configuration values in the command line!")
@@ -41,7 +43,7 @@ def load_vimcrosoft_auto_env(sln_file, build_env):
 
 
 def find_vimcrosoft_slncache(sln_file):
-    return os.path.join(os.path.dirname(sln_file), '.vimcrosoft', 'slncache.bin')
+    return os.path.join(get_sln_cache_dir(sln_file), 'slncache.bin')
 
 
 def get_solution_cache(solution, slncache=None):
@@ -50,11 +52,10 @@ def get_solution_cache(solution, slncache=None):
             "No solution path was provided!")
 
     cache, loaded = SolutionCache.load_or_rebuild(solution, slncache)
-    if not loaded:
+    if not loaded and not slncache:
+        # The cache is only built and saved by `load_or_rebuild` when it
+        # has a cache file to save to.
         cache.build_cache()
-        if slncache:
-            logger.debug(f"Saving solution cache: {slncache}")
-            cache.save(slncache)
 
     return cache
 
@@ -62,20 +63,25 @@ def get_solution_cache(solution, slncache=None):
 def find_item_project(item_path, solution, slncache=None):
     # Load the solution
     cache = get_solution_cache(solution, slncache)
+    proj = find_item_project_in_cache(cache, item_path)
+    return cache, proj
+
 
+def find_item_project_in_cache(cache, item_path):
     # Find the primary file in the solution.
     item_path_lower = item_path.lower()
     projpath = None
-    for pp, pi in cache.index.items():
-        if item_path_lower in pi:
-            projpath = pp
-            break
-    else:
-        raise Exception("File doesn't belong to the solution: %s" % item_path)
+    with span('index.lookup'):
+        for pp, pi in cache.index.items():
+            if item_path_lower in pi:
+                projpath = pp
+                break
+        else:
+            raise Exception("File doesn't belong to the solution: %s" % item_path)
 
     # Find the project that our file belongs to.
     proj = cache.slnobj.find_project_by_path(projpath)
     if not proj:
         raise Exception("Can't find project in solution: %s" % projpath)
 
-    return cache, proj
+    return proj
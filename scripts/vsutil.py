@@ -1,9 +1,21 @@
-import copy
+import bisect
+import collections
+import collections.abc
+import hashlib
+import heapq
 import logging
+import os
 import os.path
 import pickle
+import posixpath
 import re
-import xml.etree.ElementTree as etree
+import sys
+import time
+from cache_stats import CacheStats, get_stats_path, save_cache_stats
+from fsutil import atomic_write, file_lock
+from logutil import span, traced
+from cache_root import enforce_max_cache_size, touch_cache
+from sln_meta import get_meta_path, get_sln_stamp, make_sln_meta, save_sln_meta
 
 
 # Known VS project types.
@@ -34,6 +46,16 @@ ITEM_TYPE_SOURCE_FILES = (ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR,
 PROP_CONFIGURATION_TYPE = 'ConfigurationType'
 PROP_NMAKE_PREPROCESSOR_DEFINITIONS = 'NMakePreprocessorDefinitions'
 PROP_NMAKE_INCLUDE_SEARCH_PATH = 'NMakeIncludeSearchPath'
+PROP_ENABLE_DEFAULT_ITEMS = 'EnableDefaultItems'
+PROP_ENABLE_DEFAULT_COMPILE_ITEMS = 'EnableDefaultCompileItems'
+
+# Item metadata that changes how a specific item is compiled.
+ITEM_FLAG_METADATA = ('AdditionalIncludeDirectories', 'ForcedIncludeFiles')
+
+# Implicit items of SDK-style projects, and what they exclude by default.
+SDK_DEFAULT_COMPILE_ITEMS = '**/*.cs'
+SDK_DEFAULT_ITEM_EXCLUDES = ('bin/**;obj/**;**/*.user;**/*.*proj;**/*.sln;'
+                             '**/*.vssscc;**/.*/**')
 
 
 logger = logging.getLogger(__name__)
@@ -57,17 +79,197 @@ def _resolve_value(val, env):
         varval = env.get(varname, '')
         return varval
 
-    if not val:
+    # Most values don't have any variables, so return those as they are,
+    # without running the regex or making a new string.
+    if not val or '$(' not in val:
         return val
     return re_msbuild_var.sub(_repl_vars, val)
 
 
+def _has_variables(val):
+    return bool(val) and '$(' in val
+
+
 def _evaluate_condition(cond, env):
     """ Expands MSBuild property values in a condition and evaluates it. """
     left, right = _resolve_value(cond, env).split('==')
     return left == right
 
 
+_dir_scan_cache = {}
+
+
+def _scan_dir(dirpath, scanned=None):
+    """ Returns the sorted lists of files and sub-directories in a directory.
+        Listings are cached for as long as the directory's modification time
+        doesn't change, so projects sharing a source tree only scan it once.
+        If given, `scanned` is filled with the modification times of all
+        the directories that were looked at.
+    """
+    key = os.path.normcase(os.path.abspath(dirpath))
+    try:
+        mtime = os.stat(key).st_mtime_ns
+    except OSError:
+        return ((), ())
+    if scanned is not None:
+        scanned[key] = mtime
+
+    cached = _dir_scan_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    files = []
+    dirs = []
+    try:
+        with os.scandir(key) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    files.sort()
+    dirs.sort()
+    _dir_scan_cache[key] = (mtime, files, dirs)
+    return files, dirs
+
+
+_re_glob_flags = re.IGNORECASE if os.name == 'nt' else 0
+
+
+def _has_wildcards(val):
+    return '*' in val or '?' in val
+
+
+def _normalize_item_path(path):
+    """ Normalizes an item path to forward slashes, for glob matching. """
+    return posixpath.normpath(path.replace('\\', '/'))
+
+
+def _split_item_specs(val):
+    """ Splits a semicolon-separated list of item specs. """
+    return [_normalize_item_path(v.strip())
+            for v in val.split(';') if v.strip()]
+
+
+def _glob_to_regex(pattern):
+    """ Converts an MSBuild wildcard pattern (`*`, `?` and `**`, on normalized
+        item paths) into a compiled regular expression.
+    """
+    segs = pattern.split('/')
+    if segs[-1] == '**':
+        segs.append('*')
+    parts = []
+    for i, seg in enumerate(segs):
+        if seg == '**':
+            parts.append('(?:[^/]*/)*')
+            continue
+        for c in seg:
+            if c == '*':
+                parts.append('[^/]*')
+            elif c == '?':
+                parts.append('[^/]')
+            else:
+                parts.append(re.escape(c))
+        if i < len(segs) - 1:
+            parts.append('/')
+    return re.compile(''.join(parts) + r'\Z', _re_glob_flags)
+
+
+class _ItemSpecMatcher:
+    """ Matches normalized item paths against a list of MSBuild item specs,
+        which can be literal paths or wildcard patterns.
+    """
+    def __init__(self, specs):
+        self.literals = set()
+        self.regexes = []
+        # Patterns like `obj/**` exclude whole directories, which we can
+        # then skip entirely when walking the file system.
+        self.dir_regexes = []
+        for spec in specs:
+            if _has_wildcards(spec):
+                self.regexes.append(_glob_to_regex(spec))
+                if spec.endswith('/**'):
+                    self.dir_regexes.append(_glob_to_regex(spec[:-3]))
+            else:
+                self.literals.add(self._key(spec))
+
+    def _key(self, path):
+        return path.lower() if _re_glob_flags else path
+
+    def __bool__(self):
+        return bool(self.literals or self.regexes)
+
+    def matches(self, path):
+        if self._key(path) in self.literals:
+            return True
+        return any(r.match(path) for r in self.regexes)
+
+    def matches_dir(self, dirpath):
+        return any(r.match(dirpath) for r in self.dir_regexes)
+
+
+def _expand_item_glob(basedir, pattern, excluder, scanned):
+    """ Expands a wildcard item spec, relative to the given base directory,
+        into the list of matching normalized item paths.
+    """
+    segs = pattern.split('/')
+    fixed = []
+    for seg in segs:
+        if _has_wildcards(seg):
+            break
+        fixed.append(seg)
+    prefix = '/'.join(fixed)
+    recursive = len(fixed) < len(segs) - 1 or segs[-1] == '**'
+    regex = _glob_to_regex(pattern)
+
+    res = []
+    stack = [prefix]
+    while stack:
+        reldir = stack.pop()
+        files, dirs = _scan_dir(os.path.join(basedir, reldir), scanned)
+        for f in files:
+            relpath = reldir + '/' + f if reldir else f
+            if regex.match(relpath) and not excluder.matches(relpath):
+                res.append(relpath)
+        if recursive:
+            for d in reversed(dirs):
+                relsubdir = reldir + '/' + d if reldir else d
+                if not excluder.matches_dir(relsubdir):
+                    stack.append(relsubdir)
+    return res
+
+
+def expand_item_include(basedir, include, exclude=None, scanned=None):
+    """ Expands an item's `Include` attribute, relative to the given base
+        directory, into a list of item paths, following MSBuild semantics:
+        the attribute can contain several semicolon-separated specs, and
+        each of them can have wildcards (`*`, `?` and recursive `**`).
+        Paths matching the `Exclude` specs are left out.
+
+        Values that still contain unresolved properties are returned as-is.
+    """
+    if not include or '$(' in include:
+        return [include]
+    if ';' not in include and not _has_wildcards(include) and not exclude:
+        return [include]
+
+    excluder = _ItemSpecMatcher(_split_item_specs(exclude or ''))
+    res = []
+    for spec in _split_item_specs(include):
+        if _has_wildcards(spec):
+            res += [p.replace('/', os.sep)
+                    for p in _expand_item_glob(basedir, spec, excluder,
+                                               scanned)]
+        elif not excluder.matches(spec):
+            res.append(spec.replace('/', os.sep))
+    return res
+
+
 class VSBaseGroup:
     """ Base class for VS project stuff that has conditional stuff inside.
 
@@ -94,19 +296,15 @@ class VSBaseGroup:
             self.conditionals[condition] = c
         return c
 
-    def _resolve(self, env):
-        """ Resolves this group by evaluating each conditional sub-group
-            based on the given build environment. Returns a 'flattened'
-            version of ourselves.
+    def _get_active_groups(self, env):
+        """ Returns this group and the conditional sub-groups that apply to
+            the given build environment.
         """
-        c = self.__class__(self.label)
-        c._collapse_child(self, env)
-
+        groups = [self]
         for cond, child in self.conditionals.items():
             if _evaluate_condition(cond, env):
-                c._collapse_child(child, env)
-
-        return c
+                groups.append(child)
+        return groups
 
 
 class VSProjectItem:
@@ -117,10 +315,63 @@ class VSProjectItem:
         self.metadata = {}
 
     def _resolve(self, env):
-        c = VSProjectItem(_resolve_value(self.include, env), self.itemtype)
-        c.metadata = {k: _resolve_value(v, env)
-                      for k, v in self.metadata.items()}
-        return c
+        """ Returns this item as seen in the given build environment, i.e.
+            itself if it doesn't have any variables in it, and a lazy view
+            on it otherwise.
+        """
+        if (_has_variables(self.include) or
+                any(_has_variables(v) for v in self.metadata.values())):
+            return VSResolvedProjectItem(self, env)
+        return self
+
+    def __str__(self):
+        return "(%s)%s" % (self.itemtype, self.include)
+
+
+class _ResolvedMetadata(collections.abc.Mapping):
+    """ A read-only view on an item's metadata that expands variables in
+        values as they're read.
+    """
+    __slots__ = ('_metadata', '_env')
+
+    def __init__(self, metadata, env):
+        self._metadata = metadata
+        self._env = env
+
+    def __getitem__(self, key):
+        return _resolve_value(self._metadata[key], self._env)
+
+    def __iter__(self):
+        return iter(self._metadata)
+
+    def __len__(self):
+        return len(self._metadata)
+
+
+class VSResolvedProjectItem:
+    """ A view on a project item in a given build environment, whose include
+        and metadata values are only expanded when they're read.
+    """
+    __slots__ = ('_item', '_env', '_include')
+
+    def __init__(self, item, env):
+        self._item = item
+        self._env = env
+        self._include = None
+
+    @property
+    def itemtype(self):
+        return self._item.itemtype
+
+    @property
+    def include(self):
+        if self._include is None:
+            self._include = _resolve_value(self._item.include, self._env)
+        return self._include
+
+    @property
+    def metadata(self):
+        return _ResolvedMetadata(self._item.metadata, self._env)
 
     def __str__(self):
         return "(%s)%s" % (self.itemtype, self.include)
@@ -148,8 +399,44 @@ class VSProjectItemGroup(VSBaseGroup):
             if i.itemtype in typeset:
                 yield i
 
-    def _collapse_child(self, child, env):
-        self.items += [i._resolve(env) for i in child.items]
+    def _resolve(self, env):
+        """ Returns a view of this group in the given build environment. """
+        return VSResolvedItemGroup(self, env)
+
+
+class VSResolvedItemGroup:
+    """ A view of an item group in a given build environment. Conditions
+        are evaluated once, when the view is made, but items are only
+        resolved (see `VSProjectItem._resolve`) as they're iterated over,
+        and only if they're of the requested types.
+    """
+    def __init__(self, group, env):
+        self.label = group.label
+        # Items are expanded later, so take a copy of the environment in
+        # case the caller changes it in the meantime (e.g. `ProjectDir`,
+        # when it's re-used for another project). Items share this copy.
+        self._env = dict(env)
+        self._groups = group._get_active_groups(env)
+
+    def _iter_items(self, typeset=None):
+        env = self._env
+        for group in self._groups:
+            for i in group.items:
+                if typeset is None or i.itemtype in typeset:
+                    yield i._resolve(env)
+
+    @property
+    def items(self):
+        return list(self._iter_items())
+
+    def get_source_items(self):
+        return self.get_items_of_types(ITEM_TYPE_SOURCE_FILES)
+
+    def get_items_of_type(self, itemtype):
+        return self._iter_items((itemtype,))
+
+    def get_items_of_types(self, itemtypes):
+        return self._iter_items(set(itemtypes))
 
 
 class VSProjectProperty:
@@ -159,8 +446,9 @@ class VSProjectProperty:
         self.value = value
 
     def _resolve(self, env):
-        c = VSProjectProperty(self.name, _resolve_value(self.value, env))
-        return c
+        if not _has_variables(self.value):
+            return self
+        return VSProjectProperty(self.name, _resolve_value(self.value, env))
 
     def __str__(self):
         return "%s=%s" % (self.name, self.value)
@@ -184,8 +472,39 @@ class VSProjectPropertyGroup(VSBaseGroup):
                 return p.value
         raise IndexError()
 
-    def _collapse_child(self, child, env):
-        self.properties += [p._resolve(env) for p in child.properties]
+    def _resolve(self, env):
+        """ Returns a view of this group in the given build environment. """
+        return VSResolvedPropertyGroup(self, env)
+
+
+class VSResolvedPropertyGroup:
+    """ A view of a property group in a given build environment. Conditions
+        are evaluated once, when the view is made, but values are only
+        expanded when they're read.
+    """
+    def __init__(self, group, env):
+        self.label = group.label
+        # Like `VSResolvedItemGroup`, keep the environment as it is now.
+        self._env = dict(env)
+        self._groups = group._get_active_groups(env)
+
+    @property
+    def properties(self):
+        env = self._env
+        return [p._resolve(env) for g in self._groups for p in g.properties]
+
+    def get(self, propname):
+        try:
+            return self[propname]
+        except IndexError:
+            return None
+
+    def __getitem__(self, propname):
+        for g in self._groups:
+            for p in g.properties:
+                if p.name == propname:
+                    return _resolve_value(p.value, self._env)
+        raise IndexError()
 
 
 class VSProject:
@@ -200,6 +519,21 @@ class VSProject:
         self._propgroups = None
         self._sln = None
         self._missing = False
+        self._globdirs = {}
+        self._source_index = None
+        self._project_refs = None
+        self._store_key = None
+        self.sections = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._store_key is not None:
+            # The parsed project lives in the project store, so only keep
+            # a reference to it, along with the small summaries that the
+            # solution cache needs when it's rebuilt.
+            state['_itemgroups'] = None
+            state['_propgroups'] = None
+        return state
 
     @property
     def is_folder(self):
@@ -235,7 +569,8 @@ class VSProject:
         if resolved_with is not None and ig is not None:
             logger.debug("Resolving item group '%s'." % ig.label)
             self._validate_build_env(resolved_with)
-            ig = ig._resolve(resolved_with)
+            with span('project.resolve'):
+                ig = ig._resolve(resolved_with)
         return ig
 
     def defaultitemgroup(self, resolved_with=None):
@@ -247,32 +582,71 @@ class VSProject:
         if resolved_with is not None and pg is not None:
             logger.debug("Resolving property group '%s'." % pg.label)
             self._validate_build_env(resolved_with)
-            pg = pg._resolve(resolved_with)
+            with span('project.resolve'):
+                pg = pg._resolve(resolved_with)
         return pg
 
     def defaultpropertygroup(self, resolved_with=None):
         return self.propertygroup(None, resolved_with=resolved_with)
 
+    def projectsection(self, name):
+        for sec in self.sections:
+            if sec.name == name:
+                return sec
+        return None
+
     def get_abs_item_include(self, item):
         return os.path.abspath(os.path.join(self.absdirpath, item.include))
 
+    def get_source_item_index(self):
+        """ Returns the set of lower-case absolute paths of this project's
+            source items, for finding which project a file belongs to.
+        """
+        if self._source_index is None:
+            index = set()
+            itemgroup = self.defaultitemgroup()
+            if itemgroup:
+                projdir = self.absdirpath
+                for item in itemgroup.get_source_items():
+                    # Some obscure VS features make items without a path.
+                    if item.include:
+                        index.add(os.path.abspath(
+                            os.path.join(projdir, item.include)).lower())
+            self._source_index = index
+        return self._source_index
+
+    def get_project_references(self):
+        """ Returns the projects referenced by this project's
+            `ProjectReference` items, including conditional ones, as
+            `(path, guid)` tuples with the normalized absolute path of the
+            referenced project, and its upper-case GUID if the item says.
+        """
+        if self._project_refs is None:
+            refs = []
+            for ig in _iter_group_tree(self.itemgroups):
+                for item in ig.get_items_of_type(ITEM_TYPE_CS_PROJREF):
+                    refpath = os.path.normcase(os.path.normpath(
+                        self.get_abs_item_include(item)))
+                    refguid = (item.metadata.get('Project') or '')
+                    refs.append((refpath, refguid.strip('{}').upper()))
+            self._project_refs = refs
+        return self._project_refs
+
+    @traced('project.resolve')
     def resolve(self, env):
+        """ Returns views of all this project's property and item groups in
+            the given build environment, as two dictionaries keyed by group
+            label.
+        """
         self._ensure_loaded()
 
         self._validate_build_env(env)
 
-        propgroups = list(self._propgroups)
-        itemgroups = list(self._itemgroups)
-        self._propgroups[:] = []
-        self._itemgroups[:] = []
-
-        for pg in propgroups:
-            rpg = pg._resolve(env)
-            self._propgroups.append(rpg)
-
-        for ig in itemgroups:
-            rig = ig._resolve(env)
-            self._itemgroups.append(rig)
+        propgroups = {label: pg._resolve(env)
+                      for label, pg in self._propgroups.items()}
+        itemgroups = {label: ig._resolve(env)
+                      for label, ig in self._itemgroups.items()}
+        return propgroups, itemgroups
 
     def _validate_build_env(self, buildenv):
         buildenv['SolutionDir'] = self.owner.dirpath + os.path.sep
@@ -282,17 +656,37 @@ class VSProject:
         if self._itemgroups is None or self._propgroups is None:
             self._load()
 
+    @traced('project.load')
     def _load(self):
         if not self.path:
             raise Exception("The current project has no path.")
+        self._source_index = None
+        self._project_refs = None
         if self.is_folder:
             logger.debug(f"Skipping folder project {self.name}")
             self._itemgroups = {}
             self._propgroups = {}
             return
 
+        # Look for a copy of this project that was already parsed for this
+        # or another solution.
+        store = self.owner.project_store
+        store_key = None
+        if store is not None:
+            if self._store_key and store.load(self, self._store_key):
+                return
+            # Get the key before parsing, so that the stored copy is never
+            # newer than its key.
+            store_key = store.get_key(self)
+            if store_key and store.load(self, store_key):
+                return
+
         ns = {'ms': 'http://schemas.microsoft.com/developer/msbuild/2003'}
 
+        # Only import the XML parser when we actually parse projects, so
+        # that scripts working off a valid cache start faster.
+        import xml.etree.ElementTree as etree
+
         abspath = self.abspath
         logger.debug(f"Loading project {self.name} ({self.path}) from: {abspath}")
         try:
@@ -310,17 +704,49 @@ class VSProject:
 
         # Load ItemGroups and PropertyGroups via both namespaced names and raw
         # names because not all types of VS projects use the MS namespaces.
+        # Properties are loaded first because they tell us whether an
+        # SDK-style project has implicit items.
+        self._propgroups = {}
+        for propgroupnode in root.iterfind('PropertyGroup', ns):
+            self._load_property_group(propgroupnode)
+        for propgroupnode in root.iterfind('ms:PropertyGroup', ns):
+            self._load_property_group(propgroupnode)
+
         self._itemgroups = {}
+        self._globdirs = {}
+        if root.attrib.get('Sdk'):
+            self._add_sdk_default_items()
         for itemgroupnode in root.iterfind('ItemGroup', ns):
             self._load_item_group(itemgroupnode)
         for itemgroupnode in root.iterfind('ms:ItemGroup', ns):
             self._load_item_group(itemgroupnode)
 
-        self._propgroups = {}
-        for propgroupnode in root.iterfind('PropertyGroup', ns):
-            self._load_property_group(propgroupnode)
-        for propgroupnode in root.iterfind('ms:PropertyGroup', ns):
-            self._load_property_group(propgroupnode)
+        if store_key:
+            store.save(self, store_key)
+
+    def _is_property_disabled(self, propname):
+        for pg in self._propgroups.values():
+            val = pg.get(propname)
+            if val and val.strip().lower() == 'false':
+                return True
+        return False
+
+    def _add_sdk_default_items(self):
+        """ Adds the items that SDK-style projects include implicitly, like
+            all the C# source files under the project directory.
+        """
+        if (self._is_property_disabled(PROP_ENABLE_DEFAULT_ITEMS) or
+                self._is_property_disabled(PROP_ENABLE_DEFAULT_COMPILE_ITEMS)):
+            return
+
+        itemgroup = VSProjectItemGroup(None)
+        self._itemgroups[None] = itemgroup
+        for inc in expand_item_include(self.absdirpath,
+                                       SDK_DEFAULT_COMPILE_ITEMS,
+                                       SDK_DEFAULT_ITEM_EXCLUDES,
+                                       self._globdirs):
+            itemgroup.items.append(VSProjectItem(inc, ITEM_TYPE_CS_SRC))
+        logger.debug(f"Added {len(itemgroup.items)} implicit SDK items")
 
     def _load_item_group(self, itemgroupnode):
         label = itemgroupnode.attrib.get('Label')
@@ -335,11 +761,33 @@ class VSProject:
             itemgroup = itemgroup.get_or_create_conditional(condition)
 
         for itemnode in itemgroupnode:
+            itemtype = _strip_ns(itemnode.tag)
             incval = itemnode.attrib.get('Include')
-            item = VSProjectItem(incval, _strip_ns(itemnode.tag))
-            itemgroup.items.append(item)
-            for metanode in itemnode:
-                item.metadata[_strip_ns(metanode.tag)] = metanode.text
+            remval = itemnode.attrib.get('Remove')
+            if incval is None and remval:
+                self._remove_items(itemgroup, itemtype, remval)
+                continue
+
+            metadata = {_strip_ns(metanode.tag): metanode.text
+                        for metanode in itemnode}
+            for inc in expand_item_include(self.absdirpath, incval,
+                                           itemnode.attrib.get('Exclude'),
+                                           self._globdirs):
+                item = VSProjectItem(inc, itemtype)
+                item.metadata = dict(metadata)
+                itemgroup.items.append(item)
+
+    def _remove_items(self, itemgroup, itemtype, remval):
+        """ Handles items with a `Remove` attribute, which drop previously
+            included items of the same type.
+        """
+        if '$(' in remval:
+            return
+        matcher = _ItemSpecMatcher(_split_item_specs(remval))
+        itemgroup.items[:] = [
+            i for i in itemgroup.items
+            if (i.itemtype != itemtype or not i.include or
+                not matcher.matches(_normalize_item_path(i.include)))]
 
     def _load_property_group(self, propgroupnode):
         label = propgroupnode.attrib.get('Label')
@@ -377,12 +825,20 @@ class VSGlobalSection:
         self.entries = []
 
 
+class VSProjectSection(VSGlobalSection):
+    """ A section in a project's declaration in a VS solution, like the
+        list of projects it depends on.
+    """
+    pass
+
+
 class VSSolution:
     """ A VS solution. """
     def __init__(self, path=None):
         self.path = path
         self.projects = []
         self.sections = []
+        self.project_store = None
 
     @property
     def dirpath(self):
@@ -394,7 +850,7 @@ class VSSolution:
                 return p
         if missing_ok:
             return None
-        return MissingVSProjectError(f"Can't find project with name: {name}")
+        raise MissingVSProjectError(f"Can't find project with name: {name}")
 
     def find_project_by_path(self, path, missing_ok=True):
         for p in self.projects:
@@ -418,16 +874,9 @@ class VSSolution:
                 return sec
         return None
 
-    def find_project_configuration(self, proj_guid, sln_config):
-        configs = self.globalsection('ProjectConfigurationPlatforms')
-        if not configs:
-            return None
 
-        entry_name = '{%s}.%s.Build.0' % (proj_guid, sln_config)
-        for entry in configs.entries:
-            if entry.name == entry_name:
-                return entry.value
-        return None
+_re_proj_config_entry = re.compile(
+    r'^\{(?P<guid>[^}]+)\}\.(?P<slncfg>.+)\.(?P<kind>ActiveCfg|Build\.0)$')
 
 
 _re_sln_project_decl_start = re.compile(
@@ -435,6 +884,9 @@ _re_sln_project_decl_start = re.compile(
     r'"(?P<name>[^"]+)", "(?P<path>[^"]+)", "\{(?P<guid>[A-Z0-9\-]+)\}"$')
 _re_sln_project_decl_end = re.compile(
     r'^EndProject$')
+_re_sln_project_section_start = re.compile(
+    r'^\s*ProjectSection\((?P<name>\w+)\) \= (?P<step>\w+)$')
+_re_sln_project_section_end = re.compile(r'^\s*EndProjectSection$')
 
 _re_sln_global_start = re.compile(r'^Global$')
 _re_sln_global_end = re.compile(r'^EndGlobal$')
@@ -443,6 +895,7 @@ _re_sln_global_section_start = re.compile(
 _re_sln_global_section_end = re.compile(r'^\s*EndGlobalSection$')
 
 
+@traced('sln.parse')
 def parse_sln_file(slnpath):
     """ Parses a solution file, returns a solution object.
         The projects are not loaded (they will be lazily loaded upon
@@ -457,17 +910,36 @@ def parse_sln_file(slnpath):
 
 
 def _parse_sln_file_text(slnobj, lines):
-    until = None
+    in_project = None
+    in_project_section = None
     in_global = False
     in_global_section = None
 
     for i, line in enumerate(lines):
-        if until:
-            # We need to parse something until a given token, so let's
-            # do that and ignore everything else.
-            m = until.search(line)
+        if in_project:
+            # We're in a project declaration, which can contain sections,
+            # like the list of projects it depends on.
+            if in_project_section:
+                m = _re_sln_project_section_end.search(line)
+                if m:
+                    in_project_section = None
+                    continue
+
+                ename, _, evalue = line.strip().partition('=')
+                in_project_section.entries.append(VSGlobalSectionEntry(
+                    ename.strip(),
+                    evalue.strip()))
+                continue
+
+            m = _re_sln_project_section_start.search(line)
+            if m:
+                in_project_section = VSProjectSection(m.group('name'))
+                in_project.sections.append(in_project_section)
+                continue
+
+            m = _re_sln_project_decl_end.search(line)
             if m:
-                until = None
+                in_project = None
             continue
 
         if in_global:
@@ -519,7 +991,7 @@ def _parse_sln_file_text(slnobj, lines):
             slnobj.projects.append(p)
             p._sln = slnobj
 
-            until = _re_sln_project_decl_end
+            in_project = p
             continue
 
         m = _re_sln_global_start.search(line)
@@ -533,86 +1005,982 @@ def _parse_sln_file_text(slnobj, lines):
         continue
 
 
+class ResolvedProjectView:
+    """ A project's settings, resolved for one solution configuration:
+        the properties of its `Configuration` and default property groups,
+        and the flag-related metadata of its C++ items, keyed by their
+        lower-cased absolute paths.
+    """
+    def __init__(self, proj_config, builds):
+        self.proj_config = proj_config
+        self.builds = builds
+        self.config_props = {}
+        self.default_props = {}
+        self.item_flags = {}
+
+
+def _get_group_props(group):
+    props = {}
+    if group is not None:
+        for p in group.properties:
+            # Match `VSProjectPropertyGroup.get`, which returns the first
+            # property with a given name.
+            props.setdefault(p.name, p.value)
+    return props
+
+
+def get_item_flag_metadata(projdir, items):
+    """ Returns the flag-related metadata of the given items, keyed by
+        their lower-cased absolute paths. Items without any such metadata
+        are left out.
+    """
+    res = {}
+    for item in items:
+        if not item.include:
+            continue
+        # Resolved items expand metadata values each time they're read, and
+        # build a new view each time `metadata` is read.
+        md = item.metadata
+        meta = {}
+        for k in ITEM_FLAG_METADATA:
+            value = md.get(k)
+            if value:
+                meta[k] = value
+        if meta:
+            path = os.path.normpath(os.path.join(projdir, item.include))
+            res[path.lower()] = meta
+    return res
+
+
+def _resolve_project_views(task):
+    """ Resolves a project for a list of configurations. This runs in
+        worker processes, so it only gets the project's groups and paths
+        rather than the project itself, which references the whole
+        solution.
+    """
+    slndir, projdir, propgroups, itemgroups, configs = task
+    cfggroup = propgroups.get('Configuration')
+    defpropgroup = propgroups.get(None)
+    defitemgroup = itemgroups.get(None)
+
+    views = []
+    for sln_config, proj_config, builds in configs:
+        config, platform = proj_config.split('|')
+        env = {'Configuration': config,
+               'Platform': platform,
+               'SolutionDir': slndir + os.path.sep,
+               'ProjectDir': projdir + os.path.sep}
+        view = ResolvedProjectView(proj_config, builds)
+        if cfggroup is not None:
+            view.config_props = _get_group_props(cfggroup._resolve(env))
+        if defpropgroup is not None:
+            view.default_props = _get_group_props(defpropgroup._resolve(env))
+        if defitemgroup is not None:
+            items = defitemgroup._resolve(env).get_items_of_types(
+                (ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR))
+            view.item_flags = get_item_flag_metadata(projdir, items)
+        views.append((sln_config, view))
+    return views
+
+
+class ProjectStore:
+    """ A directory of parsed projects, shared by the caches of all the
+        solutions using it, so that projects referenced by several solutions
+        are only parsed and saved once. Entries are keyed by the project's
+        absolute path and file stamp, so a changed project gets a new entry
+        instead of replacing the one other solution caches refer to.
+
+        An entry's modification time is when it was last used, and entries
+        not used for a while are removed (see `collect_garbage`), since
+        they're usually for old versions of projects. Solution caches
+        referring to a removed entry just parse the project again.
+    """
+    # Bump this when the project classes change.
+    VERSION = 2
+
+    # Entries not used for that long are removed.
+    MAX_AGE = 30 * 86400
+    # How often `collect_garbage_if_due` looks for old entries.
+    GC_INTERVAL = 86400
+    # Using an entry only updates its modification time if it's older than
+    # this, so that loading projects doesn't always write to the disk.
+    TOUCH_INTERVAL = 3600
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+
+    def get_key(self, proj):
+        """ Returns the store key for the current version of the given
+            project's file, or `None` if the file can't be read.
+        """
+        abspath = proj.abspath
+        try:
+            st = os.stat(abspath)
+        except OSError:
+            return None
+        key = '%s|%d|%d' % (os.path.normcase(os.path.abspath(abspath)),
+                            st.st_mtime_ns, st.st_size)
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.dirpath, key[:2], key + '.bin')
+
+    @traced('store.load')
+    def load(self, proj, key):
+        """ Loads the parsed groups of a project from the store entry with
+            the given key. Returns whether a valid entry was found.
+        """
+        entrypath = self.get_entry_path(key)
+        try:
+            with open(entrypath, 'rb') as fp:
+                entry_mtime = os.fstat(fp.fileno()).st_mtime
+                entry = pickle.load(fp)
+        except FileNotFoundError:
+            return False
+        except Exception as ex:
+            logger.debug(f"Ignoring invalid project store entry {key}: {ex}")
+            return False
+        if entry.get('version') != ProjectStore.VERSION:
+            return False
+
+        (itemgroups, propgroups, globdirs,
+         source_index, project_refs) = entry['project']
+        # Items expanded from wildcards are only valid as long as no files
+        # were added or removed in the directories they come from.
+        if _have_glob_dirs_changed(globdirs):
+            return False
+
+        proj._itemgroups = itemgroups
+        proj._propgroups = propgroups
+        proj._globdirs = globdirs
+        proj._source_index = source_index
+        proj._project_refs = project_refs
+        proj._store_key = key
+        logger.debug(f"Loaded project {proj.name} from the project store.")
+        if time.time() - entry_mtime > ProjectStore.TOUCH_INTERVAL:
+            try:
+                os.utime(entrypath)
+            except OSError:
+                pass
+        return True
+
+    @traced('store.save')
+    def save(self, proj, key):
+        """ Saves the parsed groups of a project in the store, under the
+            given key.
+        """
+        entry = {'version': ProjectStore.VERSION,
+                 'path': proj.abspath,
+                 'project': (proj._itemgroups, proj._propgroups,
+                             proj._globdirs, proj.get_source_item_index(),
+                             proj.get_project_references())}
+        try:
+            with atomic_write(self.get_entry_path(key), 'wb') as fp:
+                pickle.dump(entry, fp)
+        except OSError as ex:
+            # The project stays in the solution cache instead.
+            logger.warning(f"Can't save project {proj.name} in the project "
+                           f"store: {ex}")
+            return
+        proj._store_key = key
+
+    def list_entries(self):
+        """ Returns the files in the store, least recently used first, as
+            `(path, last use time, size)` tuples.
+        """
+        entries = []
+        try:
+            subdirs = list(os.scandir(self.dirpath))
+        except FileNotFoundError:
+            return entries
+        for subdir in subdirs:
+            if not subdir.is_dir(follow_symlinks=False):
+                continue
+            try:
+                files = list(os.scandir(subdir.path))
+            except OSError:
+                continue
+            # This includes temporary files left by killed processes.
+            for f in files:
+                try:
+                    st = f.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((f.path, st.st_mtime, st.st_size))
+        entries.sort(key=lambda e: e[1])
+        return entries
+
+    def get_entry_paths(self, projs):
+        """ Returns the normalized paths of the entries that the given
+            projects were loaded from, or saved to.
+        """
+        return {os.path.normcase(self.get_entry_path(p._store_key))
+                for p in projs if p._store_key}
+
+    def collect_garbage(self, max_age=None, keep=None, dry_run=False):
+        """ Removes the entries not used for more than `max_age` seconds
+            (by default, `MAX_AGE`), except those whose paths are in `keep`
+            (see `get_entry_paths`). Returns the removed entries, like
+            `list_entries` does.
+        """
+        if max_age is None:
+            max_age = ProjectStore.MAX_AGE
+        keep = keep or set()
+        oldest = time.time() - max_age
+        removed = []
+        for entry in self.list_entries():
+            path, last_use, _ = entry
+            if last_use >= oldest:
+                break
+            if os.path.normcase(path) in keep:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except OSError as ex:
+                    logger.debug(f"Can't remove project store entry: {ex}")
+                    continue
+            removed.append(entry)
+        if removed:
+            logger.debug(f"Removed {len(removed)} old project store entries.")
+        return removed
+
+    def collect_garbage_if_due(self, keep=None):
+        """ Same as `collect_garbage`, but only if it wasn't done in the
+            last `GC_INTERVAL` seconds.
+        """
+        stamppath = os.path.join(self.dirpath, 'last_gc')
+        try:
+            if time.time() - os.path.getmtime(stamppath) < \
+                    ProjectStore.GC_INTERVAL:
+                return []
+        except OSError:
+            pass
+        try:
+            os.makedirs(self.dirpath, exist_ok=True)
+            with open(stamppath, 'w'):
+                pass
+        except OSError as ex:
+            logger.debug(f"Can't write project store GC stamp: {ex}")
+            return []
+        return self.collect_garbage(keep=keep)
+
+
 class SolutionCache:
     """ A class that contains a VS solution object, along with pre-indexed
         lists of items. It's meant to be saved on disk.
     """
-    VERSION = 5
+    VERSION = 14
 
     def __init__(self, slnobj):
         self.slnobj = slnobj
         self.index = None
+        self.project_parents = None
+        self.project_names = None
+        self.project_full_names = None
+        self._project_full_names_keys = None
+        self.project_full_names_by_guid = None
+        self.project_configs = None
+        self.config_views = None
+        self.project_deps = None
+        self.build_order = None
+        self._project_dependents = None
+        self._project_guids_by_path = None
+        self._project_guids_by_item = None
         self._saved_version = SolutionCache.VERSION
 
-    def build_cache(self):
+    def build_project_tables(self):
+        """ Computes the project nesting tree, along with the sorted list of
+            full names (e.g. `Folder\\SubFolder\\Project`) and the list of
+            names of all projects that aren't solution folders. This only
+            needs the solution file, not the project files.
+        """
+        slnobj = self.slnobj
+        projs_by_guid = {p.guid: p for p in slnobj.projects}
+
+        self.project_parents = {}
+        nesting_sec = slnobj.globalsection('NestedProjects')
+        if nesting_sec:
+            for entry in nesting_sec.entries:
+                child_guid, parent_guid = (entry.name.strip('{}'),
+                                           entry.value.strip('{}'))
+                if (child_guid not in projs_by_guid or
+                        parent_guid not in projs_by_guid):
+                    raise MissingVSProjectError(
+                        f"Can't find nested projects: {entry.name} = "
+                        f"{entry.value}")
+                self.project_parents[child_guid] = parent_guid
+
+        self.project_names = []
+        self.project_full_names_by_guid = {}
+        for p in slnobj.projects:
+            if p.is_folder:
+                continue
+            self.project_names.append(p.name)
+            full_name = p.name
+            cur_guid = self.project_parents.get(p.guid)
+            while cur_guid:
+                full_name = projs_by_guid[cur_guid].name + "\\" + full_name
+                cur_guid = self.project_parents.get(cur_guid)
+            self.project_full_names_by_guid[p.guid] = full_name
+
+        self.project_full_names = sorted(
+            self.project_full_names_by_guid.values(), key=str.lower)
+        self._project_full_names_keys = [
+            n.lower() for n in self.project_full_names]
+
+    def find_project_full_names(self, prefix=None):
+        """ Returns the sorted full names of non-folder projects, optionally
+            only those starting with the given prefix (case-insensitive).
+        """
+        if self.project_full_names is None:
+            self.build_project_tables()
+        if not prefix:
+            return self.project_full_names
+
+        keys = self._project_full_names_keys
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return self.project_full_names[start:end]
+
+    def get_project_full_name(self, proj_guid):
+        """ Returns the full name of a non-folder project, which is also the
+            name of its target when building the solution with MSBuild
+            (give or take some character replacements).
+        """
+        if self.project_full_names_by_guid is None:
+            self.build_project_tables()
+        return self.project_full_names_by_guid[proj_guid]
+
+    def get_project_names(self):
+        """ Returns the names of non-folder projects, in solution order. """
+        if self.project_names is None:
+            self.build_project_tables()
+        return self.project_names
+
+    def build_config_table(self):
+        """ Parses the solution's `ProjectConfigurationPlatforms` section
+            into a table mapping a project GUID and solution configuration
+            (e.g. `Debug|x64`) to the matching project configuration, and
+            whether the project is built in that solution configuration.
+        """
+        self.project_configs = {}
+        sec = self.slnobj.globalsection('ProjectConfigurationPlatforms')
+        if not sec:
+            return
+
+        builds = set()
+        for e in sec.entries:
+            m = _re_proj_config_entry.match(e.name)
+            if not m:
+                continue
+            key = (m.group('guid'), m.group('slncfg'))
+            if m.group('kind') == 'ActiveCfg':
+                self.project_configs[key] = (e.value, False)
+            else:
+                builds.add(key)
+                # Only use the build entry if there's no active config.
+                self.project_configs.setdefault(key, (e.value, False))
+        for key in builds:
+            self.project_configs[key] = (self.project_configs[key][0], True)
+
+    def find_project_configuration(self, proj_guid, sln_config):
+        """ Returns the project configuration (e.g. `Debug|Win32`) used
+            for the given solution configuration (e.g. `Debug|x86`), along
+            with whether the project gets built, or `None` if the solution
+            doesn't say.
+        """
+        if self.project_configs is None:
+            self.build_config_table()
+        return self.project_configs.get((proj_guid, sln_config))
+
+    def get_solution_configurations(self):
+        """ Returns the solution's valid configurations, e.g. `Debug|x64`.
+        """
+        sec = self.slnobj.globalsection('SolutionConfigurationPlatforms')
+        configs = []
+        if sec:
+            for e in sec.entries:
+                config, platform = e.name.split('|')
+                if config != "Invalid" and platform != "Invalid":
+                    configs.append(e.name)
+        return configs
+
+    @traced('cache.build_views')
+    def build_config_views(self, jobs=None):
+        """ Resolves every project for every solution configuration up
+            front, so that switching configurations is just a lookup in
+            `config_views` (see `get_config_view`). Projects are resolved
+            in parallel over `jobs` processes (by default, one per CPU).
+        """
+        if self.project_configs is None:
+            self.build_config_table()
+        sln_configs = self.get_solution_configurations()
+
+        slndir = self.slnobj.dirpath
+        tasks = []
+        guids = []
+        for proj in self.slnobj.projects:
+            if proj.is_folder:
+                continue
+            configs = []
+            for sln_config in sln_configs:
+                projcfg = self.project_configs.get((proj.guid, sln_config))
+                if projcfg:
+                    configs.append((sln_config, projcfg[0], projcfg[1]))
+            if not configs:
+                continue
+            proj._ensure_loaded()
+            tasks.append((slndir, proj.absdirpath,
+                          proj._propgroups, proj._itemgroups, configs))
+            guids.append(proj.guid)
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        # Don't start processes from inside Vim: on Windows, that would
+        # start new Vim instances.
+        if jobs > 1 and len(tasks) > 1 and 'vim' not in sys.modules:
+            from concurrent.futures import ProcessPoolExecutor
+            chunksize = max(1, len(tasks) // (jobs * 4))
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(_resolve_project_views, tasks,
+                                        chunksize=chunksize))
+        else:
+            results = [_resolve_project_views(t) for t in tasks]
+
+        self.config_views = {c: {} for c in sln_configs}
+        for guid, views in zip(guids, results):
+            for sln_config, view in views:
+                self.config_views[sln_config][guid] = view
+        logger.debug(f"Resolved {len(tasks)} projects for "
+                     f"{len(sln_configs)} configurations.")
+
+    def get_config_view(self, proj_guid, sln_config):
+        """ Returns the precomputed `ResolvedProjectView` of a project for
+            the given solution configuration, or `None` if the views weren't
+            precomputed (see `build_config_views`).
+        """
+        if self.config_views is None:
+            return None
+        views = self.config_views.get(sln_config)
+        if views is None:
+            return None
+        return views.get(proj_guid)
+
+    @traced('cache.build_deps')
+    def build_dependency_graph(self):
+        """ Builds the graph of project dependencies, from the solution's
+            `ProjectDependencies` sections and the projects' `ProjectReference`
+            items. `project_deps` maps a project GUID to the GUIDs of the
+            projects it depends on, and `build_order` lists all project GUIDs
+            so that each project comes after its dependencies.
+        """
+        projs = [p for p in self.slnobj.projects if not p.is_folder]
+        guids_by_path = {os.path.normcase(p.abspath): p.guid for p in projs}
+        known_guids = set(guids_by_path.values())
+
+        self.project_deps = {}
+        for proj in projs:
+            deps = set()
+            sec = proj.projectsection('ProjectDependencies')
+            if sec:
+                for e in sec.entries:
+                    dep_guid = e.name.strip('{}').upper()
+                    if dep_guid in known_guids:
+                        deps.add(dep_guid)
+
+            # Include conditional references, so that queries about
+            # affected projects err on the side of rebuilding too much.
+            for refpath, refguid in proj.get_project_references():
+                # Fall back to the GUID, for references to a project that
+                # moved, or with a funky path.
+                dep_guid = guids_by_path.get(refpath) or refguid
+                if dep_guid in known_guids:
+                    deps.add(dep_guid)
+
+            deps.discard(proj.guid)
+            self.project_deps[proj.guid] = sorted(deps)
+
+        self.build_order = _sort_dependencies(
+            [p.guid for p in projs], self.project_deps)
+        self._project_dependents = None
+        self._project_guids_by_path = {p.abspath.lower(): p.guid
+                                       for p in projs}
+        if self.index is not None:
+            self._build_item_table()
+
+    def _build_item_table(self):
+        # Maps the (lower-case) path of each source item to the GUIDs of
+        # the projects it's in, so finding a file's projects is a lookup.
+        # Most files are in a single project, whose GUID is stored as is,
+        # rather than in a tuple.
+        guids_by_path = self._project_guids_by_path
+        guids_by_item = {}
+        for projpath, items in self.index.items():
+            guid = guids_by_path[projpath.lower()]
+            for item in items:
+                guids = guids_by_item.get(item)
+                if guids is None:
+                    guids_by_item[item] = guid
+                elif isinstance(guids, str):
+                    guids_by_item[item] = (guids, guid)
+                else:
+                    guids_by_item[item] = guids + (guid,)
+        self._project_guids_by_item = guids_by_item
+
+    def get_project_dependencies(self, proj_guid, recursive=False):
+        """ Returns the GUIDs of the projects that the given project depends
+            on, either directly or, if `recursive`, indirectly too, in build
+            order.
+        """
+        if self.project_deps is None:
+            self.build_dependency_graph()
+        if not recursive:
+            deps = set(self.project_deps.get(proj_guid, ()))
+            return [g for g in self.build_order if g in deps]
+        return self._walk_graph([proj_guid], self.project_deps)
+
+    def get_dependent_projects(self, proj_guids):
+        """ Returns the GUIDs of the given projects and of all the projects
+            that depend on them, directly or not, in build order.
+        """
+        if self.project_deps is None:
+            self.build_dependency_graph()
+        if self._project_dependents is None:
+            dependents = {}
+            for guid, deps in self.project_deps.items():
+                for dep_guid in deps:
+                    dependents.setdefault(dep_guid, []).append(guid)
+            self._project_dependents = dependents
+        affected = set(proj_guids)
+        affected.update(self._walk_graph(proj_guids,
+                                         self._project_dependents))
+        return [g for g in self.build_order if g in affected]
+
+    def find_affected_projects(self, paths):
+        """ Returns the GUIDs of the projects that need to be rebuilt when
+            the given files change, in build order. That's the projects
+            containing these files (or the projects themselves, for project
+            files), and all the projects depending on them.
+        """
+        if self.index is None:
+            self.build_cache()
+        if self.project_deps is None:
+            self.build_dependency_graph()
+
+        if self._project_guids_by_item is None:
+            self._build_item_table()
+        guids_by_path = self._project_guids_by_path
+        guids_by_item = self._project_guids_by_item
+        changed = set()
+        for path in paths:
+            path_lower = os.path.abspath(path).lower()
+            guids = (guids_by_path.get(path_lower) or
+                     guids_by_item.get(path_lower))
+            if guids is None:
+                logger.debug(f"File isn't in any project: {path}")
+            elif isinstance(guids, str):
+                changed.add(guids)
+            else:
+                changed.update(guids)
+        return self.get_dependent_projects(changed)
+
+    def _walk_graph(self, start_guids, edges):
+        seen = set()
+        todo = list(start_guids)
+        while todo:
+            guid = todo.pop()
+            for next_guid in edges.get(guid, ()):
+                if next_guid not in seen:
+                    seen.add(next_guid)
+                    todo.append(next_guid)
+        return [g for g in self.build_order if g in seen]
+
+    @traced('cache.build')
+    def build_cache(self, stats=None):
+        self.build_project_tables()
+        self.build_config_table()
+
         self.index = {}
         for proj in self.slnobj.projects:
             if proj.is_folder:
                 continue
-            itemgroup = proj.defaultitemgroup()
-            if not itemgroup:
+            # Don't look at the item groups directly, so projects re-used
+            # from a previous cache don't need to be loaded.
+            if stats is not None and proj._source_index is None:
+                start_time = time.perf_counter()
+                item_cache = proj.get_source_item_index()
+                stats.add_project_load(proj.name,
+                                       time.perf_counter() - start_time)
+            else:
+                item_cache = proj.get_source_item_index()
+            if item_cache:
+                self.index[proj.abspath] = item_cache
+
+        self.build_dependency_graph()
+
+    @traced('cache.save')
+    def save(self, path):
+        # Write to a temporary file first so that other processes never
+        # load a half-written cache.
+        with atomic_write(path, 'wb') as fp:
+            pickle.dump(self, fp)
+
+    def is_up_to_date(self, cache_dt):
+        """ Returns whether the solution and its projects haven't changed
+            since the given time, e.g. when this cache was loaded or built.
+            This is the same check done when loading a saved cache, for
+            callers that keep a cache in memory.
+        """
+        try:
+            sln_dt = os.path.getmtime(self.slnobj.path)
+        except OSError:
+            return False
+        if sln_dt >= cache_dt:
+            logger.debug("Solution is newer than cache.")
+            return False
+        return _validate_loaded_cache(self, cache_dt)
+
+    def get_footprint(self, top=20):
+        """ Returns a report of what takes space in this cache, as a
+            dictionary of plain values (so it can be dumped as JSON):
+            per-project item counts, serialized and estimated in-memory
+            sizes, the metadata keys with the most volume, and statistics
+            about duplicated strings.
+        """
+        projects = []
+        meta_keys = {}
+        strings = collections.defaultdict(set)
+        string_counts = collections.Counter()
+
+        def _add_string(val):
+            if isinstance(val, str):
+                strings[val].add(id(val))
+                string_counts[val] += 1
+
+        for proj in self.slnobj.projects:
+            if proj.is_folder:
                 continue
+            proj._ensure_loaded()
+
+            item_counts = collections.Counter()
+            for group in _iter_group_tree(proj._itemgroups.values()):
+                for item in group.items:
+                    item_counts[item.itemtype] += 1
+                    _add_string(item.include)
+                    _add_string(item.itemtype)
+                    for k, v in item.metadata.items():
+                        _add_string(k)
+                        _add_string(v)
+                        km = meta_keys.setdefault(k, [0, 0])
+                        km[0] += 1
+                        km[1] += len(v) if v else 0
+            for group in _iter_group_tree(proj._propgroups.values()):
+                for prop in group.properties:
+                    _add_string(prop.name)
+                    _add_string(prop.value)
+
+            projdata = (proj._itemgroups, proj._propgroups, proj._globdirs)
+            projects.append({
+                'name': proj.name,
+                'items': sum(item_counts.values()),
+                'item_types': dict(item_counts),
+                'serialized_bytes': len(pickle.dumps(projdata)),
+                'memory_bytes': _estimate_size(projdata)})
+
+        projects.sort(key=lambda p: p['serialized_bytes'], reverse=True)
+
+        dup_bytes = 0
+        dup_strings = []
+        for val, ids in strings.items():
+            if len(ids) > 1:
+                wasted = (len(ids) - 1) * sys.getsizeof(val)
+                dup_bytes += wasted
+                dup_strings.append((wasted, len(ids), val))
+        dup_strings.sort(reverse=True)
+
+        return {
+            'solution': self.slnobj.path,
+            'serialized_bytes': len(pickle.dumps(self)),
+            'index_memory_bytes': _estimate_size(self.index),
+            'projects': projects,
+            'metadata_keys': [
+                {'key': k, 'count': v[0], 'value_chars': v[1]}
+                for k, v in sorted(meta_keys.items(),
+                                   key=lambda i: i[1][1], reverse=True)[:top]],
+            'strings': {
+                'total': sum(string_counts.values()),
+                'unique_values': len(strings),
+                'objects': sum(len(ids) for ids in strings.values()),
+                'duplicate_bytes': dup_bytes,
+                'top_duplicates': [
+                    {'value': val, 'copies': copies, 'wasted_bytes': wasted}
+                    for wasted, copies, val in dup_strings[:top]]}
+            }
 
-            item_cache = set()
-            self.index[proj.abspath] = item_cache
+    @staticmethod
+    def load_or_rebuild(slnpath, cachepath, force_rebuild=False,
+                        precompute_configs=None):
+        """ Loads the given solution cache, or rebuilds it if it's out of
+            date. Configuration views (see `build_config_views`) are also
+            computed if `precompute_configs` is true, or if it's `None` and
+            the cache directory asks for it (see `wants_config_views`).
+
+            Hits, misses and rebuild timings are added to the stats file
+            next to the cache (see `cache_stats`). If the cache is in the
+            central cache root, it's marked as used, and rebuilding it may
+            evict other solutions' caches (see `cache_root`).
+        """
+        if precompute_configs is None:
+            precompute_configs = wants_config_views(cachepath)
 
-            for item in itemgroup.get_source_items():
-                if item.include:
-                    item_path = proj.get_abs_item_include(item).lower()
-                    item_cache.add(item_path)
-                # else: it's an item from our shortlist (cpp, cs, etc files)
-                # but it somehow doesn't have a path, which can happen with
-                # some obscure VS features.
+        if not cachepath:
+            return (SolutionCache(parse_sln_file(slnpath)), False)
 
-    def save(self, path):
-        pathdir = os.path.dirname(path)
-        if not os.path.exists(pathdir):
-            os.makedirs(pathdir)
-        with open(path, 'wb') as fp:
-            pickle.dump(self, fp)
+        touch_cache(cachepath, slnpath)
+        stats = CacheStats()
+        try:
+            return SolutionCache._load_or_rebuild(
+                slnpath, cachepath, force_rebuild, precompute_configs, stats)
+        finally:
+            save_cache_stats(stats, get_stats_path(cachepath))
 
     @staticmethod
-    def load_or_rebuild(slnpath, cachepath, force_rebuild=False):
-        if cachepath and not force_rebuild:
-            res = _try_load_from_cache(slnpath, cachepath)
+    def _load_or_rebuild(slnpath, cachepath, force_rebuild,
+                         precompute_configs, stats):
+        if force_rebuild:
+            stats.add_miss('forced')
+        else:
+            start_time = time.perf_counter()
+            res = _try_load_from_cache(slnpath, cachepath, stats)
             if res is not None:
-                return res
+                if not precompute_configs or res[0].config_views is not None:
+                    stats.add_hit(time.perf_counter() - start_time)
+                    return res
+                stats.add_miss('no_config_views')
+
+        # Only let one process rebuild the cache at a time. The others wait
+        # for it to finish and then load what it saved.
+        with file_lock(cachepath + '.lock'):
+            # Stamp the solution before reading it, so that if it changes
+            # in the meantime, the metadata saved with the cache is stale.
+            try:
+                sln_stamp = get_sln_stamp(slnpath)
+            except OSError:
+                sln_stamp = None
+            cache = None
+            if not force_rebuild:
+                res = _try_load_from_cache(slnpath, cachepath)
+                if res is not None:
+                    if (not precompute_configs or
+                            res[0].config_views is not None):
+                        logger.debug("Cache was rebuilt by another process.")
+                        return res
+                    # The cache is valid, it just doesn't have the views.
+                    cache = res[0]
+
+            start_time = time.perf_counter()
+            if cache is None:
+                slnobj = parse_sln_file(slnpath)
+                slnobj.project_store = get_project_store(cachepath)
+                if not force_rebuild:
+                    _reuse_parsed_projects(slnobj, cachepath)
+                cache = SolutionCache(slnobj)
+                logger.debug(f"Regenerating cache: {cachepath}")
+                cache.build_cache(stats)
+            if precompute_configs:
+                cache.build_config_views()
+            cache.save(cachepath)
+            if sln_stamp is not None:
+                save_sln_meta(make_sln_meta(cache, sln_stamp),
+                              get_meta_path(cachepath))
+            stats.add_rebuild(time.perf_counter() - start_time)
+
+        # Every rebuild can add project store entries, so old ones need to
+        # go at some point, and the cache may have grown past the central
+        # cache root's budget.
+        store = cache.slnobj.project_store
+        store_keep = None
+        if store is not None:
+            store_keep = store.get_entry_paths(cache.slnobj.projects)
+            store.collect_garbage_if_due(keep=store_keep)
+        enforce_max_cache_size(cachepath, store, store_keep)
+        return (cache, False)
 
-        slnobj = parse_sln_file(slnpath)
-        cache = SolutionCache(slnobj)
 
-        if cachepath:
-            logger.debug(f"Regenerating cache: {cachepath}")
-            cache.build_cache()
-            cache.save(cachepath)
+# The file that, when present next to a solution cache, makes us precompute
+# configuration views whenever the cache is rebuilt.
+CONFIG_VIEWS_MARKER = 'precompute_configs'
 
-        return (cache, False)
+
+def wants_config_views(cachepath):
+    """ Returns whether configuration views should be precomputed for the
+        given solution cache.
+    """
+    if not cachepath:
+        return False
+    return os.path.exists(os.path.join(os.path.dirname(cachepath),
+                                       CONFIG_VIEWS_MARKER))
+
+
+# The file that, when present next to a solution cache, contains the path
+# to the project store to use, or `none` to not use one.
+PROJECT_STORE_MARKER = 'project_store'
+
+
+def get_default_project_store_dir():
+    """ Returns the per-user directory of the default project store. """
+    if os.name == 'nt':
+        basedir = (os.environ.get('LOCALAPPDATA') or
+                   os.path.expanduser('~\\AppData\\Local'))
+    else:
+        basedir = (os.environ.get('XDG_CACHE_HOME') or
+                   os.path.expanduser('~/.cache'))
+    return os.path.join(basedir, 'vimcrosoft', 'projects')
 
 
-def _try_load_from_cache(slnpath, cachepath):
+def get_project_store(cachepath):
+    """ Returns the project store to use along with the given solution
+        cache, or `None` if projects shouldn't be shared with other
+        solutions. Unless the cache directory says otherwise (see
+        `PROJECT_STORE_MARKER`), this is the per-user default store.
+    """
+    if not cachepath:
+        return None
+    markerpath = os.path.join(os.path.dirname(cachepath),
+                              PROJECT_STORE_MARKER)
+    try:
+        with open(markerpath, 'r', encoding='utf8') as fp:
+            dirpath = fp.readline().strip()
+    except FileNotFoundError:
+        dirpath = ''
+    if dirpath.lower() == 'none':
+        return None
+    if not dirpath:
+        dirpath = get_default_project_store_dir()
+    return ProjectStore(os.path.abspath(os.path.expanduser(dirpath)))
+
+
+def _sort_dependencies(guids, deps):
+    """ Sorts project GUIDs so that each project comes after the projects
+        it depends on, keeping the original order otherwise. Projects in a
+        dependency cycle are left in their original order, after the others.
+    """
+    indices = {g: i for i, g in enumerate(guids)}
+    remaining = {g: len(deps.get(g, ())) for g in guids}
+    dependents = {}
+    for g in guids:
+        for d in deps.get(g, ()):
+            dependents.setdefault(d, []).append(g)
+
+    ready = [indices[g] for g, count in remaining.items() if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        g = guids[heapq.heappop(ready)]
+        order.append(g)
+        for dg in dependents.get(g, ()):
+            remaining[dg] -= 1
+            if remaining[dg] == 0:
+                heapq.heappush(ready, indices[dg])
+
+    if len(order) < len(guids):
+        ordered = set(order)
+        cycle = [g for g in guids if g not in ordered]
+        logger.warning(f"Found {len(cycle)} projects with cyclic "
+                       f"dependencies.")
+        order += cycle
+    return order
+
+
+def _iter_group_tree(groups):
+    """ Iterates over the given groups and all their conditional
+        sub-groups.
+    """
+    stack = list(groups)
+    while stack:
+        group = stack.pop()
+        yield group
+        stack += group.conditionals.values()
+
+
+def _estimate_size(obj):
+    """ Estimates the in-memory size of an object graph, without following
+        references to solutions and projects.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if id(cur) in seen:
+            continue
+        seen.add(id(cur))
+        total += sys.getsizeof(cur)
+        if isinstance(cur, dict):
+            stack += cur.keys()
+            stack += cur.values()
+        elif isinstance(cur, (list, tuple, set, frozenset)):
+            stack += cur
+        elif isinstance(cur, (VSSolution, VSProject)):
+            continue
+        elif hasattr(cur, '__dict__'):
+            stack.append(cur.__dict__)
+    return total
+
+
+def _try_load_from_cache(slnpath, cachepath, stats=None):
     try:
         sln_dt = os.path.getmtime(slnpath)
         cache_dt = os.path.getmtime(cachepath)
     except OSError:
         logger.debug("Can't read solution or cache files.")
+        _add_miss(stats, 'no_cache')
         return None
 
     # If the solution file is newer, bail out.
     if sln_dt >= cache_dt:
         logger.debug("Solution is newer than cache.")
+        _add_miss(stats, 'sln_newer')
         return None
 
     # Our cache is at least valid for the solution stuff. Some of our
     # projects might be out of date, but at least there can't be any
     # added or removed projects from the solution (otherwise the solution
     # file would have been touched). Let's load the cache.
+    cache = _load_cache_file(slnpath, cachepath, stats)
+    if cache is None:
+        return None
+
+    if not _validate_loaded_cache(cache, cache_dt, stats):
+        return None
+
+    logger.debug(f"Cache is up to date: {cachepath}")
+    return (cache, True)
+
+
+def _add_miss(stats, reason):
+    if stats is not None:
+        stats.add_miss(reason)
+
+
+def _load_cache_file(slnpath, cachepath, stats=None):
+    """ Loads a saved solution cache, without checking whether it's up to
+        date. Returns `None` if it can't be loaded, or if it was saved by
+        another version of this code or for another solution.
+    """
     try:
         with open(cachepath, 'rb') as fp:
-            cache = pickle.load(fp)
+            with span('cache.load'):
+                cache = pickle.load(fp)
     except Exception as ex:
+        # Don't delete the cache here: another process might have just
+        # replaced it with a valid one. Rebuilding it will overwrite it.
         logger.debug("Error loading solution cache: %s" % ex)
-        logger.debug("Deleting cache: %s" % cachepath)
-        os.remove(cachepath)
+        _add_miss(stats, 'load_error')
         return None
 
     # Check that the cache version is up-to-date with this code.
@@ -620,9 +1988,71 @@ def _try_load_from_cache(slnpath, cachepath):
     if loaded_ver != SolutionCache.VERSION:
         logger.debug(f"Cache was saved with older format: {cachepath} "
                      f"(got {loaded_ver}, expected {SolutionCache.VERSION})")
+        _add_miss(stats, 'version_mismatch')
         return None
     logger.debug(f"Cache has correct version: {loaded_ver}")
 
+    # Solutions in the same directory share a cache directory, so check
+    # that the cache is for this solution.
+    if (os.path.normcase(os.path.abspath(cache.slnobj.path)) !=
+            os.path.normcase(os.path.abspath(slnpath))):
+        logger.debug(f"Cache is for another solution: {cache.slnobj.path}")
+        _add_miss(stats, 'other_solution')
+        return None
+
+    return cache
+
+
+@traced('cache.reuse')
+def _reuse_parsed_projects(slnobj, cachepath):
+    """ Copies the parsed data of the projects that haven't changed from
+        the previous cache of the same solution, if any. This way, adding
+        a project to the solution or editing its global sections doesn't
+        mean parsing all the other projects again.
+    """
+    try:
+        cache_dt = os.path.getmtime(cachepath)
+    except OSError:
+        return
+    prev_cache = _load_cache_file(slnobj.path, cachepath)
+    if prev_cache is None:
+        return
+
+    prev_projs = {os.path.normcase(p.abspath): p
+                  for p in prev_cache.slnobj.projects if not p.is_folder}
+    reused = 0
+    for proj in slnobj.projects:
+        if proj.is_folder:
+            continue
+        prev = prev_projs.get(os.path.normcase(proj.abspath))
+        if (prev is None or prev._missing or
+                (prev._itemgroups is None and prev._store_key is None)):
+            continue
+        # Same check as when validating a loaded cache, but per project.
+        try:
+            if os.path.getmtime(proj.abspath) >= cache_dt:
+                continue
+        except OSError:
+            continue
+        if _have_glob_dirs_changed(prev._globdirs):
+            continue
+
+        proj._itemgroups = prev._itemgroups
+        proj._propgroups = prev._propgroups
+        proj._globdirs = prev._globdirs
+        proj._source_index = prev._source_index
+        proj._project_refs = prev._project_refs
+        proj._store_key = prev._store_key
+        reused += 1
+    logger.debug(f"Re-used {reused} projects from the previous cache.")
+
+
+@traced('cache.validate')
+def _validate_loaded_cache(cache, cache_dt, stats=None):
+    """ Checks that the projects in a loaded cache haven't changed since
+        it was saved. If they have, the reason is added to the given cache
+        stats, if any.
+    """
     slnobj = cache.slnobj
 
     # Check that none of the project files in the solution are newer
@@ -635,17 +2065,38 @@ def _try_load_from_cache(slnpath, cachepath):
                 # The project was missing last time we built the cache,
                 # but now it exists. Force a rebuild.
                 if p._missing:
-                    return None
+                    _add_miss(stats, 'missing_project')
+                    return False
             except OSError:
                 if not p._missing:
                     logger.debug(f"Found missing project: {p.abspath}")
-                    return None
+                    _add_miss(stats, 'missing_project')
+                    return False
                 # else: it was already missing last time we built the
                 # cache, so nothing has changed.
 
-    if all([cache_dt > pdt for pdt in proj_dts]):
-        logger.debug(f"Cache is up to date: {cachepath}")
-        return (cache, True)
+    if not all([cache_dt > pdt for pdt in proj_dts]):
+        logger.debug("Cache has outdated projects.")
+        _add_miss(stats, 'project_newer')
+        return False
+
+    # Check that no files were added or removed in the directories that
+    # wildcard items were expanded from.
+    for p in slnobj.projects:
+        if _have_glob_dirs_changed(p._globdirs):
+            _add_miss(stats, 'glob_dir_changed')
+            return False
+
+    return True
 
-    logger.debug("Cache has outdated projects.")
-    return None
+
+def _have_glob_dirs_changed(globdirs):
+    for dirpath, dir_dt in globdirs.items():
+        try:
+            cur_dir_dt = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            cur_dir_dt = None
+        if cur_dir_dt != dir_dt:
+            logger.debug(f"Found changed wildcard directory: {dirpath}")
+            return True
+    return False
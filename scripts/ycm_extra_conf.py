@@ -9,9 +9,12 @@ if True: # 'vim' in sys.modules:
     sys.path.append(os.path.dirname(__file__))
 
 
-from logutil import setup_logging
+from cache_root import get_sln_cache_dir
+from logutil import (setup_logging, add_profile_arguments, profiling,
+                     span, traced, traced_call, format_recent_calls)
 from vshelpers import load_vimcrosoft_auto_env, find_vimcrosoft_slncache, find_item_project
-from vsutil import SolutionCache, ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR
+from vsutil import (SolutionCache, ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR,
+                    get_item_flag_metadata)
 
 
 logger = logging.getLogger(__name__)
@@ -28,73 +31,82 @@ def _split_paths_property_and_make_absolute(basedir, val):
             for p in _split_paths_property(val)]
 
 
-def _get_item_specific_flags(projdir, clcompileitems, filename):
-    logger.debug("Looking through %d items to find: %s" % (len(clcompileitems), filename))
-    filename_lower = filename.lower()
-    for item in clcompileitems:
-        absiteminclude = os.path.normpath(os.path.join(projdir, item.include))
-        if absiteminclude.lower() != filename_lower:
-            continue
-        logger.debug("Found file-specific flags for: %s" % filename)
-        incpaths = _split_paths_property_and_make_absolute(
-                projdir, item.metadata.get('AdditionalIncludeDirectories'))
-        incfiles = _split_paths_property_and_make_absolute(
-                projdir, item.metadata.get('ForcedIncludeFiles'))
-        return (incpaths, incfiles)
-    return ([], [])
+def _get_item_specific_flags(projdir, item_flags, filename):
+    # `item_flags` is what `vsutil.get_item_flag_metadata` returns.
+    logger.debug("Looking through %d items to find: %s" % (len(item_flags), filename))
+    metadata = item_flags.get(filename.lower())
+    if not metadata:
+        return ([], [])
+    logger.debug("Found file-specific flags for: %s" % filename)
+    incpaths = _split_paths_property_and_make_absolute(
+            projdir, metadata.get('AdditionalIncludeDirectories'))
+    incfiles = _split_paths_property_and_make_absolute(
+            projdir, metadata.get('ForcedIncludeFiles'))
+    return (incpaths, incfiles)
 
 
 def _find_any_possible_item_specific_flags(
-        solution, slncache, projdir, clcompileitems, filename, incpaths, incfiles, *,
-        search_neighbours=True):
+        solution, slncache, projdir, item_flags, filename, incpaths, incfiles, *,
+        search_neighbours=True, cache=None, proj=None, buildenv=None):
     # First, find any actual flags for this item.
-    item_incpaths, item_incfiles = _get_item_specific_flags(projdir, clcompileitems, filename)
+    item_incpaths, item_incfiles = _get_item_specific_flags(projdir, item_flags, filename)
     if item_incpaths or item_incfiles:
         incpaths += item_incpaths
         incfiles += item_incfiles
         return True
 
     logger.debug("Requested item didn't have any flags, looking for related items")
-    from find_companion import _find_companion_item
-    companion_item = _find_companion_item(solution, filename, slncache=slncache)
+    from vsapi import find_companion
+    companion_item = find_companion(solution, filename, cachepath=slncache)
     if companion_item:
-        item_incpaths, item_incfiles = _get_item_specific_flags(projdir, clcompileitems, companion_item)
+        item_incpaths, item_incfiles = _get_item_specific_flags(projdir, item_flags, companion_item)
         if item_incpaths or item_incfiles:
             logger.debug("Found flags on companion item: %s" % companion_item)
             incpaths += item_incpaths
             incfiles += item_incfiles
             return True
 
-    #logger.debug("No companion item found, see if we can find flags for a neighbour")
-    #dirname = os.path.dirname(filename)
-    #neighbournames = os.listdir(dirname)
-    #neighbournames.remove(os.path.basename(filename))
-    #for neighbourname in neighbournames:
-    #    neighbourpath = os.path.join(dirname, neighbourname)
-    #    item_incpaths, item_incfiles = _get_item_specific_flags(projdir, clcompileitems, neighbourpath)
-    #    if item_incpaths or item_incfiles:
-    #        logger.debug("Found flags on: %d" % neighbourpath)
-    #        incpaths += item_incpaths
-    #        incfiles += item_incfiles
-    #        return True
-
-    #    neighbour_companion = _find_companion_item(solution, filename, slncache=slncache)
-    #    if neighbour_companion:
-    #        item_incpaths, item_incfiles = _get_item_specific_flags(projdir, clcompileitems, neighbour_companion)
-    #        if item_incpaths or item_incfiles:
-    #            logger.debug("Found flags on: %s" % neighbour_companion)
-    #            incpaths += item_incpaths
-    #            incfiles += item_incfiles
-    #            return True
-
-    #logger.debug("No flags found anywhere...")
+    # Otherwise, use the flags of the closest file that includes this one
+    # and gets compiled on its own. The include graph is built the first
+    # time it's needed, but only updated when asked to.
+    if search_neighbours:
+        from vsapi import find_including_unit
+        unit = find_including_unit(solution, filename, cachepath=slncache,
+                                   build_graph=True)
+        if unit:
+            unit, unit_guid = unit
+            unit_projdir, unit_item_flags = projdir, item_flags
+            if (cache is not None and proj is not None and unit_guid and
+                    unit_guid != proj.guid):
+                # The unit is in another project, like the projects using
+                # a library include the library's headers.
+                unit_projdir, unit_item_flags = _get_other_project_item_flags(
+                        cache, unit_guid, buildenv)
+            item_incpaths, item_incfiles = _get_item_specific_flags(
+                    unit_projdir, unit_item_flags, unit)
+            if item_incpaths or item_incfiles:
+                logger.debug("Found flags on including item: %s" % unit)
+                incpaths += item_incpaths
+                incfiles += item_incfiles
+                return True
+            logger.debug("Including item has no flags either: %s" % unit)
+
+    logger.debug("No flags found anywhere...")
     return False
 
 
-def _expand_extra_flags_with_solution_extra_flags(solution, extraflags):
+def _get_sln_cache_dir(solution, slncache):
+    # ycmd doesn't get Vim's environment, and so doesn't know about the
+    # central cache root, but Vim gives us the path of the solution cache.
+    if slncache:
+        return os.path.dirname(slncache)
+    return get_sln_cache_dir(solution)
+
+
+def _expand_extra_flags_with_solution_extra_flags(solution, slncache,
+                                                  extraflags):
     argfilename = os.path.join(
-            os.path.dirname(solution),
-            '.vimcrosoft',
+            _get_sln_cache_dir(solution, slncache),
             (os.path.basename(solution) + '.flags'))
     try:
         with open(argfilename, 'r', encoding='utf8') as fp:
@@ -110,34 +122,92 @@ def _expand_extra_flags_with_solution_extra_flags(solution, extraflags):
     return extraflags
 
 
-def _build_cflags(filename, solution, buildenv=None, slncache=None, extraflags=None,
-                  force_fwd_slashes=True, short_flags=True):
-    # Find the current file in the solution.
-    cache, proj = find_item_project(filename, solution, slncache)
-    logger.debug("Found project %s: %s" % (proj.name, proj.abspath))
+def _has_custom_properties(buildenv):
+    for name in buildenv:
+        if (name not in ('Configuration', 'Platform') and
+                not name.startswith('_Vimcrosoft')):
+            return True
+    return False
 
+
+def _get_other_project_item_flags(cache, proj_guid, buildenv):
+    # Returns the directory and item flags of another project of the
+    # solution, for the same solution configuration.
+    proj = cache.slnobj.find_project_by_guid(proj_guid)
+    if proj is None:
+        return (None, {})
+    try:
+        view, proj_buildenv = _get_project_config(cache, proj, buildenv)
+    except Exception as exc:
+        logger.debug("Can't get configuration of project %s: %s" %
+                     (proj.name, exc))
+        return (None, {})
+    projdir = os.path.dirname(proj.abspath)
+    return (projdir,
+            _get_project_item_flags(proj, projdir, view, proj_buildenv))
+
+
+def _get_project_item_flags(proj, projdir, view, proj_buildenv):
+    if view is not None:
+        return view.item_flags
+    defaultitemgroup = proj.defaultitemgroup(proj_buildenv)
+    return get_item_flag_metadata(
+            projdir,
+            defaultitemgroup.get_items_of_types([ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR]))
+
+
+def _get_project_config(cache, proj, buildenv):
+    # Returns the precomputed view of the project for the solution
+    # configuration in `buildenv`, or `None`, along with the build
+    # environment of the matching project configuration.
+    #
     # Get the provided config/platform combo, which represent a solution
     # configuration, and find the corresponding project configuration.
     # For instance, a solution configuration of "Debug|Win64" could map
     # to a "MyDebug|AnyCPU" configuration on a specific project.
     sln_config_platform = '%s|%s' % (buildenv['Configuration'],
                                      buildenv['Platform'])
-    proj_config_platform = cache.slnobj.find_project_configuration(
-        proj.guid, sln_config_platform)
-    if not proj_config_platform:
-        raise Exception("Can't find project configuration and platform for "
-                        "solution configuration and platform: %s" %
-                        sln_config_platform)
 
-    # Make a build environment for the project, and figure out what
-    # kind of project it is.
-    proj_config, proj_platform = proj_config_platform.split('|')
+    # If the cache has precomputed views of the projects for each solution
+    # configuration, we don't need to resolve anything... unless we were
+    # given custom build properties, which the views don't know about.
+    view = None
+    if not _has_custom_properties(buildenv):
+        view = cache.get_config_view(proj.guid, sln_config_platform)
+    if view is not None:
+        logger.debug("Using precomputed view for: %s" % view.proj_config)
+        proj_config_name = view.proj_config
+    else:
+        proj_config_info = cache.find_project_configuration(
+            proj.guid, sln_config_platform)
+        if not proj_config_info:
+            raise Exception("Can't find project configuration and platform for "
+                            "solution configuration and platform: %s" %
+                            sln_config_platform)
+        proj_config_name = proj_config_info[0]
+
+    # Make a build environment for the project.
+    proj_config, proj_platform = proj_config_name.split('|')
 
     proj_buildenv = buildenv.copy()
     proj_buildenv['Configuration'] = proj_config
     proj_buildenv['Platform'] = proj_platform
+    return view, proj_buildenv
 
-    cfggroup = proj.propertygroup('Configuration', proj_buildenv)
+
+@traced('flags.build')
+def _build_cflags(filename, solution, buildenv=None, slncache=None, extraflags=None,
+                  force_fwd_slashes=True, short_flags=True):
+    # Find the current file in the solution.
+    cache, proj = find_item_project(filename, solution, slncache)
+    logger.debug("Found project %s: %s" % (proj.name, proj.abspath))
+
+    # Figure out what kind of project it is.
+    view, proj_buildenv = _get_project_config(cache, proj, buildenv)
+    if view is not None:
+        cfggroup = view.config_props
+    else:
+        cfggroup = proj.propertygroup('Configuration', proj_buildenv)
     cfgtype = cfggroup.get('ConfigurationType')
     if not cfgtype:
         raise Exception("Can't find configuration type. Did you specify a "
@@ -156,7 +226,10 @@ def _build_cflags(filename, solution, buildenv=None, slncache=None, extraflags=N
         # compiler flags as whatever information was given to VS. As
         # such, if the solution setup doesn't give enough info, VS
         # intellisense won't work, and neither will YouCompleteMe.
-        defaultpropgroup = proj.defaultpropertygroup(proj_buildenv)
+        if view is not None:
+            defaultpropgroup = view.default_props
+        else:
+            defaultpropgroup = proj.defaultpropertygroup(proj_buildenv)
 
         nmake_preproc = defaultpropgroup.get('NMakePreprocessorDefinitions')
         preproc += _split_paths_property(nmake_preproc)
@@ -177,10 +250,10 @@ def _build_cflags(filename, solution, buildenv=None, slncache=None, extraflags=N
                     projdir, nmake_forcedincs)
 
         # Find stuff specific to the file we are working on.
-        defaultitemgroup = proj.defaultitemgroup(proj_buildenv)
-        clcompileitems = list(defaultitemgroup.get_items_of_types([ITEM_TYPE_CPP_SRC, ITEM_TYPE_CPP_HDR]))
+        item_flags = _get_project_item_flags(proj, projdir, view, proj_buildenv)
         _find_any_possible_item_specific_flags(
-                solution, slncache, projdir, clcompileitems, filename, incpaths, incfiles)
+                solution, slncache, projdir, item_flags, filename, incpaths, incfiles,
+                cache=cache, proj=proj, buildenv=buildenv)
 
     else:
         # We should definitely support standard VC++ projects here but
@@ -193,6 +266,13 @@ def _build_cflags(filename, solution, buildenv=None, slncache=None, extraflags=N
     # up and complains that it doesn't use a valid format... :(
     incfiles = _cache_pch_files(incfiles)
 
+    with span('flags.assemble'):
+        return _assemble_cflags(preproc, incpaths, incfiles, extraflags,
+                                force_fwd_slashes, short_flags)
+
+
+def _assemble_cflags(preproc, incpaths, incfiles, extraflags,
+                     force_fwd_slashes, short_flags):
     # Build the clang/YCM flags with what we found.
     flags = ['-x', 'c++']  # TODO: check language type from project file.
 
@@ -255,7 +335,10 @@ def _build_env_from_vim(client_data):
     return buildenv
 
 
-_dump_debug_file = True
+# Whether to write the arguments and flags of each request to a debug file
+# next to the solution cache. This is slow, so it's off by default. Timings
+# of recent requests are always kept in `logutil.recent_calls` regardless.
+_dump_debug_file = False
 
 
 def _do_dump_debug_file(args, flags, debug_filename):
@@ -283,6 +366,10 @@ def _do_dump_debug_file(args, flags, debug_filename):
             fp.write("<no flags found>\n")
         fp.write("\n\n")
 
+        fp.write("  recent calls:  \n")
+        fp.write("=================\n")
+        fp.write(format_recent_calls())
+
 
 def Settings(**kwargs):
     language = kwargs.get('language')
@@ -303,25 +390,29 @@ def Settings(**kwargs):
         buildenv = _build_env_from_vim(client_data)
         extraflags = client_data.get('g:vimcrosoft_extra_clang_args')
 
-    extraflags = _expand_extra_flags_with_solution_extra_flags(solution, extraflags)
+    extraflags = _expand_extra_flags_with_solution_extra_flags(
+            solution, slncache, extraflags)
 
     flags = None
 
-    if language == 'cfamily':
-        try:
-            flags = _build_cflags(filename, solution,
-                                  buildenv=buildenv, slncache=slncache,
-                                  extraflags=extraflags)
-        except Exception as exc:
-            if from_cli:
-                raise
-            flags = {'error': str(exc)}
-    else:
-        flags = {'error': f"Unknown language: {language}"}
+    with traced_call('Settings', filename=filename) as call:
+        if language == 'cfamily':
+            try:
+                flags = _build_cflags(filename, solution,
+                                      buildenv=buildenv, slncache=slncache,
+                                      extraflags=extraflags)
+            except Exception as exc:
+                if from_cli:
+                    raise
+                flags = {'error': str(exc)}
+        else:
+            flags = {'error': f"Unknown language: {language}"}
+        if 'error' in flags:
+            call['info']['error'] = flags['error']
 
     if _dump_debug_file:
         debug_filename = os.path.join(
-                os.path.dirname(solution), '.vimcrosoft', 'debug_flags.txt')
+                _get_sln_cache_dir(solution, slncache), 'debug_flags.txt')
         _do_dump_debug_file(kwargs, flags, debug_filename)
 
     return flags
@@ -341,7 +432,7 @@ def _get_language(filename):
     return None
 
 
-def main():
+def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('solution',
                         help="The solution file")
@@ -361,9 +452,15 @@ def main():
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help="Show debugging information")
-    args = parser.parse_args()
+    add_profile_arguments(parser)
+    args = parser.parse_args(args)
     setup_logging(args.verbose)
 
+    with profiling(args):
+        _run(args)
+
+
+def _run(args):
     lang = _get_language(args.filename)
     logger.debug(f"Got language {lang} for {args.filename}")
 
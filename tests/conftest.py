@@ -0,0 +1,29 @@
+import os
+import os.path
+import sys
+
+import pytest
+
+
+# The scripts import each other by module name, like when Vim runs them.
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture(autouse=True)
+def _isolated_user_dirs(tmp_path, monkeypatch):
+    # Don't share parsed projects, or caches, with the user's own.
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'usercache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'usercache'))
+    monkeypatch.delenv('VIMCROSOFT_CACHE_ROOT', raising=False)
+    monkeypatch.delenv('VIMCROSOFT_CACHE_MAX_SIZE', raising=False)
+
+
+@pytest.fixture
+def synthetic_sln(tmp_path):
+    """ Returns the path of a small synthetic solution. """
+    from gen_synthetic_sln import generate_solution
+    return generate_solution(str(tmp_path / 'sln'), projects=30, items=20,
+                             folders=4)
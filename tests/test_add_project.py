@@ -0,0 +1,53 @@
+import os
+import os.path
+import time
+import xml.etree.ElementTree
+
+import pytest
+
+
+def _disable_project_store(cachepath):
+    from vsutil import PROJECT_STORE_MARKER
+    os.makedirs(os.path.dirname(cachepath), exist_ok=True)
+    with open(os.path.join(os.path.dirname(cachepath), PROJECT_STORE_MARKER),
+              'w', encoding='utf8') as fp:
+        fp.write('none\n')
+
+
+@pytest.mark.parametrize('use_store', [True, False],
+                         ids=['project-store', 'no-project-store'])
+def test_adding_a_project_only_parses_that_project(
+        synthetic_sln, tmp_path, monkeypatch, use_store):
+    from gen_synthetic_sln import add_project
+    from vsutil import SolutionCache
+
+    cachepath = str(tmp_path / 'cache' / 'slncache.bin')
+    if not use_store:
+        _disable_project_store(cachepath)
+    SolutionCache.load_or_rebuild(synthetic_sln, cachepath)
+
+    time.sleep(0.05)
+    add_project(synthetic_sln, 'AddedProject', items=20)
+
+    parsed = []
+    parse = xml.etree.ElementTree.parse
+
+    def spy_parse(source, *args, **kwargs):
+        parsed.append(os.path.basename(source))
+        return parse(source, *args, **kwargs)
+
+    monkeypatch.setattr(xml.etree.ElementTree, 'parse', spy_parse)
+    cache, loaded = SolutionCache.load_or_rebuild(synthetic_sln, cachepath)
+    monkeypatch.setattr(xml.etree.ElementTree, 'parse', parse)
+    assert not loaded
+    assert parsed == ['AddedProject.vcxproj']
+
+    # The result must be the same as parsing everything from scratch.
+    fullpath = str(tmp_path / 'fullcache' / 'slncache.bin')
+    _disable_project_store(fullpath)
+    full, _ = SolutionCache.load_or_rebuild(synthetic_sln, fullpath,
+                                           force_rebuild=True)
+    assert 'AddedProject' in cache.get_project_names()
+    assert cache.index == full.index
+    assert cache.project_deps == full.project_deps
+    assert cache.build_order == full.build_order
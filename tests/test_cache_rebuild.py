@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import os.path
+import sys
+import time
+
+from conftest import SCRIPTS_DIR
+
+
+PROCESSES = 4
+
+
+def _load_or_rebuild_worker(slnpath, cachepath, barrier, results):
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    from vsutil import SolutionCache
+
+    # Make rebuilding slow enough that every process finds the cache stale
+    # before the first one is done.
+    build_cache = SolutionCache.build_cache
+
+    def slow_build_cache(self, *args, **kwargs):
+        time.sleep(0.5)
+        return build_cache(self, *args, **kwargs)
+
+    SolutionCache.build_cache = slow_build_cache
+    barrier.wait()
+    cache, loaded = SolutionCache.load_or_rebuild(slnpath, cachepath)
+    results.put((loaded, sorted(cache.get_project_names())))
+
+
+def test_only_one_process_rebuilds_a_stale_cache(synthetic_sln, tmp_path):
+    from cache_stats import get_stats_path, load_cache_stats
+    from vsutil import SolutionCache
+
+    cachepath = str(tmp_path / 'cache' / 'slncache.bin')
+    cache, _ = SolutionCache.load_or_rebuild(synthetic_sln, cachepath)
+    expected_names = sorted(cache.get_project_names())
+    rebuilds_before = load_cache_stats(get_stats_path(cachepath)).rebuilds.count
+
+    # Make the cache stale by touching one of its projects.
+    time.sleep(0.05)
+    os.utime(cache.slnobj.projects[-1].abspath)
+
+    ctx = multiprocessing.get_context()
+    barrier = ctx.Barrier(PROCESSES)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_load_or_rebuild_worker,
+                         args=(synthetic_sln, cachepath, barrier, results))
+             for _ in range(PROCESSES)]
+    for proc in procs:
+        proc.start()
+    outcomes = [results.get(timeout=60) for _ in procs]
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+
+    rebuilt = [loaded for loaded, _ in outcomes if not loaded]
+    assert len(rebuilt) == 1
+    assert all(names == expected_names for _, names in outcomes)
+    stats = load_cache_stats(get_stats_path(cachepath))
+    assert stats.rebuilds.count - rebuilds_before == 1
+
+    # What was saved is valid, and loads without another rebuild.
+    cache, loaded = SolutionCache.load_or_rebuild(synthetic_sln, cachepath)
+    assert loaded
+    assert sorted(cache.get_project_names()) == expected_names
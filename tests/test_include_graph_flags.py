@@ -0,0 +1,104 @@
+import os
+import os.path
+
+
+SLN = """
+Microsoft Visual Studio Solution File, Format Version 12.00
+Project("{%(nmake)s}") = "Lib", "Lib%(sep)sLib.vcxproj", "{%(lib)s}"
+EndProject
+Project("{%(nmake)s}") = "App", "App%(sep)sApp.vcxproj", "{%(app)s}"
+EndProject
+Global
+	GlobalSection(SolutionConfigurationPlatforms) = preSolution
+		Debug|x64 = Debug|x64
+	EndGlobalSection
+	GlobalSection(ProjectConfigurationPlatforms) = postSolution
+		{%(lib)s}.Debug|x64.ActiveCfg = Debug|x64
+		{%(lib)s}.Debug|x64.Build.0 = Debug|x64
+		{%(app)s}.Debug|x64.ActiveCfg = Debug|x64
+		{%(app)s}.Debug|x64.Build.0 = Debug|x64
+	EndGlobalSection
+EndGlobal
+"""
+
+PROJECT = """<?xml version="1.0" encoding="utf-8"?>
+<Project DefaultTargets="Build" ToolsVersion="15.0" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">
+  <ItemGroup Label="ProjectConfigurations">
+    <ProjectConfiguration Include="Debug|x64">
+      <Configuration>Debug</Configuration>
+      <Platform>x64</Platform>
+    </ProjectConfiguration>
+  </ItemGroup>
+  <PropertyGroup Condition="'$(Configuration)|$(Platform)'=='Debug|x64'" Label="Configuration">
+    <ConfigurationType>Makefile</ConfigurationType>
+  </PropertyGroup>
+  <PropertyGroup Condition="'$(Configuration)|$(Platform)'=='Debug|x64'">
+    <NMakeIncludeSearchPath>$(ProjectDir)include</NMakeIncludeSearchPath>
+  </PropertyGroup>
+  <ItemGroup>
+%s
+  </ItemGroup>
+</Project>
+"""
+
+ITEM_WITH_FLAGS = """    <ClCompile Include="%s">
+      <AdditionalIncludeDirectories>$(ProjectDir)%s</AdditionalIncludeDirectories>
+    </ClCompile>"""
+
+LIB_GUID = '11111111-1111-1111-1111-111111111111'
+APP_GUID = '22222222-2222-2222-2222-222222222222'
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf8') as fp:
+        fp.write(text)
+
+
+def _make_solution(root):
+    # The library's own source file only includes `foo.h` through another
+    # header, while the application's source file includes it directly, so
+    # its closest translation unit is in the other project.
+    from vsutil import PROJ_TYPE_NMAKE
+    slnpath = os.path.join(root, 'Two.sln')
+    _write(slnpath, SLN % {'nmake': PROJ_TYPE_NMAKE, 'sep': os.sep,
+                           'lib': LIB_GUID, 'app': APP_GUID})
+    _write(os.path.join(root, 'Lib', 'Lib.vcxproj'), PROJECT % '\n'.join([
+        ITEM_WITH_FLAGS % ('lib.cpp', 'libextra'),
+        '    <ClInclude Include="impl.h" />',
+        '    <ClInclude Include="foo.h" />',
+        '    <ClInclude Include="bar.h" />']))
+    _write(os.path.join(root, 'App', 'App.vcxproj'), PROJECT % (
+        ITEM_WITH_FLAGS % ('main.cpp', 'appextra')))
+    _write(os.path.join(root, 'Lib', 'lib.cpp'),
+           '#include "impl.h"\n#include "bar.h"\n')
+    _write(os.path.join(root, 'Lib', 'impl.h'), '#include "foo.h"\n')
+    _write(os.path.join(root, 'Lib', 'foo.h'), '#pragma once\n')
+    _write(os.path.join(root, 'Lib', 'bar.h'), '#pragma once\n')
+    _write(os.path.join(root, 'App', 'main.cpp'), '#include "foo.h"\n')
+    return slnpath
+
+
+def _get_flags(slnpath, cachepath, filename):
+    from ycm_extra_conf import Settings
+    res = Settings(language='cfamily', filename=filename, from_cli=True,
+                   client_data={'solution': slnpath, 'slncache': cachepath,
+                                'env': {'Configuration': 'Debug',
+                                        'Platform': 'x64'}})
+    assert 'error' not in res
+    return res['flags']
+
+
+def test_headers_borrow_flags_of_units_in_other_projects(tmp_path):
+    root = str(tmp_path / 'sln')
+    slnpath = _make_solution(root)
+    cachepath = str(tmp_path / 'cache' / 'slncache.bin')
+
+    # The include graph was never built, so it gets built on the first miss.
+    flags = _get_flags(slnpath, cachepath, os.path.join(root, 'Lib', 'foo.h'))
+    assert any(f.endswith('appextra') for f in flags)
+    assert not any(f.endswith('libextra') for f in flags)
+
+    flags = _get_flags(slnpath, cachepath, os.path.join(root, 'Lib', 'bar.h'))
+    assert any(f.endswith('libextra') for f in flags)
+    assert not any(f.endswith('appextra') for f in flags)